@@ -1,3 +1,4 @@
 from .repop import *
 from .selection import *
+from .sensors import *
 from .util import *
@@ -0,0 +1,300 @@
+from evo.config import compile_config
+from evo.organism import Action, FeedForwardNeuralNetwork, Genome, LocalWorldState, \
+    RecurrentNeuralNetwork
+from evo.selection.region_based_selection import RegionBasedSelectionFunction
+from evo.sensors.sensor import SensorBatch, uses_default_sensors
+from evo.util.registry import get_selection_function, get_sensors, get_world_generator
+from evo.world import World, EMPTY, ORGANISM, BARRIER
+
+from typing import Optional
+
+import numpy as np
+
+
+class BatchedEvolutionSimulation:
+    """
+    Runs `n_worlds` independent copies of an experiment in lockstep.
+
+    There are no `Organism` objects: the state of every world is held in
+    arrays with the world as the leading dimension (B x H x W occupancy,
+    B x N x 2 positions and B x N x G genomes), and each step observes,
+    runs the brains of, and moves every organism of every world with a
+    handful of array operations.
+
+    Because the whole population moves at once, a step is resolved
+    simultaneously rather than sequentially as in `World.update`: an
+    organism can only move into a cell that was empty at the start of the
+    step, and when several organisms pick the same cell a random one of
+    them gets it. Only region-based selection and 'random_crossover'
+    repopulation are supported. Sensors other than the defaults compute
+    the observations of every organism of every world at once, with
+    `Sensor.compute_batch`.
+    """
+
+    def __init__(self, config: dict, n_worlds: int, seed: Optional[int] = None):
+        self.config = config = compile_config(config)
+        self.n_worlds = n_worlds
+        self.rng = np.random.default_rng(seed)
+
+        self.steps_per_generation = config.get('world_steps_per_generation')
+        assert self.steps_per_generation is not None, \
+            'world_steps_per_generation not specified in config'
+
+        self.pop_size = config.get('pop_size')
+        assert self.pop_size is not None, \
+            'pop_size not specified in config'
+
+        self.world_width = config.get('world_width')
+        self.world_height = config.get('world_height')
+        assert self.world_width is not None and self.world_height is not None, \
+            'World size not specified'
+
+        self.mutation_rate = config.get('mutation_rate')
+        assert self.mutation_rate is not None, \
+            'Mutation rate not specified in config'
+
+        self.selection = get_selection_function(config)
+        assert isinstance(self.selection, RegionBasedSelectionFunction), \
+            'Batched simulations only support region-based selection functions'
+
+        repop_method = config.get('repop_config', {}).get('method')
+        assert repop_method == 'random_crossover', \
+            'Batched simulations only support random_crossover repopulation'
+
+        # a scratch world that is only used to generate the terrain
+        self.terrain_world = World(config, get_world_generator(config))
+
+        if config.get('include_diagonal_cells'):
+            self.neighbour_offsets = [(dx, dy) for dy in range(-1, 2) for dx in range(-1, 2)
+                                      if dx != 0 or dy != 0]
+        else:
+            self.neighbour_offsets = [(0, -1), (0, 1), (-1, 0), (1, 0)]
+        self.n_observations = LocalWorldState.num_observations(config)
+        self.action_deltas = Action.deltas(config)
+        self.random_actions = Action.random_actions(config)
+        self.cardinal_deltas = Action.cardinal_deltas()
+
+        shape = (self.n_worlds, self.pop_size)
+        self.n_genes = Genome.num_genes(config)
+        self.genomes = self.rng.uniform(-1, 1, shape + (self.n_genes,))
+        self.positions = np.zeros(shape + (2,), dtype=np.int64)
+        self.recurrent_brains = Genome.is_recurrent(config)
+        self.hidden = np.zeros(shape + (Genome.hidden_state_size(config),))
+        self.terrain = np.zeros((self.n_worlds, self.world_height, self.world_width), dtype=bool)
+        self.occupancy = np.zeros(self.terrain.shape, dtype=np.uint8)
+        self.world_index = np.broadcast_to(np.arange(self.n_worlds)[:, None], shape)
+
+        # sensors computing the brain inputs, if not the default observation
+        self.sensors = None
+        if not uses_default_sensors(config):
+            self.sensors = get_sensors(config)
+            self.sensor_batch = SensorBatch(config, self.occupancy)
+
+        # evaluate each brain once per distinct observation in a step, which
+        # recurrent brains cannot do as they also depend on their past, and
+        # which needs the observation to be the default position and neighbours
+        self.deduplicate_brains = config.get('brain_cache', False) and not self.recurrent_brains \
+            and self.sensors is None
+        self.n_forward_passes = 0
+        self.n_forward_lookups = 0
+
+        self.organism_steps = 0
+
+    def reset(self) -> None:
+        """
+        Regenerates the terrain of every world and scatters the
+        organisms over random empty cells.
+        """
+        for b in range(self.n_worlds):
+            self.terrain_world.reset()
+            self.terrain[b] = np.asarray(self.terrain_world.occupancy) != EMPTY
+
+        n_cells = self.world_width * self.world_height
+        free_cells = n_cells - self.terrain.reshape(self.n_worlds, -1).sum(axis=1)
+        assert (free_cells >= self.pop_size).all(), \
+            'Not enough empty cells for the population'
+
+        # the pop_size cells with the smallest random keys are a uniform
+        # random sample of the empty cells
+        keys = self.rng.random((self.n_worlds, n_cells))
+        keys[self.terrain.reshape(self.n_worlds, -1)] = 2.
+        cells = np.argpartition(keys, self.pop_size - 1, axis=1)[:, :self.pop_size]
+        self.positions[..., 0] = cells % self.world_width
+        self.positions[..., 1] = cells // self.world_width
+
+        self.occupancy[:] = np.where(self.terrain, BARRIER, EMPTY)
+        self.occupancy[self.world_index, self.positions[..., 1], self.positions[..., 0]] = ORGANISM
+        if self.sensors is not None:
+            self.sensor_batch.start_generation()
+
+        self.weights = Genome.unpack_weights(self.genomes, self.config)
+        self.hidden.fill(0.)
+
+        if self.deduplicate_brains:
+            # one weight block for each distinct genome in the batch
+            unique_genomes, genome_ids = np.unique(self.genomes.reshape(-1, self.n_genes),
+                                                   axis=0, return_inverse=True)
+            self.genome_ids = genome_ids.reshape(-1)
+            self.unique_weights = Genome.unpack_weights(unique_genomes, self.config)
+
+    def observe(self) -> np.ndarray:
+        if self.sensors is not None:
+            return self.observe_sensors()
+
+        x = self.positions[..., 0]
+        y = self.positions[..., 1]
+        padded = np.pad(self.occupancy != EMPTY, ((0, 0), (1, 1), (1, 1)))
+
+        inputs = np.empty(x.shape + (self.n_observations,))
+        inputs[..., 0] = x / self.world_width
+        inputs[..., 1] = y / self.world_height
+        for i, (dx, dy) in enumerate(self.neighbour_offsets):
+            inputs[..., i + 2] = padded[self.world_index, y + 1 + dy, x + 1 + dx]
+
+        return inputs
+
+    def observe_sensors(self) -> np.ndarray:
+        """ Computes each sensor's block for all of the organisms of every world at once. """
+        self.sensor_batch.start_step()
+        bs = self.world_index.ravel()
+        xs = self.positions[..., 0].ravel()
+        ys = self.positions[..., 1].ravel()
+        inputs = np.concatenate([sensor.compute_batch(self.sensor_batch, bs, xs, ys)
+                                 for sensor in self.sensors], axis=1)
+        return inputs.reshape(self.positions.shape[:-1] + (self.n_observations,))
+
+    def deduplicated_actions(self, inputs: np.ndarray) -> np.ndarray:
+        """
+        Returns the action of every organism, running the brains only once
+        for each distinct pair of genome and observation in the batch. An
+        observation is determined by the organism's position and which of
+        its neighbouring cells are occupied.
+        """
+        inputs = inputs.reshape(-1, self.n_observations)
+        positions = self.positions.reshape(-1, 2)
+        n_neighbours = len(self.neighbour_offsets)
+        neighbours = inputs[:, 2:].astype(np.int64) @ (1 << np.arange(n_neighbours))
+        cells = (self.genome_ids * self.world_height + positions[:, 1]) * self.world_width \
+            + positions[:, 0]
+        keys = (cells << n_neighbours) | neighbours
+
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        weights = [layer[self.genome_ids[first]] for layer in self.unique_weights]
+        outputs = FeedForwardNeuralNetwork.batched_forward(weights, inputs[first])
+
+        self.n_forward_passes += first.shape[0]
+        self.n_forward_lookups += keys.shape[0]
+        return np.argmax(outputs, axis=-1)[inverse.reshape(-1)].reshape(self.positions.shape[:-1])
+
+    def step(self) -> int:
+        """
+        Steps every world once and returns the number of organisms that moved.
+        """
+        height, width = self.world_height, self.world_width
+        x = self.positions[..., 0]
+        y = self.positions[..., 1]
+
+        if self.deduplicate_brains:
+            actions = self.deduplicated_actions(self.observe())
+        elif self.recurrent_brains:
+            outputs, self.hidden = RecurrentNeuralNetwork.batched_forward(
+                self.weights, self.observe(), self.hidden)
+            actions = np.argmax(outputs, axis=-1)
+        else:
+            outputs = FeedForwardNeuralNetwork.batched_forward(self.weights, self.observe())
+            actions = np.argmax(outputs, axis=-1)
+        deltas = self.action_deltas[actions]
+        if self.random_actions.any():
+            is_random = self.random_actions[actions]
+            directions = self.rng.integers(0, len(self.cardinal_deltas), is_random.sum())
+            deltas[is_random] = self.cardinal_deltas[directions]
+        new_x = np.clip(x + deltas[..., 0], 0, width - 1)
+        new_y = np.clip(y + deltas[..., 1], 0, height - 1)
+
+        # flat indices into the B x H x W occupancy array
+        old_cells = ((self.world_index * height + y) * width + x).ravel()
+        new_cells = ((self.world_index * height + new_y) * width + new_x).ravel()
+
+        occupancy = self.occupancy.reshape(-1)
+        candidates = np.flatnonzero(occupancy[new_cells] == EMPTY)
+
+        # of the organisms moving into the same cell, the one with the
+        # lowest random priority wins
+        priorities = self.rng.random(candidates.shape[0])
+        order = np.lexsort((priorities, new_cells[candidates]))
+        sorted_cells = new_cells[candidates[order]]
+        is_first = np.ones(order.shape[0], dtype=bool)
+        is_first[1:] = sorted_cells[1:] != sorted_cells[:-1]
+        movers = candidates[order[is_first]]
+
+        occupancy[old_cells[movers]] = EMPTY
+        occupancy[new_cells[movers]] = ORGANISM
+        positions = self.positions.reshape(-1, 2)
+        positions[movers, 0] = new_x.ravel()[movers]
+        positions[movers, 1] = new_y.ravel()[movers]
+
+        self.organism_steps += self.n_worlds * self.pop_size
+        return movers.shape[0]
+
+    def select(self) -> np.ndarray:
+        """
+        Returns a (n_worlds, pop_size) mask of the organisms that survive.
+        """
+        return np.asarray(self.selection.in_survival_region(
+            self, self.positions[..., 0], self.positions[..., 1]
+        ))
+
+    def repopulate(self, survives: np.ndarray) -> int:
+        """
+        Replaces every organism that did not survive with the child of two
+        random survivors of the same world, with uniform crossover and the
+        same single-gene mutation as `Genome.maybe_mutate`. Worlds with no
+        survivors are restarted with random genomes.
+        """
+        n_survivors = survives.sum(axis=1)
+        # indices of each world's organisms with the survivors first
+        ranked = np.argsort(~survives, axis=1, kind='stable')
+
+        worlds, slots = np.nonzero(~survives)
+        n_children = worlds.shape[0]
+        n_parents = np.maximum(n_survivors[worlds], 1)
+
+        parent1 = ranked[worlds, (self.rng.random(n_children) * n_parents).astype(np.int64)]
+        parent2 = ranked[worlds, (self.rng.random(n_children) * n_parents).astype(np.int64)]
+        from_parent1 = self.rng.random((n_children, self.n_genes)) < 0.5
+        children = np.where(from_parent1,
+                            self.genomes[worlds, parent1],
+                            self.genomes[worlds, parent2])
+
+        mutated = np.flatnonzero(self.rng.random(n_children) < self.mutation_rate)
+        genes = self.rng.integers(0, self.n_genes, mutated.shape[0])
+        children[mutated, genes] = self.rng.uniform(-1, 1, mutated.shape[0])
+
+        extinct = n_survivors[worlds] == 0
+        children[extinct] = self.rng.uniform(-1, 1, (extinct.sum(), self.n_genes))
+
+        self.genomes[worlds, slots] = children
+        return n_children
+
+    def run_generation(self, generation: int) -> dict:
+        self.reset()
+        for _ in range(self.steps_per_generation):
+            self.step()
+
+        survives = self.select()
+        survival_rates = survives.mean(axis=1)
+        n_new_organisms = self.repopulate(survives)
+
+        logs = {
+            'generation': generation,
+            'survival_rate': float(survival_rates.mean()),
+            'survival_rate_std': float(survival_rates.std()),
+            'survival_rate_per_world': survival_rates.tolist(),
+            'n_new_organisms': n_new_organisms,
+        }
+        if self.deduplicate_brains:
+            logs['unique_genome_fraction'] = self.unique_weights[0].shape[0] / self.genome_ids.shape[0]
+            logs['forward_cache_hit_rate'] = 1 - self.n_forward_passes / max(self.n_forward_lookups, 1)
+            self.n_forward_passes = 0
+            self.n_forward_lookups = 0
+        return logs
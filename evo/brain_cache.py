@@ -0,0 +1,77 @@
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional
+import hashlib
+
+import numpy as np
+
+if TYPE_CHECKING:
+    # the organisms use the cache, so it is only imported for type checking
+    from evo.organism import FeedForwardNeuralNetwork
+
+
+def genome_key(genes) -> bytes:
+    """ A hash of the values of a gene buffer, equal for equal genomes. """
+    return hashlib.blake2b(np.asarray(genes, dtype=np.float64).tobytes(), digest_size=16).digest()
+
+
+class BrainCache:
+    """
+    Content-addressed cache of brains, keyed by a hash of their genes, so
+    that organisms with identical genomes (such as children that inherited
+    every gene from one parent and were not mutated) share one brain and
+    its weight matrices instead of building their own.
+
+    Brains are stateless, so sharing them does not change the simulation.
+    The cache can grow during a generation, and at the end of each
+    generation the least recently used entries are evicted until at most
+    `capacity` remain.
+    """
+
+    def __init__(self, capacity: int = 4096) -> None:
+        self.capacity = capacity
+        self.brains: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_brain(self, genome) -> 'FeedForwardNeuralNetwork':
+        # the shapes of the layers are part of the key, so that configs
+        # with brains of the same size but a different layout never collide
+        key = (tuple(genome.layer_shapes(genome.config)), genome.is_recurrent(genome.config),
+               genome_key(genome.genes))
+        brain = self.brains.get(key)
+        if brain is None:
+            self.misses += 1
+            brain = genome.make_brain()
+            self.brains[key] = brain
+        else:
+            self.hits += 1
+            self.brains.move_to_end(key)
+        return brain
+
+    def end_generation(self) -> dict:
+        """ Evicts the least recently used brains and returns the cache's statistics. """
+        while len(self.brains) > self.capacity:
+            self.brains.popitem(last=False)
+
+        lookups = max(self.hits + self.misses, 1)
+        logs = {
+            'brain_cache_hit_rate': self.hits / lookups,
+            'brain_cache_size': len(self.brains),
+        }
+        self.hits = 0
+        self.misses = 0
+        return logs
+
+
+_BRAIN_CACHE: Optional[BrainCache] = None
+
+
+def get_brain_cache(config: dict) -> BrainCache:
+    """
+    Returns the brain cache shared by every organism of the process,
+    creating it with the config's `brain_cache_size` on first use.
+    """
+    global _BRAIN_CACHE
+    if _BRAIN_CACHE is None:
+        _BRAIN_CACHE = BrainCache(config.get('brain_cache_size', 4096))
+    return _BRAIN_CACHE
@@ -0,0 +1,183 @@
+from functools import cached_property
+from numbers import Real
+from typing import List, Optional
+
+import numpy as np
+
+
+class ConfigError(ValueError):
+    pass
+
+
+# options that every experiment must set, and their types
+REQUIRED_OPTIONS = {
+    'world_width': int,
+    'world_height': int,
+    'pop_size': int,
+    'world_steps_per_generation': int,
+    'hidden_layer_dims': list,
+    'mutation_rate': Real,
+    'include_diagonal_cells': bool,
+    'selection_config': dict,
+    'repop_config': dict,
+}
+
+# options that may be left out, and their types
+OPTIONAL_OPTIONS = {
+    'n_generations': int,
+    'sensors': list,
+    'step_workers': int,
+    'sparse_stepping': bool,
+    'brain_cache': bool,
+    'brain_cache_size': int,
+    'policy_table_max_size': int,
+    'occupancy_tile_size': int,
+    'world_gen': dict,
+    'early_stopping': dict,
+    'checkpoint': dict,
+    'callbacks': dict,
+    'scale': dict,
+}
+
+# options that can only take one of a few values
+OPTION_CHOICES = {
+    'simulation': ['standard', 'scale'],
+    'brain_type': ['feedforward', 'recurrent'],
+    'step_backend': ['python', 'numba'],
+    'occupancy_backend': ['dense', 'tiled'],
+    'policy_tables': [True, False, 'auto'],
+}
+
+
+class FrozenDict(dict):
+    """ A dictionary that cannot be changed once it has been created. """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('Configs are read-only, use `Config.replace` to change an option')
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return type(self), (thaw(self),)
+
+
+def freeze(value):
+    if isinstance(value, dict):
+        return FrozenDict({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value):
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+
+def validate_config(config: dict) -> None:
+    """ Raises a `ConfigError` listing every problem with a config. """
+    errors = []
+    for option, option_type in REQUIRED_OPTIONS.items():
+        if config.get(option) is None:
+            errors.append(f'{option} not specified in config')
+    for option, option_type in {**REQUIRED_OPTIONS, **OPTIONAL_OPTIONS}.items():
+        value = config.get(option)
+        if value is None:
+            continue
+        if option_type is list:
+            option_type = (list, tuple)
+        # bools are ints in python, but never a valid size or count
+        if not isinstance(value, option_type) or (option_type is int and isinstance(value, bool)):
+            errors.append(f'{option} must be of type {getattr(option_type, "__name__", option_type)}, '
+                          f'got {value!r}')
+    for option, choices in OPTION_CHOICES.items():
+        if option in config and config[option] not in choices:
+            errors.append(f'{option} must be one of {choices}, got {config[option]!r}')
+
+    if not errors:
+        for option in ['world_width', 'world_height', 'pop_size', 'world_steps_per_generation']:
+            if config[option] <= 0:
+                errors.append(f'{option} must be positive, got {config[option]}')
+        if not 0 <= config['mutation_rate'] <= 1:
+            errors.append(f'mutation_rate must be between 0 and 1, got {config["mutation_rate"]}')
+        if not all(isinstance(dim, int) and dim > 0 for dim in config['hidden_layer_dims']):
+            errors.append(f'hidden_layer_dims must be positive integers, got {config["hidden_layer_dims"]}')
+        for section in ['selection_config', 'repop_config']:
+            if config[section].get('method') is None:
+                errors.append(f'method not specified in {section}')
+
+    if errors:
+        raise ConfigError('Invalid config:\n  ' + '\n  '.join(errors))
+
+
+class Config(FrozenDict):
+    """
+    A validated, read-only experiment config. It can be read like the
+    dictionary it was created from, and also holds constants derived from
+    the options that would otherwise be recomputed for every organism:
+    the size of an observation, the layout and length of a genome, and
+    the survival region of region-based selection.
+
+    Lists in the config become tuples. A config with some options changed
+    is created with `replace`.
+    """
+
+    def __init__(self, values: dict) -> None:
+        validate_config(values)
+        super().__init__(freeze(values))
+
+        # imported here as the organisms use this module
+        from evo.organism import Action, Genome, LocalWorldState
+
+        # computed from the plain options, see `Genome` and `LocalWorldState`
+        options = thaw(self)
+        self.world_width: int = self['world_width']
+        self.world_height: int = self['world_height']
+        self.mutation_rate: float = self['mutation_rate']
+        self.n_observations: int = LocalWorldState.num_observations(options)
+        self.n_actions: int = Action.num_actions(options)
+        self.is_recurrent: bool = Genome.is_recurrent(options)
+        self.hidden_state_size: int = Genome.hidden_state_size(options)
+        self.layer_shapes: List[tuple] = Genome.layer_shapes(options)
+        self.n_genes: int = Genome.num_genes(options)
+        self.brain_cache: bool = self.get('brain_cache', False)
+
+    def replace(self, **options) -> 'Config':
+        """ Returns a copy of the config with some options changed. """
+        values = thaw(self)
+        values.update(options)
+        return Config(values)
+
+    def to_dict(self) -> dict:
+        """ Returns the options as plain, mutable dictionaries and lists. """
+        return thaw(self)
+
+    @cached_property
+    def survival_mask(self) -> Optional[np.ndarray]:
+        """
+        Returns a read-only (height, width) mask of the cells in the
+        survival region, or None if selection is not region-based.
+        """
+        from evo.selection.region_based_selection import RegionBasedSelectionFunction
+        from evo.util.registry import get_selection_function
+
+        selection = get_selection_function(self)
+        if not isinstance(selection, RegionBasedSelectionFunction):
+            return None
+
+        # the regions only read the world's size, which the config also has
+        ys, xs = np.mgrid[0:self.world_height, 0:self.world_width]
+        mask = np.asarray(selection.in_survival_region(self, xs, ys))
+        mask.setflags(write=False)
+        return mask
+
+
+def compile_config(config: dict) -> Config:
+    """ Validates a config and computes its derived constants, if not already done. """
+    if isinstance(config, Config):
+        return config
+    return Config(thaw(config))
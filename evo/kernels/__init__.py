@@ -0,0 +1,5 @@
+try:
+    import numba  # noqa: F401
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
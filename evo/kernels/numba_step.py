@@ -0,0 +1,155 @@
+"""
+Numba-compiled implementation of a single `World.update` step.
+
+The kernel runs the observation -> forward pass -> clamp -> occupancy
+check -> move loop for every organism in one nopython function over the
+world's population arrays. Organisms are visited in the (already shuffled)
+order given by the caller, and each one observes the occupancy grid as
+left by the organisms before it, exactly as in `World.update`.
+"""
+import numpy as np
+from numba import njit
+
+
+EMPTY = 0
+ORGANISM = 1
+
+
+@njit(cache=True)
+def _observe(occupancy, x, y, obs_width, obs_height, include_diagonals, inputs):
+    height, width = occupancy.shape
+    inputs[0] = x / obs_width
+    inputs[1] = y / obs_height
+
+    if include_diagonals:
+        i = 2
+        for dy in range(-1, 2):
+            for dx in range(-1, 2):
+                if dx == 0 and dy == 0:
+                    continue
+                xx = x + dx
+                yy = y + dy
+                if 0 <= xx < width and 0 <= yy < height and occupancy[yy, xx] != EMPTY:
+                    inputs[i] = 1.
+                else:
+                    inputs[i] = 0.
+                i += 1
+    else:
+        inputs[2] = 1. if y > 0 and occupancy[y - 1, x] != EMPTY else 0.
+        inputs[3] = 1. if y < height - 1 and occupancy[y + 1, x] != EMPTY else 0.
+        inputs[4] = 1. if x > 0 and occupancy[y, x - 1] != EMPTY else 0.
+        inputs[5] = 1. if x < width - 1 and occupancy[y, x + 1] != EMPTY else 0.
+
+
+@njit(cache=True)
+def _forward_argmax(genes, layer_dims, x_buf, y_buf, hidden_state):
+    """
+    Forward pass of the network encoded in `genes`, with the same weight
+    layout as `Genome.make_brain`. The first layer's inputs are read from
+    `x_buf`, which is overwritten with each layer's outputs. For recurrent
+    brains the first layer's outputs are also written to `hidden_state`,
+    which is empty for feedforward brains.
+    """
+    offset = 0
+    n_out = 0
+    for layer in range(layer_dims.shape[0] - 1):
+        n_in = layer_dims[layer]
+        n_out = layer_dims[layer + 1]
+        for j in range(n_out):
+            acc = 0.
+            for i in range(n_in):
+                acc += x_buf[i] * genes[offset + i * n_out + j]
+            # the bias input is the last row of the weight matrix
+            acc += genes[offset + n_in * n_out + j]
+            y_buf[j] = np.tanh(acc)
+        offset += (n_in + 1) * n_out
+        for j in range(n_out):
+            x_buf[j] = y_buf[j]
+        if layer == 0:
+            for j in range(hidden_state.shape[0]):
+                hidden_state[j] = y_buf[j]
+
+    best = 0
+    for j in range(1, n_out):
+        if x_buf[j] > x_buf[best]:
+            best = j
+    return best
+
+
+@njit(cache=True)
+def _unfreeze_neighbours(cell_index, frozen, x, y):
+    height, width = cell_index.shape
+    for yy in range(max(y - 1, 0), min(y + 2, height)):
+        for xx in range(max(x - 1, 0), min(x + 2, width)):
+            if cell_index[yy, xx] >= 0:
+                frozen[cell_index[yy, xx]] = 0
+
+
+@njit(cache=True)
+def step_kernel(occupancy, positions, genomes, order, layer_dims, action_deltas,
+                obs_width, obs_height, include_diagonals, sparse, frozen,
+                hidden, moved_indices):
+    """
+    Steps every organism in `order` once, updating `occupancy` and
+    `positions` in place.
+
+    With `sparse` set, frozen organisms are skipped, organisms that are
+    blocked are frozen, and every move unfreezes the organisms around the
+    cells it empties and fills, as in `World.update`. The rows of `hidden`
+    hold the hidden states of recurrent brains and have length 0 for
+    feedforward brains.
+
+    The indices of the organisms that moved are written to `moved_indices`
+    in the order the moves happened, and the number of moves is returned.
+    """
+    height, width = occupancy.shape
+    max_width = 0
+    for k in range(layer_dims.shape[0]):
+        max_width = max(max_width, layer_dims[k])
+    x_buf = np.zeros(max_width)
+    y_buf = np.zeros(max_width)
+
+    # which organism is in each cell, only needed to unfreeze neighbours
+    cell_index = np.full((height if sparse else 0, width if sparse else 0), -1, dtype=np.int64)
+    if sparse:
+        for k in range(order.shape[0]):
+            cell_index[positions[order[k], 1], positions[order[k], 0]] = order[k]
+
+    n_hidden = hidden.shape[1]
+    n_observations = layer_dims[0] - n_hidden
+
+    n_moves = 0
+    for k in range(order.shape[0]):
+        index = order[k]
+        if sparse and frozen[index]:
+            continue
+
+        x = positions[index, 0]
+        y = positions[index, 1]
+
+        _observe(occupancy, x, y, obs_width, obs_height, include_diagonals, x_buf)
+        for j in range(n_hidden):
+            x_buf[n_observations + j] = hidden[index, j]
+        action = _forward_argmax(genomes[index], layer_dims, x_buf, y_buf, hidden[index])
+
+        new_x = min(max(x + action_deltas[action, 0], 0), width - 1)
+        new_y = min(max(y + action_deltas[action, 1], 0), height - 1)
+        if occupancy[new_y, new_x] != EMPTY:
+            if sparse:
+                frozen[index] = 1
+            continue
+
+        occupancy[new_y, new_x] = ORGANISM
+        occupancy[y, x] = EMPTY
+        positions[index, 0] = new_x
+        positions[index, 1] = new_y
+        moved_indices[n_moves] = index
+        n_moves += 1
+
+        if sparse:
+            cell_index[new_y, new_x] = index
+            cell_index[y, x] = -1
+            _unfreeze_neighbours(cell_index, frozen, new_x, new_y)
+            _unfreeze_neighbours(cell_index, frozen, x, y)
+
+    return n_moves
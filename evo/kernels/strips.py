@@ -0,0 +1,187 @@
+"""
+Strip-parallel stepping of a single world over several processes.
+
+The world is cut into horizontal strips, one per worker process. An
+organism only observes and moves within one cell of itself, so organisms
+that are more than one row away from a strip boundary can be stepped by
+their strip's worker without ever touching a cell that another worker
+reads or writes. In a first phase every worker runs the compiled step
+kernel over the organisms inside its strip, in the shuffled order of the
+step. The organisms in the two rows either side of each boundary (the
+halo) are then stepped in a second phase by the main process, again in
+the shuffled order, once the strips have finished.
+
+The occupancy and population arrays live in shared memory, so workers
+update them in place and only send back which organisms moved. The
+strips never interact during the first phase, so the result is the same
+as running the two phases one organism at a time, and only depends on
+the number of workers through where the halo rows are.
+"""
+from multiprocessing import get_context, resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict
+import signal
+import weakref
+
+import numpy as np
+
+
+def _attach(blocks: Dict[str, SharedMemory], name: str) -> SharedMemory:
+    if name not in blocks:
+        blocks[name] = SharedMemory(name=name)
+    return blocks[name]
+
+
+def _strip_worker(connection) -> None:
+    from evo.kernels.numba_step import step_kernel
+
+    # forked workers inherit pygame's SIGTERM handler, which would stop
+    # them from being terminated when the main process exits
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    blocks: Dict[str, SharedMemory] = dict()
+    frozen = np.zeros(1, dtype=np.uint8)
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            message = None
+        if message is None:
+            break
+
+        specs, order, kernel_args = message
+        arrays = {
+            key: np.ndarray(shape, dtype=dtype, buffer=_attach(blocks, name).buf)
+            for key, (name, shape, dtype) in specs.items()
+        }
+        # let go of blocks that the main process has replaced
+        in_use = {name for name, _, _ in specs.values()}
+        for name in list(blocks):
+            if name not in in_use:
+                blocks.pop(name).close()
+
+        moved_indices = np.empty(len(order), dtype=np.int64)
+        n_moves = step_kernel(arrays['occupancy'], arrays['positions'], arrays['genomes'],
+                              order, *kernel_args, False, frozen, arrays['hidden'],
+                              moved_indices)
+        # drop the views before the blocks can be closed
+        del arrays
+        connection.send(moved_indices[:n_moves].copy())
+
+    for block in blocks.values():
+        block.close()
+
+
+def _shutdown(processes: list, connections: list, blocks: Dict[int, SharedMemory]) -> None:
+    for connection in connections:
+        try:
+            connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+    for process in processes:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+    for block in blocks.values():
+        block.unlink()
+        try:
+            block.close()
+        except BufferError:
+            # still viewed by arrays of the world, the memory is released with them
+            pass
+    blocks.clear()
+
+
+class StripStepper:
+    """
+    Runs the steps of a world over `n_workers` horizontal strips. The
+    world allocates its occupancy and population arrays with `allocate`
+    so that the workers can see them.
+    """
+
+    def __init__(self, world_width: int, world_height: int, n_workers: int) -> None:
+        assert world_height >= 3 * n_workers, \
+            'Each strip must be at least 3 rows high'
+
+        self.n_workers = n_workers
+        # strip k holds the rows [edges[k], edges[k + 1])
+        self.edges = np.linspace(0, world_height, n_workers + 1).round().astype(np.int64)
+        self.is_halo_row = np.zeros(world_height, dtype=bool)
+        for edge in self.edges[1:-1]:
+            self.is_halo_row[edge - 1:edge + 1] = True
+
+        # shared memory blocks by the id of the array that views them
+        self.blocks: Dict[int, SharedMemory] = dict()
+        self.arrays: Dict[int, np.ndarray] = dict()
+
+        # workers must share the main process's resource tracker, or their
+        # own trackers would unlink the shared blocks when they exit
+        resource_tracker.ensure_running()
+        context = get_context()
+        self.connections = []
+        self.processes = []
+        for _ in range(n_workers):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(target=_strip_worker, args=(worker_connection,), daemon=True)
+            process.start()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+        self._finalizer = weakref.finalize(self, _shutdown, self.processes,
+                                           self.connections, self.blocks)
+
+    def allocate(self, shape: tuple, dtype=np.float64) -> np.ndarray:
+        """ Returns a zeroed array in shared memory. """
+        dtype = np.dtype(dtype)
+        block = SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        array.fill(0)
+        self.blocks[id(array)] = block
+        self.arrays[id(array)] = array
+        return array
+
+    def _specs(self, arrays: Dict[str, np.ndarray]) -> dict:
+        specs = dict()
+        for key, array in arrays.items():
+            assert id(array) in self.blocks, f'{key} is not in shared memory'
+            specs[key] = (self.blocks[id(array)].name, array.shape, array.dtype.str)
+
+        # free the blocks of arrays that have been replaced, such as
+        # population arrays that have grown
+        in_use = {id(array) for array in arrays.values()}
+        for array_id in list(self.blocks):
+            if array_id not in in_use:
+                del self.arrays[array_id]
+                block = self.blocks.pop(array_id)
+                block.close()
+                block.unlink()
+        return specs
+
+    def step(self, arrays: Dict[str, np.ndarray], order: np.ndarray, kernel_args: tuple) -> np.ndarray:
+        """
+        Steps the organisms in `order` and returns the indices of those
+        that moved, in the order the moves were made. `arrays` holds the
+        shared 'occupancy', 'positions', 'genomes' and 'hidden' arrays and
+        `kernel_args` the remaining constant arguments of `step_kernel`.
+        """
+        from evo.kernels.numba_step import step_kernel
+
+        specs = self._specs(arrays)
+        ys = arrays['positions'][order, 1]
+        strips = np.searchsorted(self.edges, ys, side='right') - 1
+        in_halo = self.is_halo_row[ys]
+
+        for strip, connection in enumerate(self.connections):
+            connection.send((specs, order[(strips == strip) & ~in_halo], kernel_args))
+        moved = [connection.recv() for connection in self.connections]
+
+        deferred = order[in_halo]
+        moved_indices = np.empty(len(deferred), dtype=np.int64)
+        n_moves = step_kernel(arrays['occupancy'], arrays['positions'], arrays['genomes'],
+                              deferred, *kernel_args, False, np.zeros(1, dtype=np.uint8),
+                              arrays['hidden'], moved_indices)
+        moved.append(moved_indices[:n_moves])
+        return np.concatenate(moved)
+
+    def close(self) -> None:
+        self._finalizer()
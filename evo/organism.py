@@ -1,49 +1,122 @@
 import random
-from dataclasses import dataclass
 from typing import List, Optional
 
 import numpy as np
 
+from evo.brain_cache import get_brain_cache
+from evo.config import Config, compile_config
+
 
 class Action:
+    """
+    Actions are small integers that index into the action set chosen with
+    the `action_set` config option. Each action set is a table of named
+    moves, and `Action.deltas` turns it into an (n_actions, 2) array of
+    (dx, dy) displacements, so a brain's argmax output can index straight
+    into it.
+    """
     UP = 'up'
     DOWN = 'down'
     LEFT = 'left'
     RIGHT = 'right'
+    UP_LEFT = 'up_left'
+    UP_RIGHT = 'up_right'
+    DOWN_LEFT = 'down_left'
+    DOWN_RIGHT = 'down_right'
+    STAY = 'stay'
+    # move in a uniformly random cardinal direction
+    RANDOM = 'random'
+
+    MOVES = {
+        UP: (0, -1),
+        DOWN: (0, 1),
+        LEFT: (-1, 0),
+        RIGHT: (1, 0),
+        UP_LEFT: (-1, -1),
+        UP_RIGHT: (1, -1),
+        DOWN_LEFT: (-1, 1),
+        DOWN_RIGHT: (1, 1),
+        STAY: (0, 0),
+        RANDOM: (0, 0),
+    }
+
+    CARDINAL_MOVES = [UP, DOWN, LEFT, RIGHT]
+
+    ACTION_SETS = {
+        'cardinal': [UP, DOWN, LEFT, RIGHT],
+        'cardinal_stay': [UP, DOWN, LEFT, RIGHT, STAY],
+        'cardinal_random': [UP, DOWN, LEFT, RIGHT, RANDOM],
+        'diagonal': [UP, DOWN, LEFT, RIGHT, UP_LEFT, UP_RIGHT, DOWN_LEFT, DOWN_RIGHT],
+        'diagonal_stay': [UP, DOWN, LEFT, RIGHT, UP_LEFT, UP_RIGHT, DOWN_LEFT, DOWN_RIGHT, STAY],
+    }
 
     @staticmethod
-    def all_actions() -> List['Action']:
-        return [Action.UP, Action.DOWN, Action.LEFT, Action.RIGHT]
+    def all_actions(config: Optional[dict] = None) -> List[str]:
+        """
+        Returns the names of the moves in the configured action set. The
+        `action_set` option is either the name of one of the `ACTION_SETS`
+        or a list of move names, and defaults to 'cardinal'.
+        """
+        action_set = (config or dict()).get('action_set', 'cardinal')
+        if isinstance(action_set, str):
+            assert action_set in Action.ACTION_SETS, \
+                f'action_set must be one of {list(Action.ACTION_SETS)} or a list of moves'
+            return Action.ACTION_SETS[action_set]
+
+        for move in action_set:
+            assert move in Action.MOVES, \
+                f'Unknown move {move} in action_set, must be one of {list(Action.MOVES)}'
+        return list(action_set)
 
     @staticmethod
-    def num_actions(_: dict) -> int:
-        return len(Action.all_actions())
+    def num_actions(config: dict) -> int:
+        if isinstance(config, Config):
+            return config.n_actions
+        return len(Action.all_actions(config))
 
     @staticmethod
-    def from_index(index: int) -> 'Action':
-        return Action.all_actions()[index]
+    def deltas(config: dict) -> np.ndarray:
+        """
+        Returns the (n_actions, 2) array of (dx, dy) displacements.
+        Random moves have a displacement of (0, 0) in the table.
+        """
+        return np.array([Action.MOVES[move] for move in Action.all_actions(config)],
+                        dtype=np.int64).reshape(-1, 2)
 
     @staticmethod
-    def to_tuple(action: str) -> tuple:
-        if action == Action.UP:
-            return (0, -1)
-        elif action == Action.DOWN:
-            return (0, 1)
-        elif action == Action.LEFT:
-            return (-1, 0)
-        elif action == Action.RIGHT:
-            return (1, 0)
+    def random_actions(config: dict) -> np.ndarray:
+        """
+        Returns a boolean mask of the actions that are random moves.
+        """
+        return np.array([move == Action.RANDOM for move in Action.all_actions(config)], dtype=bool)
+
+    @staticmethod
+    def cardinal_deltas() -> np.ndarray:
+        return np.array([Action.MOVES[move] for move in Action.CARDINAL_MOVES], dtype=np.int64)
 
 
-@dataclass
 class LocalWorldState:
-    x: int
-    y: int
-    local_cells: List[Optional['Organism']] = None
-    world_metadata: dict = None
+    """ The position of an organism and the contents of its neighbouring cells. """
+
+    __slots__ = ('x', 'y', 'local_cells')
+
+    def __init__(self, x: int, y: int, local_cells: Optional[List[Optional['Organism']]] = None) -> None:
+        self.x = x
+        self.y = y
+        self.local_cells = local_cells
 
     @staticmethod
     def num_observations(config: dict) -> int:
+        if isinstance(config, Config):
+            return config.n_observations
+
+        # imported here as the sensors depend on the world, which depends on this module
+        from evo.sensors.sensor import uses_default_sensors
+        if not uses_default_sensors(config):
+            from evo.util.registry import get_sensor_class
+            return sum(get_sensor_class(sensor_name).num_channels(config)
+                       for sensor_name in config.get('sensors'))
+
         n_coords = 2  # x and y
 
         assert config.get('include_diagonal_cells') is not None, \
@@ -59,6 +132,8 @@ class LocalWorldState:
 
 class FeedForwardNeuralNetwork:
 
+    __slots__ = ('layers_weights',)
+
     def __init__(self, layer_weights: List[np.ndarray]) -> None:
         self.layers_weights = layer_weights
 
@@ -71,16 +146,145 @@ class FeedForwardNeuralNetwork:
                 x = np.concatenate([x, [1.]])
         return x
 
+    @staticmethod
+    def batched_forward(layer_weights: List[np.ndarray], inputs: np.ndarray) -> np.ndarray:
+        """
+        Runs many networks at once. Each weight array has shape
+        (..., input_dim, output_dim), including the bias row, and the
+        inputs have shape (..., n_observations) with the same leading
+        dimensions, one network per leading index.
+        """
+        x = inputs
+        for weights in layer_weights:
+            x = np.matmul(x[..., None, :], weights[..., :-1, :])[..., 0, :]
+            x = np.tanh(x + weights[..., -1, :])
+        return x
+
+
+class RecurrentNeuralNetwork(FeedForwardNeuralNetwork):
+    """
+    Elman-style network whose first hidden layer also receives its own
+    activations from the previous step, so the organism can remember
+    what it has seen. The hidden state is owned by the caller (the world
+    keeps one row per organism) and is updated in place.
+    """
+
+    __slots__ = ()
+
+    def forward(self, inputs: List[float], hidden_state: np.ndarray) -> List[float]:
+        x = np.concatenate([np.array(inputs), hidden_state, [1.]])
+        x = np.tanh(np.matmul(x, self.layers_weights[0]))
+        hidden_state[:] = x
+        for weight_matrix in self.layers_weights[1:]:
+            x = np.concatenate([x, [1.]])
+            x = np.tanh(np.matmul(x, weight_matrix))
+        return x
+
+    @staticmethod
+    def batched_forward(layer_weights: List[np.ndarray],
+                        inputs: np.ndarray,
+                        hidden_state: np.ndarray) -> tuple:
+        """
+        Batched version of `forward`, with the same layout as
+        `FeedForwardNeuralNetwork.batched_forward` and a hidden state of
+        shape (..., hidden_dim). Returns the outputs and the new hidden state.
+        """
+        inputs = np.concatenate([inputs, hidden_state], axis=-1)
+        hidden_state = FeedForwardNeuralNetwork.batched_forward(layer_weights[:1], inputs)
+        outputs = FeedForwardNeuralNetwork.batched_forward(layer_weights[1:], hidden_state)
+        return outputs, hidden_state
+
 
 class Genome:
+    """
+    The genes of an organism, stored as a float64 array, which encode the
+    weights of its brain.
+    """
+
+    BRAIN_TYPES = ['feedforward', 'recurrent']
+
+    __slots__ = ('genes', 'config')
 
-    def __init__(self, genes: List[float], config: dict) -> None:
-        self.genes = genes
-        self.config = config
+    def __init__(self, genes: np.ndarray, config: dict) -> None:
+        self.genes = np.asarray(genes, dtype=np.float64)
+        self.config = compile_config(config)
 
-        self.mutation_rate = config.get('mutation_rate')
-        assert self.mutation_rate is not None, \
-            'Mutation rate not specified in config'
+    @property
+    def mutation_rate(self) -> float:
+        return self.config.mutation_rate
+
+    @staticmethod
+    def is_recurrent(config: dict) -> bool:
+        if isinstance(config, Config):
+            return config.is_recurrent
+        brain_type = config.get('brain_type', 'feedforward')
+        assert brain_type in Genome.BRAIN_TYPES, \
+            f'brain_type must be one of {Genome.BRAIN_TYPES}'
+        return brain_type == 'recurrent'
+
+    @staticmethod
+    def hidden_state_size(config: dict) -> int:
+        """
+        Returns the size of a recurrent brain's hidden state, which is
+        the first hidden layer, or 0 for feedforward brains.
+        """
+        if isinstance(config, Config):
+            return config.hidden_state_size
+        if not Genome.is_recurrent(config):
+            return 0
+
+        hidden_layer_dims = config.get('hidden_layer_dims')
+        assert hidden_layer_dims, \
+            'Recurrent brains need at least one hidden layer'
+        return hidden_layer_dims[0]
+
+    @staticmethod
+    def layer_shapes(config: dict) -> List[tuple]:
+        """
+        Returns the (input_dim, output_dim) shape of each weight matrix
+        encoded in a genome, where input_dim includes the bias input and,
+        for recurrent brains, the hidden state.
+        """
+        if isinstance(config, Config):
+            return config.layer_shapes
+
+        hidden_layer_dims = config.get('hidden_layer_dims')
+        assert hidden_layer_dims is not None, \
+            'Hidden layer dims not specified in config'
+
+        # input sizes at each layer, where a recurrent brain's first
+        # layer also takes the previous hidden state
+        input_sizes = [LocalWorldState.num_observations(config) + Genome.hidden_state_size(config)] \
+            + hidden_layer_dims
+        # output sizes at each layer
+        output_sizes = hidden_layer_dims + [Action.num_actions(config)]
+
+        # add 1 input for the bias
+        return [(inp_dim + 1, out_dim) for inp_dim, out_dim in zip(input_sizes, output_sizes)]
+
+    @staticmethod
+    def num_genes(config: dict) -> int:
+        """
+        Returns the total number of genes needed for each layer
+        by multiplying the input dimension by the output dimension.
+        """
+        if isinstance(config, Config):
+            return config.n_genes
+        return sum(inp_dim * out_dim for inp_dim, out_dim in Genome.layer_shapes(config))
+
+    @staticmethod
+    def unpack_weights(genomes: np.ndarray, config: dict) -> List[np.ndarray]:
+        """
+        Splits a stacked genome array of shape (..., n_genes) into views
+        of the layer weights, each of shape (..., input_dim, output_dim).
+        """
+        i = 0
+        layers = []
+        for input_dim, output_dim in Genome.layer_shapes(config):
+            weights = genomes[..., i:i + input_dim * output_dim]
+            layers.append(weights.reshape(genomes.shape[:-1] + (input_dim, output_dim)))
+            i += input_dim * output_dim
+        return layers
 
     @staticmethod
     def random_gene_value() -> float:
@@ -103,29 +307,15 @@ class Genome:
         Returns:
             A Genome object.
         """
-        hidden_layer_dims = config.get('hidden_layer_dims')
-        assert hidden_layer_dims is not None, \
-            'Hidden layer dims not specified in config'
-
-        # input sizes at each layer
-        input_sizes = [LocalWorldState.num_observations(config)] + hidden_layer_dims
-        # output sizes at each layer
-        output_sizes = hidden_layer_dims + [Action.num_actions(config)]
-
-        # we compute the total number of genes needed for each layer
-        # by multiplying the input dimension by the output dimension
-        num_genes = 0
-        for inp_dim, out_dim in zip(input_sizes, output_sizes):
-            inp_dim += 1  # add 1 input for the bias
-            num_genes += inp_dim * out_dim
+        num_genes = Genome.num_genes(config)
 
-        # create a list of random genes of the correct length
-        genes = [Genome.random_gene_value() for _ in range(num_genes)]
+        # create an array of random genes of the correct length
+        genes = np.array([Genome.random_gene_value() for _ in range(num_genes)])
 
         return Genome(genes, config)
 
     def copy(self) -> 'Genome':
-        return Genome([v for v in self.genes], self.config)
+        return Genome(self.genes.copy(), self.config)
 
     def maybe_mutate(self) -> None:
         if random.random() < self.mutation_rate:
@@ -139,80 +329,99 @@ class Genome:
         assert len(self.genes) == len(other.genes), \
             'Genomes must have the same length'
 
-        new_genes = []
-        for i in range(len(self.genes)):
-            # randomly pick a gene from either parent
-            # and add it to the new genome
-            if random.random() < 0.5:
-                new_genes.append(self.genes[i])
-            else:
-                new_genes.append(other.genes[i])
-
-        return Genome(new_genes, self.config)
+        # randomly pick each gene from either parent
+        from_self = np.array([random.random() < 0.5 for _ in range(len(self.genes))])
+        return Genome(np.where(from_self, self.genes, other.genes), self.config)
 
     def make_brain(self) -> FeedForwardNeuralNetwork:
-        hidden_layers = self.config.get('hidden_layer_dims')
-        assert hidden_layers is not None, \
-            'Hidden layer dims not specified in config'
-
-        # input sizes at each layer
-        input_sizes = [LocalWorldState.num_observations(self.config)] + hidden_layers
-        # output sizes at each layer
-        output_sizes = hidden_layers + [Action.num_actions(self.config)]
-
         i = 0
         layers = []
-        for input_dim, output_dim in zip(input_sizes, output_sizes):
-            input_dim += 1  # add 1 input for the bias
-            # get the weights for this layer
-            weights = np.array(self.genes[i:i + input_dim * output_dim])
-            # reshape them into a matrix
-            weights = weights.reshape((input_dim, output_dim))
+        for input_dim, output_dim in Genome.layer_shapes(self.config):
+            # get the weights for this layer as a matrix, which is a view
+            # of the genes rather than a copy
+            weights = self.genes[i:i + input_dim * output_dim].reshape((input_dim, output_dim))
             # add the weights to the list of layers
             layers.append(weights)
             # update the index
             i += input_dim * output_dim
 
+        if Genome.is_recurrent(self.config):
+            return RecurrentNeuralNetwork(layers)
         return FeedForwardNeuralNetwork(layers)
 
 
 class Organism:
+    """
+    An organism in the world. Organisms are slotted and only hold
+    references to their config, genome and local world state, as worlds
+    can have hundreds of thousands of them. Their brain is built the first
+    time it is needed, which it never is with the numba step backend.
+    """
+
+    __slots__ = ('config', 'local_world_state', 'index', 'id', 'parent_ids',
+                 'policy_table', 'genome', '_brain')
 
-    def __init__(self, config: dict, genome: Genome) -> None:
+    # id given to the next organism that is created
+    next_id = 0
+
+    def __init__(self, config: dict, genome: Genome, parent_ids: tuple = (-1, -1)) -> None:
+        self.config = compile_config(config)
         self.local_world_state: Optional[LocalWorldState] = None
+        # row of this organism in the world's population arrays
+        self.index: Optional[int] = None
+        # unique id of the organism, and the ids of its parents, or -1
+        # for organisms that were not bred from others
+        self.id = Organism.next_id
+        Organism.next_id += 1
+        self.parent_ids = parent_ids
+        # actions by (y, x, neighbour mask), filled in by `World.policy_action`
+        # and shared with the organisms that have the same genome
+        self.policy_table: Optional[np.ndarray] = None
         self.genome = genome
-        self.brain = genome.make_brain()
-        self.brain_inputs = np.array([0.] * LocalWorldState.num_observations(config))
-        self.config = config
-        self.world_width = config.get('world_width')
-        assert self.world_width is not None, \
-            'World width not specified in config'
-        self.world_height = config.get('world_width')
-        assert self.world_height is not None, \
-            'World height not specified in config'
-
-    def update_brain_inputs(self) -> None:
-        self.brain_inputs[0] = self.local_world_state.x / self.world_width
-        self.brain_inputs[1] = self.local_world_state.y / self.world_height
-        for i, cell in enumerate(self.local_world_state.local_cells):
-            if cell is None:
-                self.brain_inputs[i + 2] = 0.
+        self._brain: Optional[FeedForwardNeuralNetwork] = None
+
+    @property
+    def brain(self) -> FeedForwardNeuralNetwork:
+        if self._brain is None:
+            if self.config.brain_cache:
+                # organisms with the same genes share a brain
+                self._brain = get_brain_cache(self.config).get_brain(self.genome)
             else:
-                self.brain_inputs[i + 2] = 1.
-
-    def get_action(self) -> Action:
-        self.update_brain_inputs()
-        outputs = self.brain.forward(self.brain_inputs)
-        action_index = np.argmax(outputs)
-        return Action.from_index(action_index)
+                self._brain = self.genome.make_brain()
+        return self._brain
+
+    def get_brain_inputs(self) -> List[float]:
+        """ Returns the default observation of the organism's position and neighbouring cells. """
+        state = self.local_world_state
+        return [state.x / self.config.world_width, state.y / self.config.world_height] \
+            + [0. if cell is None else 1. for cell in state.local_cells]
+
+    def get_action(self,
+                   brain_inputs: Optional[np.ndarray] = None,
+                   hidden_state: Optional[np.ndarray] = None) -> int:
+        """
+        Returns the index of the chosen action in the action set. Unless
+        the world's sensors provide the brain inputs, the organism
+        computes them from its local world state. Recurrent brains are
+        given their hidden state, which is updated in place.
+        """
+        if brain_inputs is None:
+            brain_inputs = self.get_brain_inputs()
+        if hidden_state is None:
+            outputs = self.brain.forward(brain_inputs)
+        else:
+            outputs = self.brain.forward(brain_inputs, hidden_state)
+        return int(np.argmax(outputs))
 
     def reproduce(self, other: Optional['Organism'] = None) -> 'Organism':
         if other is None:
-            return Organism(self.config, self.genome.copy().maybe_mutate())
+            new_genome = self.genome.copy()
+            new_genome.maybe_mutate()
+            return Organism(self.config, new_genome, (self.id, -1))
 
         new_genome = self.genome.crossover(other.genome)
         new_genome.maybe_mutate()
-        return Organism(self.config, new_genome)
+        return Organism(self.config, new_genome, (self.id, other.id))
 
     @staticmethod
     def random_organism(config: dict) -> 'Organism':
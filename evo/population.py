@@ -0,0 +1,99 @@
+from typing import Callable, List
+
+import numpy as np
+
+from evo.organism import Organism
+
+
+class PopulationArrays:
+    """
+    Structure-of-arrays storage of the per-organism data that the
+    compiled and vectorised code paths operate on.
+
+    Each organism in the world owns one row of the arrays, recorded in
+    `organism.index`. Removing an organism moves the last row into the
+    freed slot, so the live rows are always `[:size]`.
+
+    The arrays are created with `allocate(shape, dtype)`, which returns a
+    zeroed array, so that they can be placed in shared memory.
+    """
+
+    def __init__(self,
+                 n_genes: int,
+                 n_hidden: int = 0,
+                 capacity: int = 64,
+                 allocate: Callable[[tuple, type], np.ndarray] = np.zeros) -> None:
+        self.n_genes = n_genes
+        self.n_hidden = n_hidden
+        self.allocate = allocate
+        self.size = 0
+        self.organisms: List[Organism] = []
+        self.positions = allocate((capacity, 2), dtype=np.int64)
+        self.genomes = allocate((capacity, n_genes), dtype=np.float64)
+        # set for organisms that were blocked and whose surroundings
+        # have not changed since, see `World.update`
+        self.frozen = np.zeros(capacity, dtype=np.uint8)
+        # hidden state of recurrent brains, empty for feedforward brains
+        self.hidden = allocate((capacity, n_hidden), dtype=np.float64)
+
+    @property
+    def capacity(self) -> int:
+        return self.positions.shape[0]
+
+    def _grow(self) -> None:
+        new_capacity = 2 * self.capacity
+        positions = self.allocate((new_capacity, 2), dtype=np.int64)
+        positions[:self.size] = self.positions[:self.size]
+        genomes = self.allocate((new_capacity, self.n_genes), dtype=np.float64)
+        genomes[:self.size] = self.genomes[:self.size]
+        frozen = np.zeros(new_capacity, dtype=np.uint8)
+        frozen[:self.size] = self.frozen[:self.size]
+        hidden = self.allocate((new_capacity, self.n_hidden), dtype=np.float64)
+        hidden[:self.size] = self.hidden[:self.size]
+        self.positions = positions
+        self.genomes = genomes
+        self.frozen = frozen
+        self.hidden = hidden
+
+    def add(self, organism: Organism) -> int:
+        assert len(organism.genome.genes) == self.n_genes, \
+            f'Expected a genome with {self.n_genes} genes, got {len(organism.genome.genes)}'
+
+        if self.size == self.capacity:
+            self._grow()
+
+        index = self.size
+        self.genomes[index] = organism.genome.genes
+        self.frozen[index] = 0
+        self.hidden[index] = 0.
+        self.organisms.append(organism)
+        organism.index = index
+        self.size += 1
+        return index
+
+    def remove(self, organism: Organism) -> None:
+        index = organism.index
+        last = self.size - 1
+        if index != last:
+            # move the last row into the freed slot
+            moved = self.organisms[last]
+            self.positions[index] = self.positions[last]
+            self.genomes[index] = self.genomes[last]
+            self.frozen[index] = self.frozen[last]
+            self.hidden[index] = self.hidden[last]
+            self.organisms[index] = moved
+            moved.index = index
+
+        self.organisms.pop()
+        organism.index = None
+        self.size -= 1
+
+    def clear(self) -> None:
+        for organism in self.organisms:
+            organism.index = None
+        self.organisms = []
+        self.size = 0
+
+    def set_position(self, organism: Organism, x: int, y: int) -> None:
+        self.positions[organism.index, 0] = x
+        self.positions[organism.index, 1] = y
@@ -1,3 +1,5 @@
+from evo.config import Config, compile_config
+from evo.scale_simulation import ScaleEvolutionSimulation
 from evo.simulation import EvolutionSimulation, RunCallbacks
 from evo.util.registry import get_callback
 
@@ -5,38 +7,73 @@ from pathlib import Path
 import yaml
 
 from evo.util import get_timestamp, merge_dicts_recursively
+from evo.util.checkpoint import Checkpointer
+from evo.util.io_executor import get_io_executor
+from evo.util.shared_arrays import unlink_shared_arrays
+
+
+# the simulations that can be chosen with the `simulation` option
+SIMULATIONS = {
+    'standard': EvolutionSimulation,
+    'scale': ScaleEvolutionSimulation,
+}
 
 
 class ExperimentRunner:
 
-    def __init__(self, config, test=False):
+    def __init__(self, config, test=False, resume=False):
+        config = compile_config(config)
         self.n_generations = config.get('n_generations')
         assert self.n_generations is not None, \
             'n_generations not specified in config'
 
         self.name = config.get('experiment_name')
-        base_name = 'run' if not test else 'test_run'
-        self.experiment_dir = f'experiments/runs/{self.name}/{base_name}_{get_timestamp()}_{hash(self)}'
-        Path(self.experiment_dir).mkdir(parents=True, exist_ok=True)
-        config['experiment_dir'] = self.experiment_dir
+        if resume:
+            self.experiment_dir = config['experiment_dir']
+        else:
+            base_name = 'run' if not test else 'test_run'
+            self.experiment_dir = f'experiments/runs/{self.name}/{base_name}_{get_timestamp()}_{hash(self)}'
+            Path(self.experiment_dir).mkdir(parents=True, exist_ok=True)
+            config = config.replace(experiment_dir=self.experiment_dir)
+        self.config = config
 
         print('Running simulation with config:')
-        print(yaml.dump(config, default_flow_style=False))
+        print(yaml.dump(config.to_dict(), default_flow_style=False))
 
-        with open(f'{self.experiment_dir}/config.yaml', 'w') as config_file:
-            yaml.dump(config, config_file, default_flow_style=False)
+        if not resume:
+            with open(f'{self.experiment_dir}/config.yaml', 'w') as config_file:
+                yaml.dump(config.to_dict(), config_file, default_flow_style=False)
 
         self.callbacks = RunCallbacks([
             get_callback(config, callback_name)
             for callback_name in config.get('callbacks', [])
         ])
 
-        self.simulation = EvolutionSimulation(config, callbacks=self.callbacks)
+        self.simulation = SIMULATIONS[config.get('simulation', 'standard')](config, callbacks=self.callbacks)
+
+        self.checkpointer = None
+        if config.get('checkpoint') is not None:
+            self.checkpointer = Checkpointer(config, self.experiment_dir)
+
+        self.start_generation = 0
+        if resume:
+            assert self.checkpointer is not None, \
+                'checkpoint not specified in config, cannot resume'
+            self.start_generation = self.checkpointer.restore_latest(self.simulation, self.callbacks) + 1
 
     def run(self):
         try:
-            for generation in range(0, self.n_generations):
-                self.simulation.run_generation(generation)
+            for generation in range(self.start_generation, self.n_generations):
+                generation_logs = self.simulation.run_generation(generation)
+                stop_reason = generation_logs.get('early_stop_reason')
+
+                if self.checkpointer is not None and (self.checkpointer.should_checkpoint(generation)
+                                                      or stop_reason is not None):
+                    self.checkpointer.checkpoint(self.simulation, self.callbacks, generation)
+
+                if stop_reason is not None:
+                    print(f'Stopping early after generation {generation}: {stop_reason}')
+                    break
 
         except KeyboardInterrupt:
             self.callbacks.on_interrupt(self.simulation.world)
@@ -45,7 +82,15 @@ class ExperimentRunner:
             self.callbacks.on_interrupt(self.simulation.world)
             self._handle_exception(e)
 
+        finally:
+            if self.checkpointer is not None:
+                self.checkpointer.wait()
+            get_io_executor().flush()
+
     def _handle_exception(self, e):
+        # workers attached to shared arrays are no longer needed
+        unlink_shared_arrays()
+
         crash_dir = f'{self.experiment_dir}/crash'
         Path(crash_dir).mkdir(parents=True, exist_ok=True)
 
@@ -58,19 +103,36 @@ class ExperimentRunner:
         raise e
 
 
-def load_config(config_name: str, test=False):
+def load_run_config(experiment_dir: str) -> Config:
+    with open(f'{experiment_dir}/config.yaml') as config_file:
+        return compile_config(yaml.load(config_file))
+
+
+def load_raw_config(config_name: str, test=False) -> dict:
+    """
+    Loads a config and the configs it inherits from as a plain dictionary,
+    without validating it.
+    """
     with open(f'experiments/config/{config_name}.yaml') as config_file:
         config = yaml.load(config_file)
 
     if 'inherits_from' in config:
-        parent_config = load_config(config['inherits_from'])
+        parent_config = load_raw_config(config['inherits_from'])
         config = merge_dicts_recursively(parent_config, config)
 
     elif config_name not in ['default_config', 'test_overrides']:
-        parent_config = load_config('default_config')
+        parent_config = load_raw_config('default_config')
         config = merge_dicts_recursively(parent_config, config)
 
     if test:
-        config = merge_dicts_recursively(config, load_config('test_overrides'))
+        config = merge_dicts_recursively(config, load_raw_config('test_overrides'))
 
     return config
+
+
+def load_config(config_name: str, test=False) -> Config:
+    """
+    Loads a config, validates it and computes its derived constants, so
+    that mistakes in it are reported before the simulation starts.
+    """
+    return compile_config(load_raw_config(config_name, test))
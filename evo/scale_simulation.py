@@ -0,0 +1,422 @@
+from evo.config import ConfigError, compile_config
+from evo.organism import Action, FeedForwardNeuralNetwork, Genome, LocalWorldState, \
+    RecurrentNeuralNetwork
+from evo.selection.fitness_based_selection import FitnessBasedSelectionFunction
+from evo.selection.region_based_selection import RegionBasedSelectionFunction
+from evo.sensors.sensor import uses_default_sensors
+from evo.simulation import PlateauDetector
+from evo.util.callback import RunCallbacks
+from evo.util.registry import get_selection_function, get_world_generator
+from evo.util.telemetry import memory_rss_bytes
+from evo.world import EMPTY, ORGANISM, BARRIER
+from evo.world_gen.world_generator import WorldGenerator
+
+from typing import Dict, Optional
+import time
+
+import numpy as np
+
+
+WEIGHT_DTYPES = ['float16', 'float32', 'float64']
+
+# scratch memory of a step for each organism: the actions, moves, target
+# cells and the sort that resolves organisms moving into the same cell
+STEP_BYTES_PER_ORGANISM = 96
+
+
+def estimate_memory(config: dict) -> Dict[str, int]:
+    """
+    Returns the bytes that a scale simulation of the config needs, by what
+    they hold. The population arrays are held for the whole run, and the
+    scratch memory of a step, of scattering organisms over the world and
+    of each chunk of the forward passes and repopulation only while they run.
+    """
+    config = compile_config(config)
+    scale_config = config.get('scale', dict())
+    n = config['pop_size']
+    n_cells = config.world_width * config.world_height
+    weight_itemsize = np.dtype(scale_config.get('weight_dtype', 'float16')).itemsize
+    # float16 weights are computed with in float32
+    compute_itemsize = max(weight_itemsize, 4)
+    chunk_size = min(scale_config.get('chunk_size', 65536), n)
+    return {
+        'genomes': n * config.n_genes * weight_itemsize,
+        'hidden_states': n * config.hidden_state_size * compute_itemsize,
+        'positions': n * 2 * 4,
+        'occupancy': (config.world_width + 2) * (config.world_height + 2) + n_cells,
+        'step': n * STEP_BYTES_PER_ORGANISM,
+        # random keys of every cell and the cells they pick
+        'scatter': n_cells * 12,
+        # a chunk of weights or children, and the crossover mask
+        'chunks': chunk_size * config.n_genes * (2 * compute_itemsize + 1),
+    }
+
+
+class ScalePopulation:
+    """
+    The genomes, positions and hidden states of every organism of a
+    `ScaleWorld`, with the same names as the arrays of `PopulationArrays`.
+    The population always has `size` organisms.
+    """
+
+    def __init__(self, size: int, n_genes: int, n_hidden: int,
+                 weight_dtype: np.dtype, compute_dtype: np.dtype) -> None:
+        self.size = size
+        self.genomes = np.zeros((size, n_genes), dtype=weight_dtype)
+        self.positions = np.zeros((size, 2), dtype=np.int32)
+        self.hidden = np.zeros((size, n_hidden), dtype=compute_dtype)
+
+    @property
+    def nbytes(self) -> int:
+        return self.genomes.nbytes + self.positions.nbytes + self.hidden.nbytes
+
+
+class ScaleWorld:
+    """
+    An array-native world with no `Organism` objects and no grid of cells,
+    only a uint8 occupancy array and the population's arrays. The
+    occupancy is a view of the inside of an array padded with an empty
+    border, so that the neighbours of every cell can be read without
+    checking the edges.
+
+    Callbacks receive it in place of a `World`, so only callbacks that
+    read `population` and `occupancy` can be used with it.
+    """
+
+    def __init__(self, config: dict, population: ScalePopulation) -> None:
+        self.config = config
+        self.world_width = config.world_width
+        self.world_height = config.world_height
+        self.generation: Optional[int] = None
+        self.population = population
+        # there are no organism objects to iterate over
+        self.organisms = None
+
+        self.padded_occupancy = np.zeros((self.world_height + 2, self.world_width + 2), dtype=np.uint8)
+        self.occupancy = self.padded_occupancy[1:-1, 1:-1]
+
+    @property
+    def current_population(self) -> int:
+        return self.population.size
+
+
+class ScaleEvolutionSimulation:
+    """
+    Simulates a single world with a very large population, such as a
+    2000x2000 world with a million organisms, selected with `simulation:
+    'scale'`. Everything is held in a few arrays of a `ScaleWorld`, with
+    genomes stored as `scale.weight_dtype` (float16 by default, which
+    halves the memory of float32 genomes at the cost of widening each
+    chunk of weights to float32 for the forward passes).
+
+    Each step runs the brains of `scale.chunk_size` organisms at a time,
+    and moves the whole population at once with the rules of
+    `BatchedEvolutionSimulation`: an organism can only move into a cell
+    that was empty at the start of the step, and when several organisms
+    pick the same cell a random one of them gets it. Selection works on
+    the positions of the whole population, with region-based or
+    fitness-based selection functions, and 'random_crossover'
+    repopulation breeds the children of a chunk of organisms at a time.
+
+    Only the default sensors are supported. The step backend, sparse
+    stepping, brain caches and policy tables of `World` do not apply.
+    Callbacks are only called at the end of each generation, and those
+    that need organism objects, such as `render_video` and `lineage`,
+    are disabled.
+
+    The memory the run needs is estimated with `estimate_memory` before
+    anything is allocated, and a `ConfigError` is raised if it is more
+    than `scale.memory_budget_mb`.
+    """
+
+    def __init__(self, config: dict, callbacks: RunCallbacks = None):
+        self.config = config = compile_config(config)
+        scale_config = config.get('scale', dict())
+        self.rng = np.random.default_rng(scale_config.get('seed'))
+
+        self.steps_per_generation = config['world_steps_per_generation']
+        self.pop_size = config['pop_size']
+        self.n_genes = config.n_genes
+        self.mutation_rate = config.mutation_rate
+        self.chunk_size = min(scale_config.get('chunk_size', 65536), self.pop_size)
+
+        weight_dtype = scale_config.get('weight_dtype', 'float16')
+        if weight_dtype not in WEIGHT_DTYPES:
+            raise ConfigError(f'scale.weight_dtype must be one of {WEIGHT_DTYPES}, got {weight_dtype!r}')
+        self.weight_dtype = np.dtype(weight_dtype)
+        self.compute_dtype = np.dtype(np.float64 if weight_dtype == 'float64' else np.float32)
+
+        self.memory_estimate = estimate_memory(config)
+        self.memory_budget_mb = scale_config.get('memory_budget_mb')
+        estimate_mb = sum(self.memory_estimate.values()) / 2 ** 20
+        print(f'Scale simulation of {self.pop_size:,} organisms needs about {estimate_mb:,.0f} MB: '
+              + ', '.join(f'{key} {nbytes / 2 ** 20:,.1f} MB' for key, nbytes in self.memory_estimate.items()))
+        if self.memory_budget_mb is not None and estimate_mb > self.memory_budget_mb:
+            raise ConfigError(f'The scale simulation needs about {estimate_mb:,.0f} MB, more than its '
+                              f'memory_budget_mb of {self.memory_budget_mb:,} MB. Try a smaller '
+                              f'weight_dtype or chunk_size, or fewer organisms')
+
+        if not uses_default_sensors(config):
+            raise ConfigError('The scale simulation only supports the default sensors')
+
+        self.selection = get_selection_function(config)
+        if not isinstance(self.selection, RegionBasedSelectionFunction) \
+                and not isinstance(self.selection, FitnessBasedSelectionFunction):
+            raise ConfigError('The scale simulation only supports region-based and fitness-based selection')
+
+        if config['repop_config'].get('method') != 'random_crossover':
+            raise ConfigError('The scale simulation only supports random_crossover repopulation')
+
+        self.world_generator: WorldGenerator = get_world_generator(config)
+        if not self.world_generator.implements_terrain():
+            raise ConfigError(f'The scale simulation needs a world generator that implements terrain, '
+                              f'which {self.world_generator.generator_name} does not')
+
+        self.callbacks = callbacks or RunCallbacks()
+        for callback in list(self.callbacks.callbacks):
+            if not callback.supports_scale_mode:
+                print(f'The {callback.callback_name} callback does not support the scale simulation, disabling it')
+                self.callbacks.callbacks.remove(callback)
+
+        population = ScalePopulation(self.pop_size, self.n_genes, config.hidden_state_size,
+                                     self.weight_dtype, self.compute_dtype)
+        for start in range(0, self.pop_size, self.chunk_size):
+            stop = min(start + self.chunk_size, self.pop_size)
+            population.genomes[start:stop] = self.rng.uniform(-1, 1, (stop - start, self.n_genes))
+        self.world = ScaleWorld(config, population)
+
+        if config.get('include_diagonal_cells'):
+            self.neighbour_offsets = [(dx, dy) for dy in range(-1, 2) for dx in range(-1, 2)
+                                      if dx != 0 or dy != 0]
+        else:
+            self.neighbour_offsets = [(0, -1), (0, 1), (-1, 0), (1, 0)]
+        self.n_observations = LocalWorldState.num_observations(config)
+        self.action_deltas = Action.deltas(config)
+        self.random_actions = Action.random_actions(config)
+        self.cardinal_deltas = Action.cardinal_deltas()
+        self.recurrent_brains = config.is_recurrent
+        self.actions = np.zeros(self.pop_size, dtype=np.int8)
+        # float16 weights are widened into this buffer one chunk at a time
+        self.weights_buffer = None
+        if self.weight_dtype != self.compute_dtype:
+            self.weights_buffer = np.empty((self.chunk_size, self.n_genes), dtype=self.compute_dtype)
+
+        early_stopping_config = config.get('early_stopping', dict())
+        # once no organism moves in a step none ever will, as in `EvolutionSimulation`
+        self.skip_fixed_point_steps = early_stopping_config.get('skip_fixed_point_steps', False) \
+            and not self.random_actions.any() and not self.recurrent_brains
+
+        self.plateau_detector = None
+        if early_stopping_config.get('plateau_patience') is not None:
+            self.plateau_detector = PlateauDetector(
+                early_stopping_config.get('plateau_metric', 'survival_rate'),
+                early_stopping_config.get('plateau_patience'),
+                early_stopping_config.get('plateau_min_delta', 0.)
+            )
+
+        self.organism_steps = 0
+        self.peak_rss_bytes = 0
+
+    def reset(self, generation: int) -> None:
+        """ Places the generation's terrain and scatters the organisms over random empty cells. """
+        world = self.world
+        world.generation = generation
+        if self.world_generator.prefetcher is not None:
+            terrain = self.world_generator.prefetcher.get(generation)
+        else:
+            terrain = self.world_generator.terrain(generation)
+
+        n_cells = world.world_width * world.world_height
+        if n_cells - np.count_nonzero(terrain) < self.pop_size:
+            raise ConfigError('Not enough empty cells for the population')
+
+        # the pop_size cells with the smallest random keys are a uniform
+        # random sample of the empty cells
+        keys = self.rng.random(n_cells, dtype=np.float32)
+        keys[terrain.reshape(-1)] = 2.
+        cells = np.argpartition(keys, self.pop_size - 1)[:self.pop_size]
+        del keys
+        positions = world.population.positions
+        positions[:, 0] = cells % world.world_width
+        positions[:, 1] = cells // world.world_width
+
+        world.occupancy[:] = np.where(terrain, BARRIER, EMPTY)
+        world.occupancy[positions[:, 1], positions[:, 0]] = ORGANISM
+        world.population.hidden.fill(0.)
+
+    def observe(self, start: int, stop: int) -> np.ndarray:
+        positions = self.world.population.positions[start:stop]
+        x = positions[:, 0]
+        y = positions[:, 1]
+        padded = self.world.padded_occupancy
+
+        inputs = np.empty((stop - start, self.n_observations), dtype=self.compute_dtype)
+        inputs[:, 0] = x / self.world.world_width
+        inputs[:, 1] = y / self.world.world_height
+        for i, (dx, dy) in enumerate(self.neighbour_offsets):
+            inputs[:, i + 2] = padded[y + 1 + dy, x + 1 + dx] != EMPTY
+        return inputs
+
+    def choose_actions(self) -> np.ndarray:
+        """ Runs the brain of every organism, a chunk at a time, and returns their actions. """
+        population = self.world.population
+        for start in range(0, self.pop_size, self.chunk_size):
+            stop = min(start + self.chunk_size, self.pop_size)
+            genomes = population.genomes[start:stop]
+            if self.weights_buffer is not None:
+                genomes = self.weights_buffer[:stop - start]
+                np.copyto(genomes, population.genomes[start:stop])
+            weights = Genome.unpack_weights(genomes, self.config)
+
+            inputs = self.observe(start, stop)
+            if self.recurrent_brains:
+                outputs, population.hidden[start:stop] = RecurrentNeuralNetwork.batched_forward(
+                    weights, inputs, population.hidden[start:stop])
+            else:
+                outputs = FeedForwardNeuralNetwork.batched_forward(weights, inputs)
+            self.actions[start:stop] = np.argmax(outputs, axis=-1)
+        return self.actions
+
+    def step(self) -> int:
+        """ Steps every organism once and returns the number that moved. """
+        world = self.world
+        positions = world.population.positions
+        x = positions[:, 0]
+        y = positions[:, 1]
+
+        deltas = self.action_deltas[self.choose_actions()]
+        if self.random_actions.any():
+            is_random = self.random_actions[self.actions]
+            directions = self.rng.integers(0, len(self.cardinal_deltas), is_random.sum())
+            deltas[is_random] = self.cardinal_deltas[directions]
+        new_x = np.clip(x + deltas[:, 0], 0, world.world_width - 1)
+        new_y = np.clip(y + deltas[:, 1], 0, world.world_height - 1)
+        del deltas
+
+        candidates = np.flatnonzero(world.occupancy[new_y, new_x] == EMPTY)
+        n_candidates = candidates.shape[0]
+        new_cells = new_y[candidates] * world.world_width + new_x[candidates]
+
+        # of the organisms moving into the same cell, the one with the
+        # lowest random priority wins
+        keys = new_cells * n_candidates + self.rng.integers(0, max(n_candidates, 1), n_candidates)
+        order = np.argsort(keys)
+        del keys
+        sorted_cells = new_cells[order]
+        is_first = np.ones(n_candidates, dtype=bool)
+        is_first[1:] = sorted_cells[1:] != sorted_cells[:-1]
+        movers = candidates[order[is_first]]
+
+        world.occupancy[y[movers], x[movers]] = EMPTY
+        world.occupancy[new_y[movers], new_x[movers]] = ORGANISM
+        positions[movers, 0] = new_x[movers]
+        positions[movers, 1] = new_y[movers]
+
+        self.organism_steps += self.pop_size
+        return movers.shape[0]
+
+    def simulate(self, generation: int) -> dict:
+        generation_logs = {'generation': generation}
+        self.reset(generation)
+        skipped_steps = 0
+        for step in range(self.steps_per_generation):
+            n_moved = self.step()
+            if self.skip_fixed_point_steps and n_moved == 0:
+                skipped_steps = self.steps_per_generation - step - 1
+                break
+
+        if self.skip_fixed_point_steps:
+            generation_logs['skipped_steps'] = skipped_steps
+        return generation_logs
+
+    def select(self) -> tuple:
+        """ Returns a mask of the organisms that survive, and the selection logs. """
+        positions = self.world.population.positions
+        xs, ys = positions[:, 0], positions[:, 1]
+        logs = dict()
+        if isinstance(self.selection, FitnessBasedSelectionFunction):
+            fitness = self.selection.fitness(self.world, xs, ys)
+            n_survivors = int(round(self.selection.survival_proportion * self.pop_size))
+            survives = np.zeros(self.pop_size, dtype=bool)
+            survives[self.selection.choose_survivors(fitness, n_survivors)] = True
+            logs['mean_fitness'] = float(fitness.mean())
+            logs['max_fitness'] = float(fitness.max())
+        else:
+            survives = np.asarray(self.selection.in_survival_region(self.world, xs, ys))
+
+        n_survivors = int(survives.sum())
+        logs['surviving_population_size'] = n_survivors
+        logs['survival_rate'] = n_survivors / self.pop_size
+        return survives, logs
+
+    def repopulate(self, survives: np.ndarray) -> dict:
+        """
+        Replaces every organism that did not survive with the child of two
+        random survivors, with uniform crossover and the single-gene
+        mutation of `Genome.maybe_mutate`, as in `BatchedEvolutionSimulation`.
+        The children of a chunk of organisms are bred at a time, straight
+        into the genomes of the dead, which are never parents. If none
+        survived, the population starts again from random genomes.
+        """
+        genomes = self.world.population.genomes
+        survivors = np.flatnonzero(survives)
+        dead = np.flatnonzero(~survives)
+        for start in range(0, dead.shape[0], self.chunk_size):
+            slots = dead[start:start + self.chunk_size]
+            n_children = slots.shape[0]
+            if survivors.shape[0] == 0:
+                genomes[slots] = self.rng.uniform(-1, 1, (n_children, self.n_genes))
+                continue
+
+            parent1 = survivors[self.rng.integers(0, survivors.shape[0], n_children)]
+            parent2 = survivors[self.rng.integers(0, survivors.shape[0], n_children)]
+            from_parent1 = self.rng.random((n_children, self.n_genes), dtype=np.float32) < 0.5
+            children = np.where(from_parent1, genomes[parent1], genomes[parent2])
+
+            mutated = np.flatnonzero(self.rng.random(n_children) < self.mutation_rate)
+            genes = self.rng.integers(0, self.n_genes, mutated.shape[0])
+            children[mutated, genes] = self.rng.uniform(-1, 1, mutated.shape[0])
+            genomes[slots] = children
+
+        return {'n_new_organisms': int(dead.shape[0])}
+
+    def run_generation(self, generation: int) -> dict:
+        start = time.perf_counter()
+        generation_logs = self.simulate(generation)
+        selection_start = time.perf_counter()
+        survives, selection_logs = self.select()
+        generation_logs.update(selection_logs)
+        repopulate_start = time.perf_counter()
+        generation_logs.update(self.repopulate(survives))
+        end = time.perf_counter()
+        generation_logs['simulate_ms'] = 1000 * (selection_start - start)
+        generation_logs['selection_ms'] = 1000 * (repopulate_start - selection_start)
+        generation_logs['repopulate_ms'] = 1000 * (end - repopulate_start)
+
+        n_steps = self.steps_per_generation - generation_logs.get('skipped_steps', 0)
+        generation_logs['organism_steps_per_second'] = n_steps * self.pop_size / max(end - start, 1e-9)
+        self.peak_rss_bytes = max(self.peak_rss_bytes, memory_rss_bytes())
+        generation_logs['peak_memory_mb'] = self.peak_rss_bytes / 2 ** 20
+
+        if self.plateau_detector is not None:
+            stop_reason = self.plateau_detector.update(generation_logs)
+            if stop_reason is not None:
+                generation_logs['early_stop_reason'] = stop_reason
+
+        self.callbacks.on_generation_finish(generation, generation_logs, self.world)
+        return generation_logs
+
+    def state_dict(self) -> dict:
+        """
+        The state needed to continue from the end of a generation, which
+        is only the genomes and the random number generator, as every
+        generation starts by scattering the organisms again.
+        """
+        return {
+            'genomes': self.world.population.genomes.copy(),
+            'scale_rng_state': self.rng.bit_generator.state,
+        }
+
+    def load_state_dict(self, state: dict) -> None:
+        self.world.population.genomes[:] = state['genomes']
+        self.rng.bit_generator.state = state['scale_rng_state']
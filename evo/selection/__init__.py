@@ -1 +1,2 @@
 from .region_based_selection import *
+from .fitness_based_selection import *
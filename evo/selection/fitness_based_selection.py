@@ -0,0 +1,142 @@
+from evo.selection.region_based_selection import SelectionFunctionOneSideSurvive
+from evo.selection.selection_fn import SelectionFunction
+from evo.util.registry import register_selection_fn
+from evo.world import World
+
+import numpy as np
+
+
+def weighted_sample_without_replacement(weights: np.ndarray, n_samples: int) -> np.ndarray:
+    """
+    Samples `n_samples` distinct indices with probabilities proportional
+    to `weights`, in linear time, using the keys u^(1/w) of Efraimidis and
+    Spirakis: the indices with the largest keys are the sample.
+    """
+    n_samples = min(n_samples, int(np.count_nonzero(weights > 0)))
+    if n_samples == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    with np.errstate(divide='ignore'):
+        # log(u) / w is monotonic in u^(1/w) and does not underflow
+        keys = np.log(np.random.random(weights.shape[0])) / weights
+    return np.argpartition(-keys, n_samples - 1)[:n_samples]
+
+
+class FitnessBasedSelectionFunction(SelectionFunction):
+    """
+    Selection that scores the whole population with a fitness vector and
+    keeps a `survival_proportion` of it. The fitness of an organism is
+    how close it is to the survival region given by `survival_side` and
+    `survival_region_proportion`, as in `one_side_survive`: minus the
+    number of cells between the organism and the region.
+
+    Subclasses choose the survivors from the fitness vector with
+    `choose_survivors`, and can override `fitness` to select for something
+    else. Every organism is scored and chosen at once from the world's
+    population arrays, so the cost of selection grows linearly with the
+    population.
+    """
+
+    def __init__(self, config: dict, method: str):
+        super().__init__(config, method)
+        self.survival_proportion = self.selection_config.get('survival_proportion')
+        assert self.survival_proportion is not None, \
+            'survival_proportion not specified in config'
+
+        self.region = SelectionFunctionOneSideSurvive(config, method)
+
+    def fitness(self, world: World, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        return -self.region.distance_to_survival_region(world, xs, ys).astype(np.float64)
+
+    def choose_survivors(self, fitness: np.ndarray, n_survivors: int) -> np.ndarray:
+        """ Returns the indices into `fitness` of the surviving organisms. """
+        raise NotImplementedError()
+
+    def select(self, world: World) -> dict:
+        positions = world.population.positions[:world.population.size]
+        fitness = self.fitness(world, positions[:, 0], positions[:, 1])
+
+        n_survivors = int(round(self.survival_proportion * len(fitness)))
+        survives = np.zeros(len(fitness), dtype=bool)
+        survives[self.choose_survivors(fitness, n_survivors)] = True
+
+        logs = self.kill_unselected(world, survives)
+        if len(fitness) > 0:
+            logs['mean_fitness'] = float(fitness.mean())
+            logs['max_fitness'] = float(fitness.max())
+        return logs
+
+
+@register_selection_fn('truncation')
+class TruncationSelection(FitnessBasedSelectionFunction):
+    """ Keeps the fittest organisms, breaking ties at random. """
+
+    def __init__(self, config: dict, method: str = 'truncation'):
+        super().__init__(config, method)
+
+    def choose_survivors(self, fitness: np.ndarray, n_survivors: int) -> np.ndarray:
+        if n_survivors == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        # a random permutation first, so that ties are not broken by row
+        shuffled = np.random.permutation(len(fitness))
+        best = np.argpartition(-fitness[shuffled], n_survivors - 1)[:n_survivors]
+        return shuffled[best]
+
+
+@register_selection_fn('tournament')
+class TournamentSelection(FitnessBasedSelectionFunction):
+    """
+    Runs one tournament per survivor between `tournament_size` organisms
+    drawn at random, and keeps the winners. An organism can win more than
+    one tournament, so fewer organisms than `survival_proportion` may survive.
+    """
+
+    def __init__(self, config: dict, method: str = 'tournament'):
+        super().__init__(config, method)
+        self.tournament_size = self.selection_config.get('tournament_size', 2)
+
+    def choose_survivors(self, fitness: np.ndarray, n_survivors: int) -> np.ndarray:
+        if n_survivors == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        contestants = np.random.randint(0, len(fitness), (n_survivors, self.tournament_size))
+        winners = np.argmax(fitness[contestants], axis=1)
+        return contestants[np.arange(n_survivors), winners]
+
+
+@register_selection_fn('rank')
+class RankSelection(FitnessBasedSelectionFunction):
+    """
+    Samples the survivors with probabilities proportional to their rank,
+    from 1 for the least fit organism to the population size for the fittest.
+    """
+
+    def __init__(self, config: dict, method: str = 'rank'):
+        super().__init__(config, method)
+
+    def choose_survivors(self, fitness: np.ndarray, n_survivors: int) -> np.ndarray:
+        ranks = np.empty(len(fitness))
+        ranks[np.argsort(fitness, kind='stable')] = np.arange(1, len(fitness) + 1)
+        return weighted_sample_without_replacement(ranks, n_survivors)
+
+
+@register_selection_fn('roulette')
+class RouletteSelection(FitnessBasedSelectionFunction):
+    """
+    Samples the survivors with probabilities proportional to their fitness,
+    shifted so that the least fit organism has a weight of
+    `roulette_min_weight` (a proportion of the range of fitnesses).
+    """
+
+    def __init__(self, config: dict, method: str = 'roulette'):
+        super().__init__(config, method)
+        self.min_weight = self.selection_config.get('roulette_min_weight', 0.01)
+
+    def choose_survivors(self, fitness: np.ndarray, n_survivors: int) -> np.ndarray:
+        if len(fitness) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        fitness_range = max(fitness.max() - fitness.min(), 1e-12)
+        weights = (fitness - fitness.min()) / fitness_range + self.min_weight
+        return weighted_sample_without_replacement(weights, n_survivors)
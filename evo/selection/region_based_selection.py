@@ -3,17 +3,32 @@ from evo.util.registry import register_selection_fn
 from evo.organism import Organism
 from evo.world import World
 
+import numpy as np
+
 
 class RegionBasedSelectionFunction(SelectionFunction):
 
     def in_survival_region(self, world: World, x: int, y: int) -> bool:
         raise NotImplementedError()
 
+    def distance_to_survival_region(self, world: World, x, y):
+        """
+        Number of cells between (x, y) and the survival region, which is
+        0 inside of it. Like `in_survival_region`, x and y can be arrays.
+        """
+        raise NotImplementedError()
+
     def selection_fn(self, world: World, organism: Organism) -> bool:
         x = organism.local_world_state.x
         y = organism.local_world_state.y
         return self.in_survival_region(world, x, y)
 
+    def select(self, world: World) -> dict:
+        # the regions are vectorised, so every organism is checked at once
+        positions = world.population.positions[:world.population.size]
+        survives = self.in_survival_region(world, positions[:, 0], positions[:, 1])
+        return self.kill_unselected(world, np.asarray(survives))
+
 
 @register_selection_fn('one_side_survive')
 class SelectionFunctionOneSideSurvive(RegionBasedSelectionFunction):
@@ -40,3 +55,18 @@ class SelectionFunctionOneSideSurvive(RegionBasedSelectionFunction):
             return y / world.world_height < self.survival_region_proportion
         elif self.survival_side == 'bottom':
             return y / world.world_height > 1 - self.survival_region_proportion
+
+    def distance_to_survival_region(self, world: World, x, y):
+        if self.survival_side in ['left', 'right']:
+            coords, size = x, world.world_width
+        else:
+            coords, size = y, world.world_height
+
+        # the cells of the region along the axis perpendicular to the survival side
+        proportions = np.arange(size) / size
+        if self.survival_side in ['left', 'top']:
+            edge = np.flatnonzero(proportions < self.survival_region_proportion).max(initial=-size)
+            return np.maximum(coords - edge, 0)
+        else:
+            edge = np.flatnonzero(proportions > 1 - self.survival_region_proportion).min(initial=2 * size)
+            return np.maximum(edge - coords, 0)
@@ -3,6 +3,8 @@ from evo.world import World
 
 from abc import ABC
 
+import numpy as np
+
 
 class SelectionFunction(ABC):
 
@@ -17,19 +19,23 @@ class SelectionFunction(ABC):
         raise NotImplementedError()
 
     def select(self, world: World) -> dict:
-        initial_population = world.current_population
+        survives = np.zeros(world.population.size, dtype=bool)
+        for organism in world.organisms:
+            survives[organism.index] = self.selection_fn(world, organism)
 
-        to_kill = []
+        return self.kill_unselected(world, survives)
+
+    def kill_unselected(self, world: World, survives: np.ndarray) -> dict:
+        """
+        Kills the organisms whose rows of the world's population arrays
+        are not set in `survives`, and returns the selection logs.
+        """
+        initial_population = world.current_population
 
-        # create a list of organisms to kill
         # Note: we can't kill them in the loop because it would
         # attempt to modify the list we're iterating over
-        for organism in world.organisms:
-            if not self.selection_fn(world, organism):
-                to_kill.append(organism)
-
-        for organism in to_kill:
-            world.kill_organism(organism)
+        to_kill = [organism for organism in world.organisms if not survives[organism.index]]
+        world.kill_organisms(to_kill)
 
         final_population = world.current_population
 
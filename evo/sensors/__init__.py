@@ -0,0 +1,3 @@
+from .local_sensors import *
+from .density_sensors import *
+from .distance_sensors import *
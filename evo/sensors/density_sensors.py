@@ -0,0 +1,129 @@
+from evo.sensors.sensor import Sensor, SensorBatch
+from evo.tiled_occupancy import TiledOccupancy
+from evo.util.registry import register_sensor
+from evo.world import World, ORGANISM
+
+from typing import NamedTuple
+
+import numpy as np
+
+
+def organism_integral_image(world: World) -> np.ndarray:
+    """
+    Summed-area table of the organisms in the world, padded with a
+    leading row and column of zeros so that the number of organisms in
+    the rows [y0, y1) and columns [x0, x1) is
+    `s[y1, x1] - s[y0, x1] - s[y1, x0] + s[y0, x0]`. For a `SensorBatch`
+    there is one table for each world.
+    """
+    occupancy = np.asarray(world.occupancy)
+    table = np.zeros(occupancy.shape[:-2] + (world.world_height + 1, world.world_width + 1),
+                     dtype=np.int64)
+    np.cumsum(np.cumsum(occupancy == ORGANISM, axis=-2), axis=-1, out=table[..., 1:, 1:])
+    return table
+
+
+class TileIntegralImages(NamedTuple):
+    """ Summed-area tables of the organisms in each allocated tile of a `TiledOccupancy`. """
+    # sorted `ty * n_tiles_x + tx` of the tiles, and their (ts + 1, ts + 1) tables
+    keys: np.ndarray
+    tables: np.ndarray
+    tile_size: int
+    n_tiles_x: int
+
+
+def tile_integral_images(world: World) -> TileIntegralImages:
+    """
+    `organism_integral_image` for the tiles of a tiled world, so that the
+    memory used grows with the occupied part of the world.
+    """
+    occupancy: TiledOccupancy = world.occupancy
+    ts = occupancy.tile_size
+    n_tiles_x = -(-occupancy.width // ts)
+    tile_keys = list(occupancy.tiles)
+    keys = np.array([ty * n_tiles_x + tx for tx, ty in tile_keys], dtype=np.int64)
+    tables = np.zeros((len(tile_keys), ts + 1, ts + 1), dtype=np.int32)
+    for i, tile_key in enumerate(tile_keys):
+        np.cumsum(np.cumsum(occupancy.tiles[tile_key] == ORGANISM, axis=0), axis=1, out=tables[i, 1:, 1:])
+    order = np.argsort(keys)
+    return TileIntegralImages(keys[order], tables[order], ts, n_tiles_x)
+
+
+def count_in_boxes(images: TileIntegralImages, x0: np.ndarray, y0: np.ndarray,
+                   x1: np.ndarray, y1: np.ndarray) -> np.ndarray:
+    """ Returns the number of organisms in the rows [y0, y1) and columns [x0, x1) of a tiled world. """
+    counts = np.zeros(x0.shape[0], dtype=np.int64)
+    if images.keys.shape[0] == 0:
+        return counts
+
+    ts = images.tile_size
+    tx0, ty0 = x0 // ts, y0 // ts
+    tx1, ty1 = (x1 - 1) // ts, (y1 - 1) // ts
+    # each box is summed over the tiles it overlaps, one tile of every box at a time
+    for j in range(int((ty1 - ty0).max()) + 1):
+        for i in range(int((tx1 - tx0).max()) + 1):
+            tx, ty = tx0 + i, ty0 + j
+            keys = ty * images.n_tiles_x + tx
+            index = np.minimum(np.searchsorted(images.keys, keys), images.keys.shape[0] - 1)
+            found = (tx <= tx1) & (ty <= ty1) & (images.keys[index] == keys)
+            if not found.any():
+                continue
+
+            tables = images.tables[index[found]]
+            rows = np.arange(tables.shape[0])
+            lx0 = np.clip(x0[found] - tx[found] * ts, 0, ts)
+            lx1 = np.clip(x1[found] - tx[found] * ts, 0, ts)
+            ly0 = np.clip(y0[found] - ty[found] * ts, 0, ts)
+            ly1 = np.clip(y1[found] - ty[found] * ts, 0, ts)
+            counts[found] += tables[rows, ly1, lx1] - tables[rows, ly0, lx1] \
+                - tables[rows, ly1, lx0] + tables[rows, ly0, lx0]
+    return counts
+
+
+@register_sensor('density')
+class DensitySensor(Sensor):
+    """
+    The proportion of cells holding organisms in the square of cells
+    within each of the radii in `sensors_config.density.radii`, clipped to
+    the world. The summed-area table is computed once per step, so within
+    a step organisms sense the density from the start of the step. In
+    tiled worlds there is one table for each allocated tile.
+    """
+
+    local = False
+
+    def __init__(self, global_config: dict, sensor_name: str) -> None:
+        super().__init__(global_config, sensor_name)
+        self.radii = self.config.get('radii', [2, 5])
+
+    @classmethod
+    def num_channels(cls, global_config: dict) -> int:
+        return len(cls.get_sensor_config(global_config, 'density').get('radii', [2, 5]))
+
+    def compute(self, world: World, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        return self.densities(world, (), xs, ys)
+
+    def compute_batch(self, batch: SensorBatch, bs: np.ndarray,
+                      xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        return self.densities(batch, (bs,), xs, ys)
+
+    def densities(self, world: World, batch_index: tuple, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        tiled = isinstance(world.occupancy, TiledOccupancy)
+        if tiled:
+            images = world.cached('organism_tile_integral_images', tile_integral_images)
+        else:
+            table = world.cached('organism_integral_image', organism_integral_image)
+        densities = np.empty((xs.shape[0], len(self.radii)))
+        for i, radius in enumerate(self.radii):
+            x0 = np.maximum(xs - radius, 0)
+            x1 = np.minimum(xs + radius + 1, world.world_width)
+            y0 = np.maximum(ys - radius, 0)
+            y1 = np.minimum(ys + radius + 1, world.world_height)
+            if tiled:
+                count = count_in_boxes(images, x0, y0, x1, y1)
+            else:
+                count = table[(*batch_index, y1, x1)] - table[(*batch_index, y0, x1)] \
+                    - table[(*batch_index, y1, x0)] + table[(*batch_index, y0, x0)]
+            # the organism itself is not counted
+            densities[:, i] = (count - 1) / np.maximum((x1 - x0) * (y1 - y0) - 1, 1)
+        return densities
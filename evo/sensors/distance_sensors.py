@@ -0,0 +1,152 @@
+from evo.selection.region_based_selection import RegionBasedSelectionFunction
+from evo.sensors.sensor import Sensor, SensorBatch
+from evo.tiled_occupancy import TiledOccupancy, find_cells
+from evo.util.registry import register_sensor, get_selection_function
+from evo.world import World, BARRIER
+
+from typing import NamedTuple, Tuple
+
+import numpy as np
+
+
+def distances_to_barriers(world: World) -> np.ndarray:
+    """
+    Returns a (4, height, width) array with the number of cells from each
+    cell to the nearest barrier or the edge of the world when looking up,
+    down, left and right, or a (4, n_worlds, height, width) array for a
+    `SensorBatch`.
+    """
+    barriers = np.asarray(world.occupancy) == BARRIER
+    columns = barriers.swapaxes(-1, -2)
+
+    def distance_from_start(mask: np.ndarray) -> np.ndarray:
+        # distance along the last axis to the last barrier at a lower index,
+        # with the edge of the world one cell before index 0
+        indices = np.arange(mask.shape[-1])
+        last_barrier = np.maximum.accumulate(np.where(mask, indices, -1), axis=-1)
+        return indices - last_barrier
+
+    return np.stack([
+        distance_from_start(columns).swapaxes(-1, -2),
+        distance_from_start(columns[..., ::-1]).swapaxes(-1, -2)[..., ::-1, :],
+        distance_from_start(barriers),
+        distance_from_start(barriers[..., ::-1])[..., ::-1],
+    ])
+
+
+class BarrierLines(NamedTuple):
+    """ The barrier cells of a world, sorted along its rows and along its columns. """
+    # y * width + x and x * height + y of each barrier cell
+    rows: np.ndarray
+    columns: np.ndarray
+
+
+def barrier_lines(world: World) -> BarrierLines:
+    xs, ys = find_cells(world.occupancy, BARRIER)
+    return BarrierLines(np.sort(ys * world.world_width + xs), np.sort(xs * world.world_height + ys))
+
+
+def distances_along_lines(keys: np.ndarray, lines: np.ndarray, positions: np.ndarray,
+                          length: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the distances from each position of a line to the barriers at
+    or before and at or after it, with the edges of the world one cell
+    outside the line, as in `distances_to_barriers`.
+    """
+    if keys.shape[0] == 0:
+        return positions + 1, length - positions
+    cells = lines * length + positions
+    before = np.searchsorted(keys, cells, side='right') - 1
+    has_before = (before >= 0) & (keys[np.maximum(before, 0)] // length == lines)
+    last = np.where(has_before, keys[np.maximum(before, 0)] % length, -1)
+    after = np.minimum(np.searchsorted(keys, cells, side='left'), keys.shape[0] - 1)
+    has_after = (keys[after] >= cells) & (keys[after] // length == lines)
+    following = np.where(has_after, keys[after] % length, length)
+    return positions - last, following - positions
+
+
+@register_sensor('wall_distance')
+class WallDistanceSensor(Sensor):
+    """
+    Ray-cast distance to the nearest barrier or world edge looking up,
+    down, left and right, as a proportion of the world size. Barriers only
+    change between generations, so the distances are computed once per
+    generation. In tiled worlds only the barrier cells are stored, sorted
+    along the rows and columns, and the distances are found by search.
+    """
+
+    @classmethod
+    def num_channels(cls, global_config: dict) -> int:
+        return 4
+
+    def compute(self, world: World, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        if isinstance(world.occupancy, TiledOccupancy):
+            lines = world.cached('barrier_lines', barrier_lines, per_step=False)
+            up, down = distances_along_lines(lines.columns, xs, ys, world.world_height)
+            left, right = distances_along_lines(lines.rows, ys, xs, world.world_width)
+            return np.stack([up, down, left, right], axis=1) / self.scale(world)
+        distances = world.cached('distances_to_barriers', distances_to_barriers, per_step=False)
+        return distances[:, ys, xs].T / self.scale(world)
+
+    def compute_batch(self, batch: SensorBatch, bs: np.ndarray,
+                      xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        distances = batch.cached('distances_to_barriers', distances_to_barriers, per_step=False)
+        return distances[:, bs, ys, xs].T / self.scale(batch)
+
+    @staticmethod
+    def scale(world: World) -> np.ndarray:
+        return np.array([world.world_height, world.world_height, world.world_width, world.world_width])
+
+
+def distances_to_mask(mask: np.ndarray) -> np.ndarray:
+    """
+    Returns the number of king moves from each cell to the nearest cell
+    in the mask, ignoring barriers.
+    """
+    height, width = mask.shape
+    distances = np.full(mask.shape, height + width, dtype=np.int64)
+    distances[mask] = 0
+
+    reached = mask.copy()
+    distance = 0
+    while reached.any() and not reached.all():
+        padded = np.pad(reached, 1)
+        grown = np.zeros_like(reached)
+        for dy in range(3):
+            for dx in range(3):
+                grown |= padded[dy:dy + height, dx:dx + width]
+        distance += 1
+        distances[grown & ~reached] = distance
+        reached = grown
+
+    return distances
+
+
+@register_sensor('survival_distance')
+class SurvivalDistanceSensor(Sensor):
+    """
+    Distance to the nearest cell of the survival region of a region-based
+    selection function, as a proportion of the largest world dimension.
+    """
+
+    def __init__(self, global_config: dict, sensor_name: str) -> None:
+        super().__init__(global_config, sensor_name)
+        self.selection_fn = get_selection_function(global_config)
+        assert isinstance(self.selection_fn, RegionBasedSelectionFunction), \
+            'survival_distance sensor requires a region-based selection function'
+        self.distances = None
+
+    @classmethod
+    def num_channels(cls, global_config: dict) -> int:
+        return 1
+
+    def compute(self, world: World, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        if self.distances is None:
+            self.distances = distances_to_mask(world.config.survival_mask) \
+                / max(world.world_width, world.world_height)
+        return self.distances[ys, xs][:, None]
+
+    def compute_batch(self, batch: SensorBatch, bs: np.ndarray,
+                      xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        # every world of a batch has the same survival region
+        return self.compute(batch, xs, ys)
@@ -0,0 +1,85 @@
+from evo.sensors.sensor import Sensor, SensorBatch, neighbour_offsets
+from evo.util.registry import register_sensor
+from evo.world import World, EMPTY, ORGANISM, BARRIER
+
+from typing import Optional
+
+import numpy as np
+
+
+def look_around(world: World, xs: np.ndarray, ys: np.ndarray, out_of_bounds: int,
+                bs: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Returns the (len(xs), n_neighbours) cell codes around each cell,
+    with `out_of_bounds` for cells outside of the world. With `bs`, the
+    cells are in the worlds `bs` of a `SensorBatch`.
+    """
+    offsets = neighbour_offsets(world.include_diagonal_cells_in_local_state)
+    codes = np.full((xs.shape[0], len(offsets)), out_of_bounds, dtype=np.uint8)
+    for i, (dx, dy) in enumerate(offsets):
+        xx = xs + dx
+        yy = ys + dy
+        inside = (xx >= 0) & (xx < world.world_width) & (yy >= 0) & (yy < world.world_height)
+        if bs is None:
+            codes[inside, i] = world.occupancy[yy[inside], xx[inside]]
+        else:
+            codes[inside, i] = world.occupancy[bs[inside], yy[inside], xx[inside]]
+    return codes
+
+
+@register_sensor('position')
+class PositionSensor(Sensor):
+    """ The organism's x and y coordinates as a proportion of the world size. """
+
+    @classmethod
+    def num_channels(cls, global_config: dict) -> int:
+        return 2
+
+    def compute(self, world: World, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        return np.stack([xs / world.world_width, ys / world.world_height], axis=1)
+
+    def compute_batch(self, batch: SensorBatch, bs: np.ndarray,
+                      xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        return self.compute(batch, xs, ys)
+
+
+@register_sensor('neighbours')
+class NeighboursSensor(Sensor):
+    """
+    1 for each neighbouring cell that is occupied and 0 otherwise, with
+    the neighbours chosen by `include_diagonal_cells`.
+    """
+
+    @classmethod
+    def num_channels(cls, global_config: dict) -> int:
+        return 8 if global_config.get('include_diagonal_cells') else 4
+
+    def compute(self, world: World, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        return (look_around(world, xs, ys, EMPTY) != EMPTY).astype(np.float64)
+
+    def compute_batch(self, batch: SensorBatch, bs: np.ndarray,
+                      xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        return (look_around(batch, xs, ys, EMPTY, bs) != EMPTY).astype(np.float64)
+
+
+@register_sensor('neighbour_types')
+class NeighbourTypesSensor(Sensor):
+    """
+    Two channels for each neighbouring cell: whether it holds an organism,
+    and whether it is a barrier. The edge of the world counts as a barrier.
+    """
+
+    @classmethod
+    def num_channels(cls, global_config: dict) -> int:
+        return 2 * NeighboursSensor.num_channels(global_config)
+
+    def compute(self, world: World, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        return self.split_codes(look_around(world, xs, ys, BARRIER))
+
+    def compute_batch(self, batch: SensorBatch, bs: np.ndarray,
+                      xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        return self.split_codes(look_around(batch, xs, ys, BARRIER, bs))
+
+    @staticmethod
+    def split_codes(codes: np.ndarray) -> np.ndarray:
+        return np.concatenate([codes == ORGANISM, codes == BARRIER], axis=1).astype(np.float64)
@@ -0,0 +1,140 @@
+from evo.world import World
+
+from abc import ABC, abstractmethod
+from typing import Dict
+
+import numpy as np
+
+
+DEFAULT_SENSORS = ['position', 'neighbours']
+
+
+def uses_default_sensors(config: dict) -> bool:
+    """
+    Whether the config uses the original observation of position and
+    neighbouring cells, which the organisms compute themselves.
+    """
+    return list(config.get('sensors', DEFAULT_SENSORS)) == DEFAULT_SENSORS
+
+
+class SensorWorld:
+    """
+    The parts of a `World` that sensors read: its size, its occupancy and
+    the cache of values computed once per step or generation.
+    """
+
+    def __init__(self, config: dict, occupancy: np.ndarray) -> None:
+        self.config = config
+        self.occupancy = occupancy
+        self.world_height, self.world_width = occupancy.shape[-2:]
+        self.include_diagonal_cells_in_local_state = config.get('include_diagonal_cells')
+        self._step_cache = dict()
+        self._generation_cache = dict()
+
+    def cached(self, key: str, compute, per_step: bool = True):
+        """ Same as `World.cached`. """
+        cache = self._step_cache if per_step else self._generation_cache
+        if key not in cache:
+            cache[key] = compute(self)
+        return cache[key]
+
+    def start_step(self) -> None:
+        self._step_cache.clear()
+
+    def start_generation(self) -> None:
+        self._step_cache.clear()
+        self._generation_cache.clear()
+
+
+class SensorBatch(SensorWorld):
+    """
+    The worlds of a `BatchedEvolutionSimulation` as seen by sensors, with
+    a (n_worlds, height, width) occupancy. `world(b)` is a view of a single
+    world, for sensors that only implement `Sensor.compute`.
+    """
+
+    def __init__(self, config: dict, occupancy: np.ndarray) -> None:
+        super().__init__(config, occupancy)
+        self.n_worlds = occupancy.shape[0]
+        self._worlds: Dict[int, SensorWorld] = dict()
+
+    def world(self, b: int) -> SensorWorld:
+        if b not in self._worlds:
+            self._worlds[b] = SensorWorld(self.config, self.occupancy[b])
+        return self._worlds[b]
+
+    def start_step(self) -> None:
+        super().start_step()
+        for world in self._worlds.values():
+            world.start_step()
+
+    def start_generation(self) -> None:
+        super().start_generation()
+        for world in self._worlds.values():
+            world.start_generation()
+
+
+class Sensor(ABC):
+    """
+    A sensor computes a block of observations for a batch of organisms.
+
+    Sensors are listed in order with the `sensors` config option, and any
+    parameters are given under `sensors_config.<sensor name>`. The brain's
+    inputs are the sensors' blocks concatenated in that order.
+
+    `World` steps organisms one at a time, as each move changes what the
+    next organism sees, so there `compute` is called with a single
+    organism, and every sensor costs a few NumPy calls per organism-step.
+    A `BatchedEvolutionSimulation` calls `compute_batch` once per step for
+    the organisms of all of its worlds.
+    """
+
+    # whether the observation only depends on the organism's position,
+    # the terrain and the occupancy of the eight surrounding cells
+    local = True
+
+    def __init__(self, global_config: dict, sensor_name: str) -> None:
+        self.global_config = global_config
+        self.sensor_name = sensor_name
+        self.config = self.get_sensor_config(global_config, sensor_name)
+
+    @staticmethod
+    def get_sensor_config(global_config: dict, sensor_name: str) -> dict:
+        return global_config.get('sensors_config', dict()).get(sensor_name, dict())
+
+    @classmethod
+    @abstractmethod
+    def num_channels(cls, global_config: dict) -> int:
+        pass
+
+    @abstractmethod
+    def compute(self, world: World, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """
+        Returns the (len(xs), num_channels) observations of organisms at
+        the cells (xs, ys).
+        """
+        pass
+
+    def compute_batch(self, batch: SensorBatch, bs: np.ndarray,
+                      xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """
+        Returns the (len(xs), num_channels) observations of organisms at
+        the cells (xs, ys) of the worlds `bs` of a batch. By default
+        `compute` is called once for each world.
+        """
+        observations = np.empty((xs.shape[0], self.num_channels(self.global_config)))
+        for b in np.unique(bs):
+            in_world = bs == b
+            observations[in_world] = self.compute(batch.world(b), xs[in_world], ys[in_world])
+        return observations
+
+
+def neighbour_offsets(include_diagonal_cells: bool) -> list:
+    """
+    The (dx, dy) offsets of the neighbouring cells in the order that
+    `World.update_local_world_state` lists them.
+    """
+    if include_diagonal_cells:
+        return [(dx, dy) for dy in range(-1, 2) for dx in range(-1, 2)
+                if dx != 0 or dy != 0]
+    return [(0, -1), (0, 1), (-1, 0), (1, 0)]
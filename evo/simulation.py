@@ -1,14 +1,57 @@
+from evo.brain_cache import get_brain_cache
+from evo.config import compile_config
 from evo.world import World
 from evo.organism import Organism
 from evo.util.registry import get_selection_function, get_repop_function, get_world_generator
 from evo.util.callback import RunCallbacks
 from evo.world_gen.world_generator import WorldGenerator
 
+from typing import Optional
+import time
+
+
+class PlateauDetector:
+    """
+    Detects when a metric has not improved on its best value by more
+    than `min_delta` for `patience` generations.
+    """
+
+    def __init__(self, metric: str, patience: int, min_delta: float) -> None:
+        self.metric = metric
+        self.patience = patience
+        self.min_delta = min_delta
+        self.best = None
+        self.generations_since_best = 0
+
+    def update(self, generation_logs: dict) -> Optional[str]:
+        """
+        Records the metric for a generation and returns the reason for
+        stopping if it has plateaued, otherwise None.
+        """
+        value = generation_logs[self.metric]
+        if self.best is None or value > self.best + self.min_delta:
+            self.best = value
+            self.generations_since_best = 0
+            return None
+
+        self.generations_since_best += 1
+        if self.generations_since_best >= self.patience:
+            return (f'{self.metric} has not improved on {self.best:.4f} by more than '
+                    f'{self.min_delta} for {self.patience} generations')
+        return None
+
+    def state_dict(self) -> dict:
+        return {'best': self.best, 'generations_since_best': self.generations_since_best}
+
+    def load_state_dict(self, state: dict) -> None:
+        self.best = state['best']
+        self.generations_since_best = state['generations_since_best']
+
 
 class EvolutionSimulation:
 
     def __init__(self, config: dict, callbacks: RunCallbacks = None):
-        self.config = config
+        self.config = config = compile_config(config)
         self.callbacks = callbacks or RunCallbacks()
 
         self.steps_per_generation = config.get('world_steps_per_generation')
@@ -29,20 +72,63 @@ class EvolutionSimulation:
         self.selection = get_selection_function(config)
         self.repopulate = get_repop_function(config)
 
+        early_stopping_config = config.get('early_stopping', dict())
+        # once no organism moves in a step, none ever will again this generation,
+        # unless organisms can make random moves or remember earlier steps
+        self.skip_fixed_point_steps = early_stopping_config.get('skip_fixed_point_steps', False) \
+            and self.world.deterministic_actions and not self.world.recurrent_brains
+
+        self.plateau_detector = None
+        if early_stopping_config.get('plateau_patience') is not None:
+            self.plateau_detector = PlateauDetector(
+                early_stopping_config.get('plateau_metric', 'survival_rate'),
+                early_stopping_config.get('plateau_patience'),
+                early_stopping_config.get('plateau_min_delta', 0.)
+            )
+
     def simulate(self, generation: int) -> None:
         generation_logs = {'generation': generation}
-        self.world.reset()
-        for _ in range(self.steps_per_generation):
+        self.world.reset(generation)
+        skipped_steps = 0
+        for step in range(self.steps_per_generation):
             self.world.update()
             generation_logs.update(self.callbacks.on_step_finish(generation, self.world))
+
+            if self.skip_fixed_point_steps and self.world.n_moved == 0:
+                skipped_steps = self.steps_per_generation - step - 1
+                self.world.skip_updates(skipped_steps)
+                # the world no longer changes, but callbacks such as
+                # `render_video` still see every step of the generation
+                for _ in range(skipped_steps):
+                    generation_logs.update(self.callbacks.on_step_finish(generation, self.world))
+                break
+
+        if self.skip_fixed_point_steps:
+            generation_logs['skipped_steps'] = skipped_steps
         return generation_logs
 
     def run_generation(self, generation: int) -> dict:
         """
         Runs a single generation of the simulation.
         """
+        start = time.perf_counter()
         generation_logs = self.simulate(generation)
+        selection_start = time.perf_counter()
         generation_logs.update(self.selection(self.world))
+        repopulate_start = time.perf_counter()
         generation_logs.update(self.repopulate(self.world))
+        end = time.perf_counter()
+        # how long each phase of the generation took
+        generation_logs['simulate_ms'] = 1000 * (selection_start - start)
+        generation_logs['selection_ms'] = 1000 * (repopulate_start - selection_start)
+        generation_logs['repopulate_ms'] = 1000 * (end - repopulate_start)
+        if self.config.brain_cache:
+            generation_logs.update(get_brain_cache(self.config).end_generation())
+
+        if self.plateau_detector is not None:
+            stop_reason = self.plateau_detector.update(generation_logs)
+            if stop_reason is not None:
+                generation_logs['early_stop_reason'] = stop_reason
+
         self.callbacks.on_generation_finish(generation, generation_logs, self.world)
         return generation_logs
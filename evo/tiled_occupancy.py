@@ -0,0 +1,213 @@
+from typing import Dict, Optional, Tuple, Union
+import random
+
+import numpy as np
+
+
+# same code as `evo.world.EMPTY`
+EMPTY = 0
+
+
+class TiledOccupancy:
+    """
+    Occupancy codes of a world stored in fixed-size square tiles.
+
+    A tile is only allocated once one of its cells becomes non-empty and
+    is freed again when all of its cells are empty, so memory scales with
+    the occupied area of the world rather than its size. Cells are indexed
+    as `occupancy[y, x]`, like the dense occupancy array, with either
+    integers or integer arrays.
+    """
+
+    def __init__(self, width: int, height: int, tile_size: int = 64) -> None:
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.tiles: Dict[Tuple[int, int], np.ndarray] = dict()
+        # number of non-empty cells in each allocated tile
+        self.counts: Dict[Tuple[int, int], int] = dict()
+
+    @property
+    def shape(self) -> tuple:
+        return self.height, self.width
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.tiles) * self.tile_size * self.tile_size
+
+    def get(self, x: int, y: int) -> int:
+        tile = self.tiles.get((x // self.tile_size, y // self.tile_size))
+        if tile is None:
+            return EMPTY
+        return int(tile[y % self.tile_size, x % self.tile_size])
+
+    def set(self, x: int, y: int, value: int) -> None:
+        key = (x // self.tile_size, y // self.tile_size)
+        tile = self.tiles.get(key)
+        if tile is None:
+            if value == EMPTY:
+                return
+            tile = self._allocate(key)
+
+        cell = (y % self.tile_size, x % self.tile_size)
+        self.counts[key] += int(value != EMPTY) - int(tile[cell] != EMPTY)
+        tile[cell] = value
+        if self.counts[key] == 0:
+            self._free(key)
+
+    def lookup(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """ Returns the codes of the cells (xs[i], ys[i]). """
+        codes = np.full(np.shape(xs), EMPTY, dtype=np.uint8)
+        for key, selected in self._group_by_tile(xs, ys):
+            tile = self.tiles.get(key)
+            if tile is not None:
+                codes[selected] = tile[ys[selected] % self.tile_size, xs[selected] % self.tile_size]
+        return codes
+
+    def assign(self, xs: np.ndarray, ys: np.ndarray, value: int) -> None:
+        """ Sets the cells (xs[i], ys[i]) to `value`. """
+        for key, selected in self._group_by_tile(xs, ys):
+            tile = self.tiles.get(key)
+            if tile is None:
+                if value == EMPTY:
+                    continue
+                tile = self._allocate(key)
+            tile[ys[selected] % self.tile_size, xs[selected] % self.tile_size] = value
+            self._recount(key)
+
+    def fill_mask(self, x: int, y: int, mask: np.ndarray, value: int) -> None:
+        """
+        Sets the cells where the boolean `mask` is true to `value`, with
+        the mask's top-left corner at (x, y). Parts of the mask outside of
+        the world are ignored, and the mask may span any number of tiles.
+        """
+        x0, y0 = max(x, 0), max(y, 0)
+        x1 = min(x + mask.shape[1], self.width)
+        y1 = min(y + mask.shape[0], self.height)
+        ts = self.tile_size
+        for ty in range(y0 // ts, (y1 - 1) // ts + 1 if y1 > y0 else 0):
+            for tx in range(x0 // ts, (x1 - 1) // ts + 1 if x1 > x0 else 0):
+                # overlap of the tile and the mask in world coordinates
+                cx0, cx1 = max(tx * ts, x0), min((tx + 1) * ts, x1)
+                cy0, cy1 = max(ty * ts, y0), min((ty + 1) * ts, y1)
+                part = mask[cy0 - y:cy1 - y, cx0 - x:cx1 - x]
+                if not part.any():
+                    continue
+
+                key = (tx, ty)
+                tile = self.tiles.get(key)
+                if tile is None:
+                    if value == EMPTY:
+                        continue
+                    tile = self._allocate(key)
+                tile[cy0 - ty * ts:cy1 - ty * ts, cx0 - tx * ts:cx1 - tx * ts][part] = value
+                self._recount(key)
+
+    def sample_empty_cell(self, max_tries: int = 100) -> Optional[tuple]:
+        """
+        Returns a uniformly random empty cell as an (x, y) tuple, or None
+        if the world is full. Cells are drawn at random until an empty one
+        is found, so this only scans the world if it is nearly full.
+        """
+        for _ in range(max_tries):
+            x = random.randrange(self.width)
+            y = random.randrange(self.height)
+            if self.get(x, y) == EMPTY:
+                return x, y
+
+        empty_cells = np.flatnonzero(self.to_dense() == EMPTY)
+        if len(empty_cells) == 0:
+            return None
+
+        cell = int(random.choice(empty_cells))
+        return cell % self.width, cell // self.width
+
+    def find(self, value: int) -> Tuple[np.ndarray, np.ndarray]:
+        """ Returns the x and y coordinates of the cells set to `value`, row by row. """
+        ts = self.tile_size
+        xs, ys = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+        for (tx, ty), tile in self.tiles.items():
+            tile_ys, tile_xs = np.nonzero(tile == value)
+            xs.append(tile_xs + tx * ts)
+            ys.append(tile_ys + ty * ts)
+        xs, ys = np.concatenate(xs), np.concatenate(ys)
+        order = np.lexsort((xs, ys))
+        return xs[order], ys[order]
+
+    def to_dense(self) -> np.ndarray:
+        dense = np.zeros(self.shape, dtype=np.uint8)
+        ts = self.tile_size
+        for (tx, ty), tile in self.tiles.items():
+            region = dense[ty * ts:(ty + 1) * ts, tx * ts:(tx + 1) * ts]
+            region[:] = tile[:region.shape[0], :region.shape[1]]
+        return dense
+
+    def fill(self, value: int) -> None:
+        assert value == EMPTY, 'Tiled occupancy can only be filled with EMPTY'
+        self.tiles.clear()
+        self.counts.clear()
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        dense = self.to_dense()
+        return dense if dtype is None else dense.astype(dtype)
+
+    def __getitem__(self, key: tuple):
+        y, x = key
+        if isinstance(y, (int, np.integer)) and isinstance(x, (int, np.integer)):
+            return self.get(int(x), int(y))
+        return self.lookup(np.asarray(x), np.asarray(y))
+
+    def __setitem__(self, key, value) -> None:
+        if key is Ellipsis or key == slice(None):
+            # replace the whole world with a dense array of codes
+            self.fill(EMPTY)
+            value = np.asarray(value)
+            for code in np.unique(value[value != EMPTY]).tolist():
+                self.fill_mask(0, 0, value == code, code)
+            return
+
+        y, x = key
+        if isinstance(y, (int, np.integer)) and isinstance(x, (int, np.integer)):
+            self.set(int(x), int(y), value)
+        else:
+            self.assign(np.asarray(x), np.asarray(y), value)
+
+    def _group_by_tile(self, xs: np.ndarray, ys: np.ndarray):
+        """ Yields the key of each tile holding any of the cells, and a mask of those cells. """
+        n_tiles_x = -(-self.width // self.tile_size)
+        keys = (ys // self.tile_size) * n_tiles_x + xs // self.tile_size
+        if keys.size > 0 and (keys == keys.flat[0]).all():
+            # the common case of a few cells around one organism
+            key = int(keys.flat[0])
+            yield (key % n_tiles_x, key // n_tiles_x), np.ones(keys.shape, dtype=bool)
+            return
+
+        for key in np.unique(keys).tolist():
+            yield (key % n_tiles_x, key // n_tiles_x), keys == key
+
+    def _allocate(self, key: tuple) -> np.ndarray:
+        tile = np.zeros((self.tile_size, self.tile_size), dtype=np.uint8)
+        self.tiles[key] = tile
+        self.counts[key] = 0
+        return tile
+
+    def _recount(self, key: tuple) -> None:
+        self.counts[key] = int(np.count_nonzero(self.tiles[key]))
+        if self.counts[key] == 0:
+            self._free(key)
+
+    def _free(self, key: tuple) -> None:
+        del self.tiles[key]
+        del self.counts[key]
+
+
+def find_cells(occupancy: Union[np.ndarray, TiledOccupancy], value: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the x and y coordinates of the cells of a dense or tiled
+    occupancy set to `value`, row by row, without making a dense copy of
+    a tiled occupancy.
+    """
+    if isinstance(occupancy, TiledOccupancy):
+        return occupancy.find(value)
+    ys, xs = np.nonzero(occupancy == value)
+    return xs, ys
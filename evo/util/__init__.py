@@ -1,3 +1,6 @@
 from .render import RenderVideoCallback
 from .logger import LoggerCallback
+from .lineage import LineageCallback
+from .diversity import DiversityCallback
+from .telemetry import TelemetryCallback
 from .utils import *
@@ -5,7 +5,12 @@ from abc import ABC
 
 class Callback(ABC):
 
+    # whether the callback only reads the population arrays of a world, so
+    # that it can be used with the `ScaleWorld` of the scale simulation
+    supports_scale_mode = False
+
     def __init__(self, config: dict, callback_name: str) -> None:
+        self.callback_name = callback_name
         self.global_config = config
         callbacks_config = config.get('callbacks')
         self.config = callbacks_config.get(callback_name)
@@ -23,6 +28,15 @@ class Callback(ABC):
     def on_interrupt(self, world: World) -> None:
         pass
 
+    def state_dict(self) -> dict:
+        """
+        Returns the state needed to resume the callback from a checkpoint.
+        """
+        return dict()
+
+    def load_state_dict(self, state: dict) -> None:
+        pass
+
 
 class RunCallbacks(Callback):
 
@@ -50,3 +64,14 @@ class RunCallbacks(Callback):
     def on_interrupt(self, world: World) -> None:
         for callback in self.callbacks:
             callback.on_interrupt(world)
+
+    def state_dict(self) -> dict:
+        return {
+            callback.callback_name: callback.state_dict()
+            for callback in self.callbacks
+        }
+
+    def load_state_dict(self, state: dict) -> None:
+        for callback in self.callbacks:
+            if callback.callback_name in state:
+                callback.load_state_dict(state[callback.callback_name])
@@ -0,0 +1,184 @@
+from evo.organism import Genome, Organism
+from evo.scale_simulation import ScaleEvolutionSimulation
+from evo.util.callback import RunCallbacks
+from evo.world import World, BARRIER
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+import os
+import pickle
+import random
+import time
+
+import numpy as np
+
+
+def get_simulation_state(simulation, callbacks: RunCallbacks, generation: int) -> dict:
+    """
+    Captures everything needed to continue a simulation bit-for-bit from
+    the end of `generation`. The arrays are copies, so the state can be
+    written out while the simulation carries on.
+    """
+    if isinstance(simulation, ScaleEvolutionSimulation):
+        # the scale simulation has no organism objects to capture
+        state = simulation.state_dict()
+    else:
+        world: World = simulation.world
+        state = {
+            'genomes': np.array([organism.genome.genes for organism in world.organisms],
+                                dtype=np.float64),
+            'positions': np.array([world.get_organism_position(organism)
+                                   for organism in world.organisms], dtype=np.int64),
+            'occupancy': np.array(world.occupancy),
+            'organism_ids': np.array([(organism.id, *organism.parent_ids)
+                                      for organism in world.organisms], dtype=np.int64).reshape(-1, 3),
+            'next_organism_id': Organism.next_id,
+        }
+    return {
+        'generation': generation,
+        **state,
+        'python_rng_state': random.getstate(),
+        'numpy_rng_state': np.random.get_state(),
+        'callbacks': callbacks.state_dict(),
+        'plateau_detector': (simulation.plateau_detector.state_dict()
+                             if simulation.plateau_detector is not None else None),
+    }
+
+
+def set_simulation_state(simulation, callbacks: RunCallbacks, state: dict) -> int:
+    """
+    Restores a state captured by `get_simulation_state` and returns the
+    generation it was taken at.
+    """
+    if isinstance(simulation, ScaleEvolutionSimulation):
+        simulation.load_state_dict(state)
+    else:
+        set_world_state(simulation.world, simulation.config, state)
+
+    random.setstate(state['python_rng_state'])
+    np.random.set_state(state['numpy_rng_state'])
+    callbacks.load_state_dict(state['callbacks'])
+    if simulation.plateau_detector is not None and state.get('plateau_detector') is not None:
+        simulation.plateau_detector.load_state_dict(state['plateau_detector'])
+
+    return state['generation']
+
+
+def set_world_state(world: World, config: dict, state: dict) -> None:
+    """ Restores the organisms, their positions and the occupancy of a `World`. """
+    world.organisms = []
+    world.population.clear()
+    world.clear_cells()
+
+    world.add_barriers(state['occupancy'] == BARRIER)
+
+    for genes, (x, y) in zip(state['genomes'], state['positions'].tolist()):
+        organism = Organism(config, Genome(genes.tolist(), config))
+        world.organisms.append(organism)
+        world.population.add(organism)
+        world.set_organism_position(organism, x, y)
+
+    if 'organism_ids' in state:
+        for organism, (organism_id, *parent_ids) in zip(world.organisms, state['organism_ids'].tolist()):
+            organism.id = organism_id
+            organism.parent_ids = tuple(parent_ids)
+        Organism.next_id = state['next_organism_id']
+
+    world.occupancy[:] = state['occupancy']
+
+
+def write_checkpoint(path: str, state: dict) -> None:
+    """
+    Writes a checkpoint as an uncompressed `.npz` archive. The arrays are
+    stored natively and everything else is pickled into a byte array. The
+    file is written under a temporary name and then renamed, so a
+    checkpoint is either complete or absent.
+    """
+    arrays = {key: value for key, value in state.items() if isinstance(value, np.ndarray)}
+    other = {key: value for key, value in state.items() if key not in arrays}
+    arrays['pickled'] = np.frombuffer(pickle.dumps(other), dtype=np.uint8)
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_checkpoint(path: str) -> dict:
+    with np.load(path) as checkpoint:
+        state = {key: checkpoint[key] for key in checkpoint.files if key != 'pickled'}
+        state.update(pickle.loads(checkpoint['pickled'].tobytes()))
+    return state
+
+
+def find_latest_checkpoint(checkpoints_dir: str) -> Optional[str]:
+    checkpoints = sorted(Path(checkpoints_dir).glob('checkpoint_*.npz'))
+    if len(checkpoints) == 0:
+        return None
+    return str(checkpoints[-1])
+
+
+class Checkpointer:
+    """
+    Periodically checkpoints the full state of a simulation.
+
+    The state is captured on the main thread and written to disk on a
+    background thread, so only the capture blocks the generation loop.
+    The time taken by both parts is reported after each write.
+    """
+
+    def __init__(self, config: dict, experiment_dir: str) -> None:
+        checkpoint_config = config.get('checkpoint', dict())
+        self.frequency = checkpoint_config.get('frequency')
+        assert self.frequency is not None, \
+            'frequency not specified in checkpoint config'
+
+        self.keep_last = checkpoint_config.get('keep_last', 2)
+        self.n_generations = config.get('n_generations')
+
+        self.checkpoints_dir = f'{experiment_dir}/checkpoints'
+        Path(self.checkpoints_dir).mkdir(parents=True, exist_ok=True)
+
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending: Optional[Future] = None
+
+    def should_checkpoint(self, generation: int) -> bool:
+        return generation % self.frequency == 0 or generation == self.n_generations - 1
+
+    def checkpoint(self, simulation, callbacks: RunCallbacks, generation: int) -> None:
+        start = time.perf_counter()
+        state = get_simulation_state(simulation, callbacks, generation)
+        capture_time = time.perf_counter() - start
+
+        # only one write is in flight at a time
+        self.wait()
+        path = f'{self.checkpoints_dir}/checkpoint_{generation:06d}.npz'
+        self.pending = self.executor.submit(self._write, path, state, capture_time)
+
+    def _write(self, path: str, state: dict, capture_time: float) -> None:
+        start = time.perf_counter()
+        write_checkpoint(path, state)
+        write_time = time.perf_counter() - start
+
+        for old_checkpoint in sorted(Path(self.checkpoints_dir).glob('checkpoint_*.npz'))[:-self.keep_last]:
+            old_checkpoint.unlink()
+
+        size_mb = os.path.getsize(path) / 2 ** 20
+        print(f'Saved checkpoint {path} ({size_mb:.2f} MB): '
+              f'capture {1000 * capture_time:.1f} ms, write {1000 * write_time:.1f} ms')
+
+    def wait(self) -> None:
+        if self.pending is not None:
+            self.pending.result()
+            self.pending = None
+
+    def restore_latest(self, simulation, callbacks: RunCallbacks) -> int:
+        path = find_latest_checkpoint(self.checkpoints_dir)
+        if path is None:
+            raise FileNotFoundError(f'No checkpoints found in {self.checkpoints_dir}')
+
+        print(f'Resuming from checkpoint {path}')
+        return set_simulation_state(simulation, callbacks, read_checkpoint(path))
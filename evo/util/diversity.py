@@ -0,0 +1,136 @@
+from evo.organism import Genome
+from evo.util.callback import Callback
+from evo.util.registry import register_callback
+from evo.world import World
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+@register_callback('diversity')
+class DiversityCallback(Callback):
+    """
+    Logs the genetic and behavioural diversity of the population at the
+    end of each generation, after repopulation, from the stacked genome
+    matrix of the world.
+
+    - `gene_std`: the standard deviation of each gene over the population,
+      averaged over the genes.
+    - `gene_mean_drift`: how far the gene-wise mean of the population has
+      moved since the previous generation.
+    - `mean_sq_genome_distance`: the mean squared distance between the
+      genomes of two different organisms, which is exactly twice the sum
+      of the gene variances, so it is computed without comparing pairs.
+    - `mean_genome_distance`: an estimate of the mean distance between the
+      genomes of two different organisms, from `n_pairs` random pairs of
+      genomes that are first projected down to `projection_dim` dimensions.
+    - `n_behaviours` and `behaviour_entropy`: the number of distinct
+      behaviours in the population, and the entropy in bits of their
+      distribution. Two organisms behave the same if their brains choose
+      the same action for every one of `n_probes` fixed random
+      observations.
+
+    The statistics are computed in float64 whatever the dtype of the
+    genomes, such as the float16 genomes of the scale simulation. The
+    callback draws its random numbers from its own generator, so it
+    does not change the course of the simulation.
+    """
+
+    supports_scale_mode = True
+
+    def __init__(self, config: dict, callback_name: str = 'diversity') -> None:
+        super().__init__(config, callback_name)
+        self.projection_dim = self.config.get('projection_dim', 32)
+        self.n_pairs = self.config.get('n_pairs', 4096)
+        self.n_probes = self.config.get('n_probes', 64)
+        # organisms evaluated at once on the probes, to bound memory
+        self.batch_size = self.config.get('batch_size', 4096)
+
+        self.rng = np.random.default_rng(self.config.get('seed', 0))
+        n_genes = Genome.num_genes(self.global_config)
+        self.projection = self.rng.standard_normal((n_genes, self.projection_dim)) \
+            / np.sqrt(self.projection_dim)
+
+        # the probes fill every brain input, including the hidden state
+        # of recurrent brains, with values between 0 and 1 like the
+        # position and neighbour observations
+        n_inputs = Genome.layer_shapes(self.global_config)[0][0] - 1
+        self.probes = self.rng.random((self.n_probes, n_inputs))
+        self.probe_weights = self.rng.integers(1, 2 ** 63, self.n_probes, dtype=np.uint64)
+
+        self.previous_gene_mean: Optional[np.ndarray] = None
+
+    def gene_moments(self, genomes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the float64 mean and variance of each gene, combining those
+        of batches of organisms so that only one batch is widened at a time.
+        """
+        n_genes = genomes.shape[1]
+        mean = np.zeros(n_genes)
+        sum_sq = np.zeros(n_genes)
+        count = 0
+        for start in range(0, len(genomes), self.batch_size):
+            batch = genomes[start:start + self.batch_size].astype(np.float64)
+            batch_mean = batch.mean(axis=0)
+            batch_sum_sq = ((batch - batch_mean) ** 2).sum(axis=0)
+            # the parallel update of Chan et al. for combining variances
+            delta = batch_mean - mean
+            total = count + len(batch)
+            mean += delta * len(batch) / total
+            sum_sq += batch_sum_sq + delta ** 2 * count * len(batch) / total
+            count = total
+        return mean, sum_sq / count
+
+    def behaviour_hashes(self, genomes: np.ndarray) -> np.ndarray:
+        """ Returns a hash of the actions each genome's brain takes on the probes. """
+        hashes = np.empty(len(genomes), dtype=np.uint64)
+        for start in range(0, len(genomes), self.batch_size):
+            batch = genomes[start:start + self.batch_size]
+            # the probes are the same for every organism, so each layer is
+            # one (n_probes, input_dim) x (input_dim, output_dim) product
+            # per organism, as in `FeedForwardNeuralNetwork.batched_forward`
+            x = np.broadcast_to(self.probes, (len(batch),) + self.probes.shape)
+            for weights in Genome.unpack_weights(batch, self.global_config):
+                x = np.tanh(np.matmul(x, weights[:, :-1, :]) + weights[:, None, -1, :])
+            actions = np.argmax(x, axis=-1).astype(np.uint64)
+            hashes[start:start + len(batch)] = (actions * self.probe_weights).sum(axis=1)
+        return hashes
+
+    def on_generation_finish(self,
+                             generation: int,
+                             generation_logs: dict,
+                             world: World) -> None:
+        genomes = world.population.genomes[:world.population.size]
+        n = len(genomes)
+        if n < 2:
+            return
+
+        gene_mean, gene_var = self.gene_moments(genomes)
+        generation_logs['gene_std'] = float(np.sqrt(gene_var).mean())
+        if self.previous_gene_mean is not None:
+            generation_logs['gene_mean_drift'] = float(np.linalg.norm(gene_mean - self.previous_gene_mean))
+        self.previous_gene_mean = gene_mean
+
+        # mean over pairs i != j of |g_i - g_j|^2
+        generation_logs['mean_sq_genome_distance'] = float(2 * gene_var.sum() * n / (n - 1))
+
+        first = self.rng.integers(0, n, self.n_pairs)
+        second = (first + self.rng.integers(1, n, self.n_pairs)) % n
+        projected = (genomes[first].astype(np.float64) - genomes[second]) @ self.projection
+        generation_logs['mean_genome_distance'] = float(np.linalg.norm(projected, axis=1).mean())
+
+        _, counts = np.unique(self.behaviour_hashes(genomes), return_counts=True)
+        proportions = counts / n
+        generation_logs['n_behaviours'] = len(counts)
+        generation_logs['behaviour_entropy'] = float(-(proportions * np.log2(proportions)).sum())
+
+    def state_dict(self) -> dict:
+        return {
+            'rng_state': self.rng.bit_generator.state,
+            'previous_gene_mean': self.previous_gene_mean,
+        }
+
+    def load_state_dict(self, state: dict) -> None:
+        self.rng.bit_generator.state = state['rng_state']
+        self.previous_gene_mean = state['previous_gene_mean']
@@ -0,0 +1,118 @@
+from typing import Callable, Optional
+import atexit
+import queue
+import threading
+import time
+
+
+class IOExecutor:
+    """
+    Runs the file writes of callbacks, such as logs, genomes, plots and
+    videos, on background threads so that the simulation can carry on with
+    the next generation while they are written.
+
+    At most `max_pending` writes are queued at once. Submitting more blocks
+    until one finishes, so a run that produces artifacts faster than they
+    can be written is slowed down rather than filling up memory. Writes are
+    run in the order they are submitted when there is a single worker.
+    Exceptions raised by a write are raised again by the next `submit` or
+    `flush`.
+    """
+
+    def __init__(self, n_workers: int = 1, max_pending: int = 8) -> None:
+        assert n_workers >= 1, 'io n_workers must be at least 1'
+        self.tasks = queue.Queue(maxsize=max_pending)
+        self.error: Optional[BaseException] = None
+
+        self.lock = threading.Lock()
+        self.n_completed = 0
+        self.total_latency = 0.
+        self.max_latency = 0.
+        self.total_blocked_time = 0.
+
+        self.workers = [
+            threading.Thread(target=self._work, daemon=True, name=f'io-{i}')
+            for i in range(n_workers)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def _work(self) -> None:
+        while True:
+            submitted, fn, args, kwargs = self.tasks.get()
+            try:
+                fn(*args, **kwargs)
+            except BaseException as e:
+                self.error = e
+            finally:
+                # time from submission to the write being on disk
+                latency = time.perf_counter() - submitted
+                with self.lock:
+                    self.n_completed += 1
+                    self.total_latency += latency
+                    self.max_latency = max(self.max_latency, latency)
+                self.tasks.task_done()
+
+    def _raise_error(self) -> None:
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def submit(self, fn: Callable, *args, **kwargs) -> None:
+        """
+        Queues `fn(*args, **kwargs)` to be run on a worker thread. The
+        arguments must not be modified afterwards, so pass copies of any
+        state that the simulation will keep changing.
+        """
+        self._raise_error()
+        start = time.perf_counter()
+        self.tasks.put((time.perf_counter(), fn, args, kwargs))
+        with self.lock:
+            self.total_blocked_time += time.perf_counter() - start
+
+    def flush(self) -> None:
+        """ Blocks until every queued write has finished. """
+        self.tasks.join()
+        self._raise_error()
+
+    @property
+    def queue_depth(self) -> int:
+        return self.tasks.unfinished_tasks
+
+    def metrics(self) -> dict:
+        """
+        Returns the number of unfinished writes and the latency of the
+        writes that have finished since the last call, in milliseconds,
+        along with how long submissions were blocked by a full queue.
+        """
+        with self.lock:
+            n_completed = self.n_completed
+            metrics = {
+                'io_queue_depth': self.queue_depth,
+                'io_mean_latency_ms': 1000 * self.total_latency / max(n_completed, 1),
+                'io_max_latency_ms': 1000 * self.max_latency,
+                'io_blocked_ms': 1000 * self.total_blocked_time,
+            }
+            self.n_completed = 0
+            self.total_latency = 0.
+            self.max_latency = 0.
+            self.total_blocked_time = 0.
+        return metrics
+
+
+_IO_EXECUTOR: Optional[IOExecutor] = None
+
+
+def get_io_executor(config: Optional[dict] = None) -> IOExecutor:
+    """
+    Returns the executor shared by every callback of the process, creating
+    it from the `io` section of `config` on first use.
+    """
+    global _IO_EXECUTOR
+    if _IO_EXECUTOR is None:
+        io_config = (config or dict()).get('io', dict())
+        _IO_EXECUTOR = IOExecutor(n_workers=io_config.get('n_workers', 1),
+                                  max_pending=io_config.get('max_pending', 8))
+        # writes still queued when the interpreter exits would be lost
+        atexit.register(_IO_EXECUTOR.flush)
+    return _IO_EXECUTOR
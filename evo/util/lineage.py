@@ -0,0 +1,250 @@
+from evo.util.callback import Callback
+from evo.util.io_executor import get_io_executor
+from evo.util.registry import register_callback
+from evo.world import World
+
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import heapq
+
+import numpy as np
+
+
+# columns of the rows of a lineage log
+ID, PARENT_A, PARENT_B, BIRTH_GENERATION = range(4)
+N_COLUMNS = 4
+
+
+@register_callback('lineage')
+class LineageCallback(Callback):
+    """
+    Records the parents of every organism in the run.
+
+    Each organism is recorded once, in the generation it first lives in,
+    as a row of int64 `(id, parent_a, parent_b, birth_generation)`, where
+    parents that do not exist are -1. Organism ids only ever increase, so
+    the rows are sorted by id. Rows are buffered and written to the
+    `lineage` folder of the run directory as `.npy` chunks of
+    `chunk_size` rows, which `LineageReader` reads back without loading
+    the whole log into memory.
+    """
+
+    def __init__(self, config: dict, callback_name: str = 'lineage') -> None:
+        super().__init__(config, callback_name)
+        self.chunk_size = self.config.get('chunk_size', 2 ** 16)
+        self.lineage_dir = f'{self.global_config["experiment_dir"]}/lineage'
+        Path(self.lineage_dir).mkdir(parents=True, exist_ok=True)
+
+        self.io = get_io_executor(self.global_config)
+        self.buffer = np.zeros((self.chunk_size, N_COLUMNS), dtype=np.int64)
+        self.n_buffered = 0
+        self.n_chunks = 0
+        # organisms with lower ids have been recorded
+        self.next_unrecorded_id = 0
+        self.recorded_generation = -1
+
+    def record_new_organisms(self, world: World, birth_generation: int) -> None:
+        new_organisms = [organism for organism in world.organisms
+                         if organism.id >= self.next_unrecorded_id]
+        if len(new_organisms) == 0:
+            return
+
+        rows = np.array([(organism.id, *organism.parent_ids, birth_generation)
+                         for organism in new_organisms], dtype=np.int64)
+        rows = rows[np.argsort(rows[:, ID], kind='stable')]
+        self.next_unrecorded_id = int(rows[-1, ID]) + 1
+
+        while len(rows) > 0:
+            n = min(len(rows), self.chunk_size - self.n_buffered)
+            self.buffer[self.n_buffered:self.n_buffered + n] = rows[:n]
+            self.n_buffered += n
+            rows = rows[n:]
+            if self.n_buffered == self.chunk_size:
+                self.write_chunk()
+
+    def write_chunk(self) -> None:
+        if self.n_buffered == 0:
+            return
+        path = f'{self.lineage_dir}/chunk_{self.n_chunks:06d}.npy'
+        self.io.submit(np.save, path, self.buffer[:self.n_buffered].copy())
+        self.n_chunks += 1
+        self.n_buffered = 0
+
+    def on_step_finish(self, generation: int, world: World) -> dict:
+        # the organisms that a generation starts with, only needed for
+        # the first generation as later ones are recorded when they are born
+        if generation != self.recorded_generation:
+            self.record_new_organisms(world, generation)
+            self.recorded_generation = generation
+        return dict()
+
+    def on_generation_finish(self,
+                             generation: int,
+                             generation_logs: dict,
+                             world: World) -> None:
+        self.record_new_organisms(world, generation + 1)
+        self.recorded_generation = generation + 1
+        if generation == self.global_config.get('n_generations') - 1 \
+                or generation_logs.get('early_stop_reason') is not None:
+            self.write_chunk()
+
+    def on_interrupt(self, world: World) -> None:
+        self.write_chunk()
+
+    def state_dict(self) -> dict:
+        return {
+            'buffer': self.buffer[:self.n_buffered].copy(),
+            'n_chunks': self.n_chunks,
+            'next_unrecorded_id': self.next_unrecorded_id,
+            'recorded_generation': self.recorded_generation,
+        }
+
+    def load_state_dict(self, state: dict) -> None:
+        self.io.flush()
+        self.n_chunks = state['n_chunks']
+        # drop chunks written after the checkpoint
+        for chunk in sorted(Path(self.lineage_dir).glob('chunk_*.npy'))[self.n_chunks:]:
+            chunk.unlink()
+
+        self.n_buffered = len(state['buffer'])
+        self.buffer[:self.n_buffered] = state['buffer']
+        self.next_unrecorded_id = state['next_unrecorded_id']
+        self.recorded_generation = state['recorded_generation']
+
+
+class LineageReader:
+    """
+    Queries the lineage log written by `LineageCallback` in a run
+    directory. Chunks are memory-mapped, so only the rows that a query
+    touches are read from disk.
+
+    Queries walk back through the ancestors of a set of organisms from the
+    most recently born, which is always the one with the highest id. Each
+    ancestor is visited once, after all of its descendants in the set, so
+    the memory used is bounded by the number of distinct ancestors alive
+    at any one time rather than the length of the run.
+    """
+
+    def __init__(self, experiment_dir: str) -> None:
+        paths = sorted(Path(f'{experiment_dir}/lineage').glob('chunk_*.npy'))
+        assert len(paths) > 0, f'No lineage found in {experiment_dir}'
+        self.chunks = [np.load(path, mmap_mode='r') for path in paths]
+        self.first_ids = np.array([chunk[0, ID] for chunk in self.chunks])
+
+    def __len__(self) -> int:
+        return sum(len(chunk) for chunk in self.chunks)
+
+    def get(self, organism_id: int) -> Optional[np.ndarray]:
+        """ Returns the row of an organism, or None if it was not recorded. """
+        chunk = self.chunks[max(int(np.searchsorted(self.first_ids, organism_id, side='right')) - 1, 0)]
+        row = int(np.searchsorted(chunk[:, ID], organism_id))
+        if row < len(chunk) and chunk[row, ID] == organism_id:
+            return np.array(chunk[row])
+        return None
+
+    def parents(self, organism_id: int) -> List[int]:
+        row = self.get(organism_id)
+        if row is None:
+            return []
+        return [int(parent) for parent in row[[PARENT_A, PARENT_B]] if parent >= 0]
+
+    def birth_generation(self, organism_id: int) -> int:
+        row = self.get(organism_id)
+        if row is None:
+            raise KeyError(f'Organism {organism_id} is not in the lineage')
+        return int(row[BIRTH_GENERATION])
+
+    def organisms_born_in(self, generation: int) -> np.ndarray:
+        """ Returns the ids of the organisms first living in `generation`. """
+        ids = [chunk[chunk[:, BIRTH_GENERATION] == generation, ID] for chunk in self.chunks]
+        return np.concatenate(ids)
+
+    def ancestry_tree(self, organism_id: int, max_depth: Optional[int] = None) -> Dict[int, List[int]]:
+        """
+        Returns the parents of the organism and of each of its ancestors,
+        up to `max_depth` generations of parents back.
+        """
+        tree = dict()
+        frontier = [organism_id]
+        depth = 0
+        while frontier and (max_depth is None or depth < max_depth):
+            next_frontier = []
+            for ancestor in frontier:
+                if ancestor in tree:
+                    continue
+                tree[ancestor] = self.parents(ancestor)
+                next_frontier.extend(tree[ancestor])
+            frontier = next_frontier
+            depth += 1
+        return tree
+
+    def _walk_back(self, weights: Dict[int, object], combine, split):
+        """
+        Visits the ancestors of the organisms in `weights` from the most
+        recently born, yielding each with its weight once the weights of
+        all of its descendants have been combined into it. `split` gives
+        the weight passed on to each parent.
+        """
+        heap = [-organism_id for organism_id in weights]
+        heapq.heapify(heap)
+        while heap:
+            organism_id = -heapq.heappop(heap)
+            weight = weights.pop(organism_id)
+            parents = self.parents(organism_id)
+            yield organism_id, weight, parents
+            for parent in parents:
+                if parent in weights:
+                    weights[parent] = combine(weights[parent], split(weight, parents))
+                else:
+                    weights[parent] = split(weight, parents)
+                    heapq.heappush(heap, -parent)
+
+    def most_recent_common_ancestor(self, organism_ids: Iterable[int]) -> Optional[int]:
+        """
+        Returns the most recently born organism that every one of the
+        given organisms descends from (or is), or None if there is none.
+        """
+        organism_ids = list(dict.fromkeys(int(i) for i in organism_ids))
+        # which of the organisms each ancestor leads to, as the bits of an integer
+        descendants = {organism_id: 1 << i for i, organism_id in enumerate(organism_ids)}
+        everyone = (1 << len(organism_ids)) - 1
+        for ancestor, mask, _ in self._walk_back(descendants,
+                                                 lambda a, b: a | b,
+                                                 lambda mask, _: mask):
+            if mask == everyone:
+                return ancestor
+        return None
+
+    def coalescence_time(self, organism_ids: Iterable[int], generation: Optional[int] = None) -> Optional[int]:
+        """
+        Returns the number of generations from `generation` (by default the
+        latest birth of the given organisms) back to the birth of their most
+        recent common ancestor, or None if their lineages never meet.
+        """
+        organism_ids = [int(i) for i in organism_ids]
+        ancestor = self.most_recent_common_ancestor(organism_ids)
+        if ancestor is None:
+            return None
+        if generation is None:
+            generation = max(self.birth_generation(i) for i in organism_ids)
+        return generation - self.birth_generation(ancestor)
+
+    def founder_contributions(self, organism_ids: Iterable[int]) -> Dict[int, float]:
+        """
+        Returns the expected proportion of the genes of the given organisms
+        that comes from each founder, an organism without recorded parents.
+        Each parent of a crossover passes on half of its genes.
+        """
+        organism_ids = list(organism_ids)
+        weights = defaultdict(float)
+        for organism_id in organism_ids:
+            weights[int(organism_id)] += 1 / len(organism_ids)
+
+        contributions = dict()
+        for ancestor, weight, parents in self._walk_back(dict(weights),
+                                                         lambda a, b: a + b,
+                                                         lambda weight, parents: weight / len(parents)):
+            if len(parents) == 0:
+                contributions[ancestor] = weight
+        return contributions
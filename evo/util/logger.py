@@ -1,23 +1,48 @@
 from pathlib import Path
 from evo.organism import Organism
 from evo.util.callback import Callback
+from evo.util.io_executor import get_io_executor
+from evo.util.metrics_store import MetricsStore
 from evo.util.registry import register_callback
 
 import yaml
 from evo.world import World
 import numpy as np
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import seaborn as sns
 sns.set()
 
 
+def get_genomes(world: World) -> np.ndarray:
+    if world.organisms is None:
+        # the worlds of the scale simulation only have population arrays
+        return world.population.genomes[:world.population.size].copy()
+    return np.array([org.genome.genes for org in world.organisms])
+
+
 def save_genomes_to_file(world: World, path: str) -> str:
-    genomes = np.array([org.genome.genes for org in world.organisms])
     path = f'{path}.npy'
-    np.save(path, genomes)
+    np.save(path, get_genomes(world))
     return path
 
 
+def plot_metric(generations: np.ndarray,
+                lows: np.ndarray,
+                means: np.ndarray,
+                highs: np.ndarray,
+                metric: str,
+                path: str) -> None:
+    # a figure that is not managed by pyplot, so plots can be drawn off the main thread
+    figure = Figure()
+    axes = figure.subplots()
+    axes.plot(generations, means)
+    if (lows != highs).any():
+        # each point summarises several generations
+        axes.fill_between(generations, lows, highs, alpha=0.3)
+    axes.set_title(metric)
+    figure.savefig(path)
+
+
 def load_world_from_genomes(genomes_file: str, config: dict) -> World:
     genomes = np.load(genomes_file)
     world = World(config)
@@ -29,9 +54,10 @@ def load_world_from_genomes(genomes_file: str, config: dict) -> World:
 @register_callback('logger')
 class LoggerCallback(Callback):
 
+    supports_scale_mode = True
+
     def __init__(self, config: dict, callback_name: str) -> None:
         super().__init__(config, callback_name)
-        self.history = []
         self.experiment_dir = self.global_config['experiment_dir']
         self.n_generations = self.global_config['n_generations']
 
@@ -48,25 +74,33 @@ class LoggerCallback(Callback):
         else:
             self.genomes_dir = None
 
+        self.io = get_io_executor(self.global_config)
+        self.history = MetricsStore(f'{self.experiment_dir}/history.yaml', self.io,
+                                    window=self.config.get('history_window', 100),
+                                    summary_frequency=self.config.get('summary_frequency', 1),
+                                    max_summaries=self.config.get('max_summaries', 1000),
+                                    max_memory_mb=self.config.get('max_memory_mb', 64))
+
     def _get_param(self, param_name: str):
         param = self.config.get(param_name, param_name)
         assert param is not None, f'{param_name} not specified in logger config'
         return param
 
-    def get_metric_array(self, metric: str) -> np.array:
-        return np.array([log[metric] for log in self.history])
-
     def on_generation_finish(self,
                              generation: int,
                              generation_logs: dict,
                              world: World):
         if self.should_save_genomes and (generation % self.save_genomes_frequency == 0
                                          or generation == self.n_generations - 1):
-            path = f'{self.genomes_dir}/genomes_{generation:06d}'
-            generation_logs['genomes_ckpt'] = save_genomes_to_file(world, path)
+            path = f'{self.genomes_dir}/genomes_{generation:06d}.npy'
+            self.io.submit(np.save, path, get_genomes(world))
+            generation_logs['genomes_ckpt'] = path
+
+        # the writes of earlier generations that are still queued or in flight
+        generation_logs.update(self.io.metrics())
+        generation_logs['logger_memory_mb'] = self.history.nbytes / 2 ** 20
 
         self.history.append(generation_logs)
-        self.save_history()
 
         if self.log_to_stdout and (generation % self.log_frequency == 0
                                    or generation == self.n_generations - 1):
@@ -84,19 +118,17 @@ class LoggerCallback(Callback):
         print(yaml.dump(generation_logs, default_flow_style=False))
 
     def make_plots(self):
-        generations = self.get_metric_array('generation')
         for metric in self.plot_metrics:
-            plt.plot(generations, self.get_metric_array(metric))
-            plt.title(metric)
-            plt.savefig(f'{self.experiment_dir}/{metric}.png')
-            plt.clf()
+            self.io.submit(plot_metric, *self.history.summary_arrays(metric),
+                           metric, f'{self.experiment_dir}/{metric}.png')
 
     def on_interrupt(self, world: World) -> None:
-        print('Interrupted. Saving history...')
-        self.save_history()
-        print('Saving genomes...')
-        save_genomes_to_file(world, f'{self.experiment_dir}/latest_genomes')
-
-    def save_history(self):
-        with open(f'{self.experiment_dir}/history.yaml', 'w') as history_file:
-            yaml.dump(self.history, history_file, default_flow_style=False)
+        print('Interrupted. Saving genomes and writing queued logs...')
+        self.io.submit(np.save, f'{self.experiment_dir}/latest_genomes.npy', get_genomes(world))
+        self.io.flush()
+
+    def state_dict(self) -> dict:
+        return {'history': self.history.state_dict()}
+
+    def load_state_dict(self, state: dict) -> None:
+        self.history.load_state_dict(state['history'])
@@ -0,0 +1,252 @@
+from evo.util.io_executor import IOExecutor
+
+from collections import deque
+from numbers import Number
+from pathlib import Path
+from typing import Dict, List, Optional
+import os
+import sys
+import threading
+
+import numpy as np
+import yaml
+
+
+def is_numeric(value) -> bool:
+    return isinstance(value, (Number, np.number)) and not isinstance(value, (bool, np.bool_))
+
+
+def estimate_size(logs: dict) -> int:
+    """ Approximate number of bytes used by a dictionary of logs. """
+    size = sys.getsizeof(logs)
+    for key, value in logs.items():
+        size += sys.getsizeof(key)
+        if isinstance(value, dict):
+            size += estimate_size(value)
+        elif isinstance(value, np.ndarray):
+            size += value.nbytes
+        else:
+            size += sys.getsizeof(value)
+    return size
+
+
+class MetricSummary:
+    """ Minimum, mean and maximum of each numeric metric over a range of generations. """
+
+    def __init__(self, first_generation: int) -> None:
+        self.first_generation = first_generation
+        self.last_generation = first_generation
+        self.n_generations = 0
+        self.stats: Dict[str, List[float]] = dict()
+
+    def add(self, generation: int, logs: dict) -> None:
+        self.last_generation = generation
+        self.n_generations += 1
+        for metric, value in logs.items():
+            if not is_numeric(value):
+                continue
+            value = float(value)
+            if metric not in self.stats:
+                # minimum, maximum, sum and count
+                self.stats[metric] = [value, value, 0., 0]
+            stats = self.stats[metric]
+            stats[0] = min(stats[0], value)
+            stats[1] = max(stats[1], value)
+            stats[2] += value
+            stats[3] += 1
+
+    def merge(self, other: 'MetricSummary') -> None:
+        self.last_generation = other.last_generation
+        self.n_generations += other.n_generations
+        for metric, (low, high, total, count) in other.stats.items():
+            if metric not in self.stats:
+                self.stats[metric] = [low, high, total, count]
+                continue
+            stats = self.stats[metric]
+            stats[0] = min(stats[0], low)
+            stats[1] = max(stats[1], high)
+            stats[2] += total
+            stats[3] += count
+
+    def get(self, metric: str) -> Optional[tuple]:
+        if metric not in self.stats:
+            return None
+        low, high, total, count = self.stats[metric]
+        return low, total / count, high
+
+    @property
+    def nbytes(self) -> int:
+        return sys.getsizeof(self.stats) + sum(
+            sys.getsizeof(metric) + sys.getsizeof(stats) + 4 * 24
+            for metric, stats in self.stats.items()
+        )
+
+    def state_dict(self) -> dict:
+        return {
+            'first_generation': self.first_generation,
+            'last_generation': self.last_generation,
+            'n_generations': self.n_generations,
+            'stats': {metric: list(stats) for metric, stats in self.stats.items()},
+        }
+
+    @staticmethod
+    def from_state_dict(state: dict) -> 'MetricSummary':
+        summary = MetricSummary(state['first_generation'])
+        summary.last_generation = state['last_generation']
+        summary.n_generations = state['n_generations']
+        summary.stats = {metric: list(stats) for metric, stats in state['stats'].items()}
+        return summary
+
+
+class MetricsStore:
+    """
+    Stores the logs of each generation of a run in bounded memory.
+
+    Every generation's logs are appended to a YAML file on disk, as a list
+    with one entry per generation, by the background I/O executor. Only
+    the most recent `window` generations are kept in memory, along with
+    summaries of the numeric metrics over every `summary_frequency`
+    generations for plotting. When there are more than `max_summaries`
+    summaries, neighbouring pairs are merged and the summary frequency is
+    doubled, so a run of any length only keeps a bounded number of them.
+    If the estimated memory used exceeds `max_memory_mb`, the oldest
+    generations in the window are dropped first.
+    """
+
+    def __init__(self,
+                 path: str,
+                 io: IOExecutor,
+                 window: int = 100,
+                 summary_frequency: int = 1,
+                 max_summaries: int = 1000,
+                 max_memory_mb: float = 64.) -> None:
+        self.path = path
+        self.io = io
+        self.window = window
+        self.summary_frequency = summary_frequency
+        self.max_summaries = max_summaries
+        self.max_memory = max_memory_mb * 2 ** 20
+
+        self.recent: deque = deque()
+        self.recent_sizes: deque = deque()
+        self.recent_nbytes = 0
+        self.summaries: List[MetricSummary] = []
+        self.current_summary: Optional[MetricSummary] = None
+
+        # number of bytes of the file submitted so far, used to truncate
+        # it back to a checkpoint when a run is resumed
+        self.file_nbytes = 0
+        self.pending_chunks: List[str] = []
+        self.file_lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        open(path, 'a').close()
+
+    def append(self, generation_logs: dict) -> None:
+        generation = generation_logs.get('generation', len(self))
+        self._stream(yaml.dump([generation_logs], default_flow_style=False))
+
+        self.recent.append(generation_logs)
+        self.recent_sizes.append(estimate_size(generation_logs))
+        self.recent_nbytes += self.recent_sizes[-1]
+
+        if self.current_summary is None:
+            self.current_summary = MetricSummary(generation)
+        self.current_summary.add(generation, generation_logs)
+        if self.current_summary.n_generations >= self.summary_frequency:
+            self.summaries.append(self.current_summary)
+            self.current_summary = None
+            if len(self.summaries) > self.max_summaries:
+                self._coarsen_summaries()
+
+        self._evict()
+
+    def _evict(self) -> None:
+        while len(self.recent) > 1 and (len(self.recent) > self.window
+                                        or self.nbytes > self.max_memory):
+            self.recent.popleft()
+            self.recent_nbytes -= self.recent_sizes.popleft()
+
+    def _coarsen_summaries(self) -> None:
+        coarse = []
+        for i in range(0, len(self.summaries) - 1, 2):
+            self.summaries[i].merge(self.summaries[i + 1])
+            coarse.append(self.summaries[i])
+        if len(self.summaries) % 2 == 1:
+            # an unpaired summary carries on filling up to the new frequency
+            self.current_summary = self.summaries[-1]
+        self.summaries = coarse
+        self.summary_frequency *= 2
+
+    def _stream(self, chunk: str) -> None:
+        self.file_nbytes += len(chunk.encode())
+        with self.file_lock:
+            self.pending_chunks.append(chunk)
+        self.io.submit(self._write_pending)
+
+    def _write_pending(self) -> None:
+        # the lock is held while writing, so chunks are written in order
+        # even when the executor has several workers
+        with self.file_lock:
+            chunks, self.pending_chunks = self.pending_chunks, []
+            if chunks:
+                with open(self.path, 'a') as history_file:
+                    history_file.write(''.join(chunks))
+
+    def __len__(self) -> int:
+        n_summarised = sum(summary.n_generations for summary in self.summaries)
+        if self.current_summary is not None:
+            n_summarised += self.current_summary.n_generations
+        return n_summarised
+
+    @property
+    def nbytes(self) -> int:
+        """ Estimated memory used by the logs held in memory. """
+        summaries = self.summaries + ([self.current_summary] if self.current_summary else [])
+        return self.recent_nbytes + sum(summary.nbytes for summary in summaries)
+
+    def summary_arrays(self, metric: str) -> tuple:
+        """
+        Returns the first generation of each summary, and the minimum,
+        mean and maximum of `metric` over the generations it covers.
+        """
+        summaries = self.summaries + ([self.current_summary] if self.current_summary else [])
+        generations, stats = [], []
+        for summary in summaries:
+            metric_stats = summary.get(metric)
+            if metric_stats is not None:
+                generations.append(summary.first_generation)
+                stats.append(metric_stats)
+        stats = np.array(stats, dtype=np.float64).reshape(-1, 3)
+        return np.array(generations), stats[:, 0], stats[:, 1], stats[:, 2]
+
+    def read_all(self) -> List[dict]:
+        """ Reads the logs of every generation back from disk. """
+        self.io.flush()
+        with open(self.path) as history_file:
+            return yaml.load(history_file, Loader=yaml.Loader) or []
+
+    def state_dict(self) -> dict:
+        return {
+            'recent': list(self.recent),
+            'summaries': [summary.state_dict() for summary in self.summaries],
+            'current_summary': (self.current_summary.state_dict()
+                                if self.current_summary is not None else None),
+            'summary_frequency': self.summary_frequency,
+            'file_nbytes': self.file_nbytes,
+        }
+
+    def load_state_dict(self, state: dict) -> None:
+        self.io.flush()
+        # drop the logs of generations after the checkpoint from the file
+        self.file_nbytes = state['file_nbytes']
+        if os.path.getsize(self.path) > self.file_nbytes:
+            os.truncate(self.path, self.file_nbytes)
+
+        self.recent = deque(state['recent'])
+        self.recent_sizes = deque(estimate_size(logs) for logs in self.recent)
+        self.recent_nbytes = sum(self.recent_sizes)
+        self.summaries = [MetricSummary.from_state_dict(summary) for summary in state['summaries']]
+        self.current_summary = None
+        if state['current_summary'] is not None:
+            self.current_summary = MetricSummary.from_state_dict(state['current_summary'])
+        self.summary_frequency = state['summary_frequency']
@@ -5,18 +5,21 @@ from typing import Type
 # import evo.repop.repop_fn as repop_fn
 # import evo.selection.selection_fn as selection_fn
 # import evo.world_gen.world_generator as world_generator
+# import evo.sensors.sensor as sensor
 
 
 SELECT = 'selection_fn'
 REPOP = 'repopulation_fn'
 CALLBACK = 'callback'
 WORLD_GEN = 'world_generator'
+SENSOR = 'sensor'
 
 _registry = {
     SELECT: {},
     REPOP: {},
     CALLBACK: {},
     WORLD_GEN: {},
+    SENSOR: {},
 }
 
 
@@ -36,6 +39,10 @@ def register_world_gen_class(name: str, world_gen_cls: Type['world_generator.Wor
     _registry[WORLD_GEN][name] = world_gen_cls
 
 
+def register_sensor_class(name: str, sensor_cls: Type['sensor.Sensor']):
+    _registry[SENSOR][name] = sensor_cls
+
+
 def register_repop_fn(name: str):
     def decorator(repop_cls: Type['repop_fn.RepopFunction']):
         register_repop_fn_class(name, repop_cls)
@@ -64,6 +71,13 @@ def register_world_gen(name: str):
     return decorator
 
 
+def register_sensor(name: str):
+    def decorator(sensor_cls: Type['sensor.Sensor']):
+        register_sensor_class(name, sensor_cls)
+        return sensor_cls
+    return decorator
+
+
 def _get_from_registry(registry_name: str, config: dict, registered_cls_name: str) -> object:
 
     if registry_name not in _registry:
@@ -114,3 +128,18 @@ def get_world_generator(config: dict) -> 'world_generator.WorldGenerator':
         raise Exception('world_gen_method not specified in config: ' + str(world_gen_config))
 
     return _get_from_registry(WORLD_GEN, config, world_gen_method)
+
+
+def get_sensor_class(sensor_name: str) -> Type['sensor.Sensor']:
+    cls = _registry[SENSOR].get(sensor_name)
+    if cls is None:
+        raise Exception(f'No {SENSOR} registered for {sensor_name}')
+    return cls
+
+
+def get_sensors(config: dict) -> list:
+    sensor_names = config.get('sensors')
+    if sensor_names is None:
+        raise Exception('sensors not specified in config')
+
+    return [_get_from_registry(SENSOR, config, sensor_name) for sensor_name in sensor_names]
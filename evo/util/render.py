@@ -1,16 +1,18 @@
-from evo.selection.region_based_selection import RegionBasedSelectionFunction, SelectionFunction
-from evo.util.registry import get_selection_function, register_callback
-from evo.world import World
+from evo.util.registry import register_callback
+from evo.world import World, BARRIER
 from evo.organism import Organism
 from evo.util.callback import Callback
+from evo.util.io_executor import get_io_executor
+from evo.tiled_occupancy import find_cells
 
-from typing import List
+from typing import List, NamedTuple, Optional, Tuple
 from pathlib import Path
 
 import numpy as np
 import imageio
 import pygame
 import os
+import threading
 
 
 # set SDL to use the dummy NULL video driver,
@@ -23,6 +25,8 @@ WHITE = (255, 255, 255)
 LIGHT_GREEN = (192, 255, 158)
 BLACK = (0, 0, 0)
 DARK_GRAY = (50, 50, 50)
+# frames are drawn on the shared window by the io workers one at a time
+RENDER_LOCK = threading.Lock()
 
 
 @register_callback('render_video')
@@ -41,8 +45,8 @@ class RenderVideoCallback(Callback):
         self.videos_dir = global_config.get('experiment_dir') + '/videos'
         Path(self.videos_dir).mkdir(parents=True, exist_ok=True)
 
-        self.sim_selection_fn = get_selection_function(global_config)
-        self.frames = []
+        self.snapshots = []
+        self.io = get_io_executor(global_config)
 
     def is_video_generation(self, generation: int) -> bool:
         return generation % self.frequency == 0 or generation == self.n_generations - 1
@@ -51,16 +55,18 @@ class RenderVideoCallback(Callback):
         logs = {}
 
         if self.is_video_generation(generation):
-            frame = render_world(world, self.sim_selection_fn)
-            self.frames.append(frame)
+            # the frames are drawn by the io workers, while the simulation carries on
+            self.snapshots.append(snapshot_world(world))
 
         return logs
 
     def on_generation_finish(self, generation: int, generation_logs: dict, _: World) -> None:
         if self.is_video_generation(generation):
-            video_path = f'{self.videos_dir}/generation_{generation:06d}'
-            generation_logs['video_save_file'] = save_video(self.frames, video_path, fps=self.fps)
-            self.frames = []
+            video_path = f'{self.videos_dir}/generation_{generation:06d}.mp4'
+            # the snapshots are handed over to the writer and a new list started
+            self.io.submit(render_video, self.snapshots, video_path, fps=self.fps)
+            generation_logs['video_save_file'] = video_path
+            self.snapshots = []
 
 
 def get_organism_colour(organism: Organism) -> tuple:
@@ -78,8 +84,44 @@ def get_organism_colour(organism: Organism) -> tuple:
             genes_to_colour(blue_genes))
 
 
-def render_world(world: World,
-                 sim_selection_fn: SelectionFunction = None) -> np.ndarray:
+def get_organism_colours(genomes: np.ndarray) -> np.ndarray:
+    """ Returns the colours of `get_organism_colour` for a stacked genome array. """
+    n_genes = genomes.shape[1]
+    thirds = [genomes[:, :n_genes // 3],
+              genomes[:, n_genes // 3:2 * n_genes // 3],
+              genomes[:, 2 * n_genes // 3:]]
+    return np.stack([50 + ((genes.mean(axis=1) % 1.0) * 150).astype(np.int64)
+                     for genes in thirds], axis=1)
+
+
+class WorldSnapshot(NamedTuple):
+    """ A copy of what a frame shows of the world, so that it can be drawn later. """
+    world_width: int
+    world_height: int
+    # x and y of each barrier cell, shared by the snapshots of a generation,
+    # and the (height, width) mask of the survival region
+    barriers: Tuple[np.ndarray, np.ndarray]
+    survival_mask: Optional[np.ndarray]
+    # (n_organisms, 2) x and y of each organism, and its (n_organisms, 3) colour
+    positions: np.ndarray
+    colours: np.ndarray
+
+
+def barrier_cells(world: World) -> Tuple[np.ndarray, np.ndarray]:
+    return find_cells(world.occupancy, BARRIER)
+
+
+def snapshot_world(world: World) -> WorldSnapshot:
+    population = world.population
+    return WorldSnapshot(world.world_width,
+                         world.world_height,
+                         world.cached('barrier_cells', barrier_cells, per_step=False),
+                         world.config.survival_mask,
+                         population.positions[:population.size].copy(),
+                         get_organism_colours(population.genomes[:population.size]))
+
+
+def render_world(world: World) -> np.ndarray:
     """
     Renders the world.
 
@@ -89,6 +131,16 @@ def render_world(world: World,
     Returns:
         np.ndarray: The pixel array of the rendered world.
     """
+    return render_snapshot(snapshot_world(world))
+
+
+def render_snapshot(snapshot: WorldSnapshot) -> np.ndarray:
+    """ Renders a snapshot of the world and returns the pixel array. """
+    with RENDER_LOCK:
+        return _draw(snapshot)
+
+
+def _draw(world: WorldSnapshot) -> np.ndarray:
 
     # cell_width = WINDOW_SIZE / world.world_width
     # cell_height = WINDOW_SIZE / world.world_height
@@ -115,24 +167,34 @@ def render_world(world: World,
             int(x * cell_height + cell_height / 2)
         )
 
-    if isinstance(sim_selection_fn, RegionBasedSelectionFunction):
-        for x in range(world.world_width):
-            for y in range(world.world_height):
-                if sim_selection_fn.in_survival_region(world, x, y):
-                    rect = get_cell_rect(x, y)
-                    pygame.draw.rect(PYGAME_WINDOW, LIGHT_GREEN, rect)
+    def fill_cells(mask: np.ndarray, colour: tuple):
+        # the (height, width) mask is drawn with the same layout as `get_cell_rect`
+        pixels = pygame.surfarray.pixels3d(PYGAME_WINDOW)
+        mask = np.repeat(np.repeat(mask, cell_width, axis=0), cell_height, axis=1)
+        mask = mask[:pixels.shape[0], :pixels.shape[1]]
+        pixels[:mask.shape[0], :mask.shape[1]][mask] = colour
+        del pixels
 
-    for (x, y), value in world.occupied_cells.items():
-        rect = get_cell_rect(x, y)
-        if isinstance(value, Organism):
-            pygame.draw.ellipse(PYGAME_WINDOW, get_organism_colour(value), rect)
-        else:
-            pygame.draw.rect(PYGAME_WINDOW, DARK_GRAY, rect)
+    if world.survival_mask is not None:
+        fill_cells(world.survival_mask, LIGHT_GREEN)
+
+    barriers = np.zeros((world.world_height, world.world_width), dtype=bool)
+    barrier_xs, barrier_ys = world.barriers
+    barriers[barrier_ys, barrier_xs] = True
+    fill_cells(barriers, DARK_GRAY)
+
+    for (x, y), colour in zip(world.positions.tolist(), world.colours.tolist()):
+        pygame.draw.ellipse(PYGAME_WINDOW, colour, get_cell_rect(x, y))
 
     # returns the pixel array of the pygame window as a numpy array
     return pygame.surfarray.array3d(pygame.display.get_surface())
 
 
+def render_video(snapshots: List[WorldSnapshot], file_path: str, fps: int = 30) -> str:
+    """ Renders snapshots of the world and saves them as a video. """
+    return save_video([render_snapshot(snapshot) for snapshot in snapshots], file_path, fps=fps)
+
+
 def save_video(frames: List[np.ndarray],
                file_path: str = 'video',
                format='mp4',
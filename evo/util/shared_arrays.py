@@ -0,0 +1,226 @@
+"""
+Zero-copy exchange of arrays between processes through shared memory.
+
+The process that owns the arrays puts them in a `SharedArrays`, and sends
+its `descriptor` to the workers instead of the arrays themselves. A
+descriptor only holds the name, shape and dtype of each block, so it is
+cheap to pickle however large the arrays are. Workers call
+`attach_arrays` with it to get views of the same memory, without copying:
+
+    shared = share_world(world)
+    pool.map(evaluate, [shared.descriptor] * n_tasks)
+
+    def evaluate(descriptor):
+        with attach_arrays(descriptor) as arrays:
+            genomes = arrays['genomes']
+            ...
+
+Blocks are unlinked when the `SharedArrays` is closed or garbage
+collected, when the process exits, and by `ExperimentRunner` when a run
+crashes, through `unlink_shared_arrays`. Only the owner ever unlinks a
+block, so workers must be done with the arrays by then.
+"""
+from evo.tiled_occupancy import TiledOccupancy
+
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import TYPE_CHECKING, Dict, Iterator, NamedTuple, Optional
+import atexit
+import weakref
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from evo.world import World
+
+
+class ArraySpec(NamedTuple):
+    """ Where to find a shared array: the name of its block, its shape and its dtype. """
+    name: str
+    shape: tuple
+    dtype: str
+
+
+# descriptors map the keys of the arrays to their specs
+SharedArraysDescriptor = Dict[str, ArraySpec]
+
+# every block created by this process and not yet unlinked, by name
+_OWNED_BLOCKS: Dict[str, SharedMemory] = dict()
+
+
+def _release(block: SharedMemory) -> None:
+    if _OWNED_BLOCKS.pop(block.name, None) is None:
+        return
+    try:
+        block.unlink()
+    except FileNotFoundError:
+        pass
+    try:
+        block.close()
+    except BufferError:
+        # still viewed by arrays, the memory is released with them
+        pass
+
+
+def unlink_shared_arrays() -> None:
+    """ Unlinks every shared block created by this process, such as after a crash. """
+    for block in list(_OWNED_BLOCKS.values()):
+        _release(block)
+
+
+atexit.register(unlink_shared_arrays)
+
+
+def _attach_block(name: str) -> SharedMemory:
+    try:
+        # python 3.13 and later can attach without tracking the block
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+
+    # before that, attaching registers the block with the resource tracker
+    # of the worker, which would unlink it when the worker exits, or with
+    # the owner's tracker, which forgets it once either of them unlinks it
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+class SharedArrays:
+    """
+    Arrays in shared memory owned by this process, by key. `put` copies an
+    array into a block, reusing the key's block when the shape and dtype
+    have not changed, so the descriptor stays the same from one generation
+    to the next and workers can keep their views.
+    """
+
+    def __init__(self) -> None:
+        self.blocks: Dict[str, SharedMemory] = dict()
+        self.arrays: Dict[str, np.ndarray] = dict()
+        self._finalizer = weakref.finalize(self, _release_all, self.blocks)
+
+    def allocate(self, key: str, shape: tuple, dtype=np.float64) -> np.ndarray:
+        """ Returns a zeroed array in shared memory, replacing the key's previous array. """
+        shape = tuple(int(n) for n in shape)
+        dtype = np.dtype(dtype)
+        array = self.arrays.get(key)
+        if array is not None and array.shape == shape and array.dtype == dtype:
+            array.fill(0)
+            return array
+
+        self.remove(key)
+        block = SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+        _OWNED_BLOCKS[block.name] = block
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        array.fill(0)
+        self.blocks[key] = block
+        self.arrays[key] = array
+        return array
+
+    def put(self, key: str, array: np.ndarray) -> np.ndarray:
+        """ Copies an array into shared memory and returns the shared copy. """
+        array = np.asarray(array)
+        shared = self.arrays.get(key)
+        if shared is None or shared.shape != array.shape or shared.dtype != array.dtype:
+            shared = self.allocate(key, array.shape, array.dtype)
+        shared[...] = array
+        return shared
+
+    def remove(self, key: str) -> None:
+        self.arrays.pop(key, None)
+        block = self.blocks.pop(key, None)
+        if block is not None:
+            _release(block)
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        return self.arrays[key]
+
+    @property
+    def descriptor(self) -> SharedArraysDescriptor:
+        return {
+            key: ArraySpec(self.blocks[key].name, array.shape, array.dtype.str)
+            for key, array in self.arrays.items()
+        }
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self.arrays.values())
+
+    def close(self) -> None:
+        """ Unlinks the blocks. Workers must have stopped using them. """
+        self.arrays.clear()
+        self._finalizer()
+
+
+def _release_all(blocks: Dict[str, SharedMemory]) -> None:
+    for block in blocks.values():
+        _release(block)
+    blocks.clear()
+
+
+class AttachedArrays:
+    """
+    Views of arrays shared by another process, from its descriptor. The
+    views must not be used after `close`, which is called on leaving a
+    `with` block.
+    """
+
+    def __init__(self, descriptor: SharedArraysDescriptor) -> None:
+        self.blocks: Dict[str, SharedMemory] = dict()
+        self.arrays: Dict[str, np.ndarray] = dict()
+        for key, (name, shape, dtype) in descriptor.items():
+            block = _attach_block(name)
+            self.blocks[key] = block
+            self.arrays[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        return self.arrays[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.arrays)
+
+    def __enter__(self) -> 'AttachedArrays':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        # drop the views before the blocks can be closed
+        self.arrays.clear()
+        for block in self.blocks.values():
+            block.close()
+        self.blocks.clear()
+
+
+def attach_arrays(descriptor: SharedArraysDescriptor) -> AttachedArrays:
+    return AttachedArrays(descriptor)
+
+
+def share_world(world: 'World', shared: Optional[SharedArrays] = None) -> SharedArrays:
+    """
+    Copies the genome matrix, positions and occupancy (terrain and
+    organisms) of a world into shared memory, as 'genomes', 'positions'
+    and 'occupancy'. The occupancy of a tiled world is shared as its
+    allocated tiles instead, (n_tiles, tile_size, tile_size) 'occupancy_tiles'
+    with the (tx, ty) of each tile in 'occupancy_tile_keys'. Passing the
+    `SharedArrays` of a previous call reuses its blocks.
+    """
+    shared = shared or SharedArrays()
+    population = world.population
+    shared.put('genomes', population.genomes[:population.size])
+    shared.put('positions', population.positions[:population.size])
+    if isinstance(world.occupancy, TiledOccupancy):
+        occupancy = world.occupancy
+        tile_keys = list(occupancy.tiles)
+        shared.put('occupancy_tile_keys', np.array(tile_keys, dtype=np.int64).reshape(-1, 2))
+        tiles = shared.allocate('occupancy_tiles', (len(tile_keys), occupancy.tile_size, occupancy.tile_size),
+                                np.uint8)
+        for i, tile_key in enumerate(tile_keys):
+            tiles[i] = occupancy.tiles[tile_key]
+    else:
+        shared.put('occupancy', world.occupancy)
+    return shared
@@ -0,0 +1,258 @@
+from evo.util.callback import Callback
+from evo.util.registry import register_callback
+from evo.world import World
+
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from socketserver import ThreadingMixIn, UnixStreamServer
+from typing import Optional
+import atexit
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+
+# phases of a generation timed by `EvolutionSimulation.run_generation`
+PHASES = ['simulate', 'selection', 'repopulate']
+
+
+def memory_rss_bytes() -> int:
+    """ Returns the resident memory of the process, or its peak where that is not available. """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # kilobytes on linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _remove_socket(socket_path: str) -> None:
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+
+class _ThreadingUnixServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+def _make_handler(telemetry: 'TelemetryCallback'):
+
+    class TelemetryHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self) -> None:
+            if self.path.startswith('/metrics'):
+                body = telemetry.prometheus_text().encode()
+                content_type = 'text/plain; version=0.0.4'
+            elif self.path.startswith('/history'):
+                body = json.dumps(telemetry.history()).encode()
+                content_type = 'application/json'
+            else:
+                self.send_error(404, 'Try /metrics or /history')
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def address_string(self) -> str:
+            # clients of a unix socket have no address
+            return str(self.client_address or 'local')
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+    return TelemetryHandler
+
+
+@register_callback('telemetry')
+class TelemetryCallback(Callback):
+    """
+    Serves the progress of a run for monitoring, from a ring buffer of the
+    last `ring_size` generations: steps and organism-steps per second, the
+    time spent in each phase of the generation, the survival rate and the
+    resident memory of the process.
+
+    The stats are served over HTTP by a background thread, in the Prometheus
+    text format at `/metrics` and as JSON at `/history`. The server listens
+    on `host` and `port`, where port 0 picks a free port, or on the Unix
+    socket `socket_path` if it is given. The address is written to
+    `telemetry_address` in the run directory, so that the runs of a sweep
+    can be found. With `progress_bar: True` a single line of progress is
+    also kept up to date on stderr.
+
+    Everything is computed once per generation from the generation's logs,
+    so the callback adds no work to the steps. The ring buffer and the
+    totals are checkpointed, so they carry on when a run is resumed.
+    """
+
+    supports_scale_mode = True
+
+    def __init__(self, config: dict, callback_name: str = 'telemetry') -> None:
+        super().__init__(config, callback_name)
+        self.ring = deque(maxlen=self.config.get('ring_size', 1000))
+        self.lock = threading.Lock()
+        self.progress_bar = self.config.get('progress_bar', False)
+
+        self.n_generations = self.global_config.get('n_generations')
+        self.steps_per_generation = self.global_config['world_steps_per_generation']
+        experiment_dir = self.global_config.get('experiment_dir')
+        self.run_name = Path(experiment_dir).name if experiment_dir else 'run'
+
+        self.total_generations = 0
+        self.total_steps = 0
+        self.total_organism_steps = 0
+        # organisms that take part in the next generation
+        self.n_organisms = self.global_config['pop_size']
+        self.start_time = time.perf_counter()
+        self.last_time = self.start_time
+
+        self.server = None
+        self.address = None
+        if self.config.get('serve', True):
+            self.start_server(experiment_dir)
+
+    def start_server(self, experiment_dir: Optional[str]) -> None:
+        handler = _make_handler(self)
+        socket_path = self.config.get('socket_path')
+        if socket_path is not None:
+            _remove_socket(socket_path)
+            self.server = _ThreadingUnixServer(socket_path, handler)
+            self.address = f'unix:{socket_path}'
+            atexit.register(_remove_socket, socket_path)
+        else:
+            self.server = ThreadingHTTPServer((self.config.get('host', '127.0.0.1'),
+                                               self.config.get('port', 0)), handler)
+            host, port = self.server.server_address[:2]
+            self.address = f'http://{host}:{port}'
+
+        threading.Thread(target=self.server.serve_forever, daemon=True, name='telemetry').start()
+        print(f'Serving telemetry at {self.address}')
+        if experiment_dir is not None:
+            with open(f'{experiment_dir}/telemetry_address', 'w') as f:
+                f.write(self.address + '\n')
+
+    def on_generation_finish(self,
+                             generation: int,
+                             generation_logs: dict,
+                             world: World) -> None:
+        now = time.perf_counter()
+        generation_time = max(now - self.last_time, 1e-9)
+        self.last_time = now
+
+        n_steps = self.steps_per_generation - generation_logs.get('skipped_steps', 0)
+        organism_steps = n_steps * self.n_organisms
+        self.total_generations += 1
+        self.total_steps += n_steps
+        self.total_organism_steps += organism_steps
+        self.n_organisms = world.population.size
+
+        stats = {
+            'generation': generation,
+            'generation_seconds': generation_time,
+            'steps_per_second': n_steps / generation_time,
+            'organism_steps_per_second': organism_steps / generation_time,
+            'survival_rate': generation_logs.get('survival_rate'),
+            'memory_rss_bytes': memory_rss_bytes(),
+        }
+        phase_time = 0.
+        for phase in PHASES:
+            if f'{phase}_ms' in generation_logs:
+                stats[f'{phase}_seconds'] = generation_logs[f'{phase}_ms'] / 1000
+                phase_time += stats[f'{phase}_seconds']
+        # callbacks, checkpoints and anything else between generations
+        stats['other_seconds'] = max(generation_time - phase_time, 0.)
+
+        with self.lock:
+            self.ring.append(stats)
+
+        if self.progress_bar:
+            self.print_progress(stats)
+
+    def history(self) -> list:
+        with self.lock:
+            return list(self.ring)
+
+    def prometheus_text(self) -> str:
+        with self.lock:
+            latest = self.ring[-1] if self.ring else None
+            totals = {
+                'generations_total': self.total_generations,
+                'steps_total': self.total_steps,
+                'organism_steps_total': self.total_organism_steps,
+            }
+
+        label = f'run="{self.run_name}"'
+        lines = []
+
+        def add(name: str, kind: str, value, labels: str = label) -> None:
+            if value is None:
+                return
+            if not any(line.startswith(f'# TYPE evo_{name} ') for line in lines):
+                lines.append(f'# TYPE evo_{name} {kind}')
+            lines.append(f'evo_{name}{{{labels}}} {value}')
+
+        for name, value in totals.items():
+            add(name, 'counter', value)
+        add('uptime_seconds', 'gauge', time.perf_counter() - self.start_time)
+        add('n_generations', 'gauge', self.n_generations)
+        if latest is not None:
+            for name, value in latest.items():
+                if name.endswith('_seconds') and name[:-len('_seconds')] in PHASES + ['other']:
+                    add('phase_seconds', 'gauge', value, f'{label},phase="{name[:-len("_seconds")]}"')
+                else:
+                    add(name, 'gauge', value)
+        return '\n'.join(lines) + '\n'
+
+    def print_progress(self, stats: dict) -> None:
+        generation = stats['generation'] + 1
+        line = f'gen {generation}'
+        if self.n_generations:
+            done = generation / self.n_generations
+            bar_width = 20
+            filled = int(done * bar_width)
+            remaining = (self.last_time - self.start_time) / self.total_generations \
+                * (self.n_generations - generation)
+            line += f'/{self.n_generations} [{"#" * filled}{"-" * (bar_width - filled)}] ' \
+                    f'eta {int(remaining // 3600)}:{int(remaining % 3600 // 60):02d}:{int(remaining % 60):02d}'
+        line += f' | {stats["steps_per_second"]:,.0f} steps/s' \
+                f' | {stats["organism_steps_per_second"]:,.0f} organism-steps/s'
+        if stats['survival_rate'] is not None:
+            line += f' | survival {stats["survival_rate"]:.3f}'
+        line += f' | {stats["memory_rss_bytes"] / 2 ** 20:,.0f} MB'
+        end = '\n' if generation == self.n_generations else ''
+        sys.stderr.write(f'\r{line}\033[K{end}')
+        sys.stderr.flush()
+
+    def state_dict(self) -> dict:
+        with self.lock:
+            return {
+                'ring': list(self.ring),
+                'total_generations': self.total_generations,
+                'total_steps': self.total_steps,
+                'total_organism_steps': self.total_organism_steps,
+                'n_organisms': self.n_organisms,
+                'elapsed_seconds': self.last_time - self.start_time,
+            }
+
+    def load_state_dict(self, state: dict) -> None:
+        with self.lock:
+            self.ring.clear()
+            self.ring.extend(state['ring'])
+            self.total_generations = state['total_generations']
+            self.total_steps = state['total_steps']
+            self.total_organism_steps = state['total_organism_steps']
+        self.n_organisms = state['n_organisms']
+        # the uptime and the progress bar's estimate carry on from the checkpoint
+        self.last_time = time.perf_counter()
+        self.start_time = self.last_time - state['elapsed_seconds']
+
+    def on_interrupt(self, world: World) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
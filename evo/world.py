@@ -1,31 +1,177 @@
-from typing import List
-from evo.organism import Organism, LocalWorldState, Action
+from typing import List, Optional
+from evo.brain_cache import genome_key
+from evo.config import compile_config
+from evo.organism import Organism, LocalWorldState, Action, Genome
+from evo.population import PopulationArrays
+from evo.kernels import NUMBA_AVAILABLE
+from evo.tiled_occupancy import TiledOccupancy
 
 import random
+import time
+import weakref
+import numpy as np
 
 
-class World:
+# cell codes used in the occupancy array
+EMPTY = 0
+ORGANISM = 1
+BARRIER = 2
 
-    def __init__(self, config: dict, world_generator) -> None:
-        self.config = config
-        self.world_width = config.get('world_width')
-        self.world_height = config.get('world_height')
-        assert self.world_width is not None and self.world_height is not None, \
-            'World size not specified'
 
-        self.include_diagonal_cells_in_local_state = \
-            config.get('include_diagonal_cells')
+class Barrier:
+    pass
+
+
+# the barrier in every cell filled by `World.add_barriers`, and returned for
+# barrier cells of tiled worlds, which do not store barrier objects
+BARRIER_CELL = Barrier()
+
 
-        if self.include_diagonal_cells_in_local_state is None:
-            raise Exception('include_diagonal_cells not specified in config')
+class World:
+
+    def __init__(self, config: dict, world_generator) -> None:
+        self.config = config = compile_config(config)
+        self.world_width = config.world_width
+        self.world_height = config.world_height
+        self.include_diagonal_cells_in_local_state = config['include_diagonal_cells']
+
+        self.step_backend = config.get('step_backend', 'python')
+        assert self.step_backend in ['python', 'numba'], \
+            'step_backend must be one of [python, numba]'
+
+        # displacement of each action, and whether it is a random move
+        self.action_deltas = Action.deltas(config)
+        self.random_actions = Action.random_actions(config)
+        self.deterministic_actions = not self.random_actions.any()
+        self._action_table = [tuple(delta) for delta in self.action_deltas.tolist()]
+        self._random_action_table = self.random_actions.tolist()
+        self._cardinal_moves = [tuple(delta) for delta in Action.cardinal_deltas().tolist()]
+
+        # 'dense' stores every cell, 'tiled' only stores tiles with
+        # occupied cells, for very large and mostly empty worlds
+        self.occupancy_backend = config.get('occupancy_backend', 'dense')
+        assert self.occupancy_backend in ['dense', 'tiled'], \
+            'occupancy_backend must be one of [dense, tiled]'
+
+        if self.step_backend == 'numba' and self.occupancy_backend == 'tiled':
+            print('The numba step backend does not support tiled occupancy, '
+                  'falling back to the python step backend')
+            self.step_backend = 'python'
+
+        if self.step_backend == 'numba' and not NUMBA_AVAILABLE:
+            print('Numba is not installed, falling back to the python step backend')
+            self.step_backend = 'python'
+
+        # only re-evaluate organisms whose surroundings changed since they were last blocked
+        self.sparse_stepping = config.get('sparse_stepping', False)
+
+        # recurrent brains keep a hidden state between steps, see `PopulationArrays.hidden`
+        self.recurrent_brains = Genome.is_recurrent(config)
+        if self.recurrent_brains and self.sparse_stepping:
+            print('Sparse stepping does not support recurrent brains, disabling it')
+            self.sparse_stepping = False
+
+        # sensors computing the brain inputs, if not the default observation
+        self.sensors = None
+        # imported here as the sensors themselves depend on this module
+        from evo.sensors.sensor import uses_default_sensors
+        if not uses_default_sensors(config):
+            from evo.util.registry import get_sensors
+            self.sensors = get_sensors(config)
+
+        if self.sensors is not None and self.sparse_stepping \
+                and not all(sensor.local for sensor in self.sensors):
+            print('Sparse stepping requires all sensors to be local, disabling it')
+            self.sparse_stepping = False
+
+        if self.step_backend == 'numba' and self.sensors is not None:
+            print('The numba step backend only supports the default sensors, '
+                  'falling back to the python step backend')
+            self.step_backend = 'python'
+
+        if self.step_backend == 'numba' and not self.deterministic_actions:
+            print('The numba step backend does not support random moves, '
+                  'falling back to the python step backend')
+            self.step_backend = 'python'
+
+        # each organism's actions cached by position and neighbouring cells, see `World.policy_action`
+        self.policy_tables = config.get('policy_tables', False)
+        assert self.policy_tables in [True, False, 'auto'], \
+            'policy_tables must be one of [True, False, auto]'
+        if self.include_diagonal_cells_in_local_state:
+            self._neighbour_offsets = [(dx, dy) for dy in range(-1, 2) for dx in range(-1, 2)
+                                       if dx != 0 or dy != 0]
+        else:
+            self._neighbour_offsets = [(0, -1), (0, 1), (-1, 0), (1, 0)]
+        self.policy_table_shape = (self.world_height, self.world_width, 1 << len(self._neighbour_offsets))
+
+        unsupported_reason = None
+        if self.step_backend != 'python':
+            unsupported_reason = 'they are only used by the python step backend'
+        elif self.sensors is not None or self.recurrent_brains:
+            unsupported_reason = 'they require the default sensors and feedforward brains'
+        elif config['pop_size'] * np.prod(self.policy_table_shape) > config.get('policy_table_max_size', 2 ** 27):
+            # with no two organisms sharing a genome, every organism has its own table
+            unsupported_reason = 'the tables of the population could be larger than policy_table_max_size'
+        if self.policy_tables and unsupported_reason is not None:
+            # only worth mentioning if they were asked for explicitly
+            if self.policy_tables is True:
+                print(f'Disabling policy tables, as {unsupported_reason}')
+            self.policy_tables = False
+
+        # in 'auto' mode the first generation is run with the brains and the
+        # next two with policy tables, the first of which fills the tables
+        # of the survivors, and the faster is used from then on
+        self.use_policy_tables = self.policy_tables is True
+        # organisms with identical genomes share one table, which is freed
+        # once none of the organisms holding it are alive
+        self._policy_tables_by_genome = weakref.WeakValueDictionary()
+        self._policy_mode_step_times = []
+        self._update_time = 0.
+        self._n_updates = 0
+
+        # number of processes that step the world in parallel, see `evo.kernels.strips`
+        self.step_workers = config.get('step_workers', 1)
+        if self.step_workers > 1 and self.step_backend != 'numba':
+            print('Parallel stepping requires the numba step backend, using one worker')
+            self.step_workers = 1
+        if self.step_workers > 1 and self.sparse_stepping:
+            print('Sparse stepping is not supported with parallel stepping, disabling it')
+            self.sparse_stepping = False
+
+        self.strip_stepper = None
+        allocate = np.zeros
+        if self.step_workers > 1:
+            from evo.kernels.strips import StripStepper
+            self.strip_stepper = StripStepper(self.world_width, self.world_height, self.step_workers)
+            allocate = self.strip_stepper.allocate
+
+        # number of organisms that moved in the last step
+        self.n_moved = 0
 
         # Data structures for storing organisms
         self.organisms: List[Organism] = []
-        self.grid = [[None for _ in range(self.world_width)] for _ in range(self.world_height)]
+        if self.occupancy_backend == 'dense':
+            self.grid = [[None for _ in range(self.world_width)] for _ in range(self.world_height)]
+            self.occupancy = allocate((self.world_height, self.world_width), dtype=np.uint8)
+        else:
+            # organisms are looked up in `occupied_cells` and barriers in the tiles
+            self.grid = None
+            self.occupancy = TiledOccupancy(self.world_width, self.world_height,
+                                            config.get('occupancy_tile_size', 64))
+        # organisms, and barriers in dense worlds, by (x, y) cell
         self.occupied_cells = dict()
+        self.population = PopulationArrays(Genome.num_genes(config),
+                                           Genome.hidden_state_size(config),
+                                           allocate=allocate)
+
+        # values derived from the world state, see `World.cached`
+        self._step_cache = dict()
+        self._generation_cache = dict()
 
         # Generate the world
         self.world_generator = world_generator
+        self.generation: Optional[int] = None
         self.world_generator.generate(self)
 
     @property
@@ -33,42 +179,114 @@ class World:
         return len(self.organisms)
 
     def is_cell_occupied(self, x: int, y: int) -> bool:
+        if self.grid is None:
+            return self.occupancy.get(x, y) != EMPTY
         return self.grid[y][x] is not None
 
+    def get_cell(self, x: int, y: int):
+        """
+        Returns the organism or barrier in a cell, or None if it is empty.
+        """
+        if self.grid is None:
+            cell = self.occupied_cells.get((x, y))
+            if cell is None and self.occupancy.get(x, y) == BARRIER:
+                return BARRIER_CELL
+            return cell
+        return self.grid[y][x]
+
     def set_cell(self, x: int, y: int, value) -> None:
-        self.grid[y][x] = value
-        self.occupied_cells[(x, y)] = value
+        is_organism = isinstance(value, Organism)
+        if self.grid is not None:
+            self.grid[y][x] = value
+            self.occupied_cells[(x, y)] = value
+        elif is_organism:
+            self.occupied_cells[(x, y)] = value
+        self.occupancy[y, x] = ORGANISM if is_organism else BARRIER
+        if self.sparse_stepping:
+            self.unfreeze_neighbours(x, y)
+
+    def add_barriers(self, mask: np.ndarray) -> None:
+        """
+        Places a barrier in every cell where the (height, width) boolean
+        mask is true, with one assignment to the occupancy. The cells must
+        not hold organisms. In the grid of dense worlds every barrier cell
+        is the shared `BARRIER_CELL`.
+        """
+        mask = np.asarray(mask, dtype=bool)
+        assert mask.shape == (self.world_height, self.world_width), \
+            f'Barrier mask has shape {mask.shape}, expected {(self.world_height, self.world_width)}'
+
+        if self.grid is None:
+            self.occupancy.fill_mask(0, 0, mask, BARRIER)
+        else:
+            self.occupancy[mask] = BARRIER
+            # the runs of barrier cells along each row, written as slices
+            edges = np.diff(mask.astype(np.int8), axis=1, prepend=0, append=0)
+            starts_y, starts_x = np.nonzero(edges == 1)
+            _, ends_x = np.nonzero(edges == -1)
+            for y, x0, x1 in zip(starts_y.tolist(), starts_x.tolist(), ends_x.tolist()):
+                self.grid[y][x0:x1] = [BARRIER_CELL] * (x1 - x0)
+
+        if self.sparse_stepping:
+            # organisms next to the new barriers may now move differently
+            self.population.frozen.fill(0)
 
     def delete_cell(self, x: int, y: int) -> None:
-        self.grid[y][x] = None
+        if self.grid is not None:
+            self.grid[y][x] = None
+        self.occupancy[y, x] = EMPTY
         if (x, y) in self.occupied_cells:
             del self.occupied_cells[(x, y)]
+        if self.sparse_stepping:
+            self.unfreeze_neighbours(x, y)
+
+    def unfreeze_neighbours(self, x: int, y: int) -> None:
+        """
+        Notifies the organisms around a cell that its occupancy changed.
+        An organism's observation and the cell it can move into both lie
+        within one cell of it, so these are the only organisms whose next
+        action or its outcome can be affected.
+        """
+        frozen = self.population.frozen
+        for yy in range(max(y - 1, 0), min(y + 2, self.world_height)):
+            for xx in range(max(x - 1, 0), min(x + 2, self.world_width)):
+                # only organisms matter, and tiled worlds keep them all in `occupied_cells`
+                cell = self.occupied_cells.get((xx, yy)) if self.grid is None else self.grid[yy][xx]
+                if isinstance(cell, Organism) and cell.index is not None:
+                    frozen[cell.index] = 0
 
     def find_random_empty_cell(self) -> tuple:
-        empty_cells = []
-        for y in range(self.world_height):
-            for x in range(self.world_width):
-                if not self.is_cell_occupied(x, y):
-                    empty_cells.append((x, y))
+        if self.grid is None:
+            return self.occupancy.sample_empty_cell()
 
+        # flat indices of the empty cells, in row-major order like a scan over the rows
+        empty_cells = np.flatnonzero(self.occupancy.ravel() == EMPTY)
         if len(empty_cells) == 0:
             return None
 
-        return random.choice(empty_cells)
+        y, x = divmod(int(random.choice(empty_cells)), self.world_width)
+        return x, y
 
     def get_organism_position(self, organism: Organism) -> tuple:
         return organism.local_world_state.x, organism.local_world_state.y
 
     def set_organism_position(self,
                               organism: Organism,
-                              x: int, y: int) -> None:
-        self.grid[y][x] = organism
+                              x: int, y: int,
+                              clear_old_cell: bool = True) -> None:
+        if self.grid is not None:
+            self.grid[y][x] = organism
         self.occupied_cells[(x, y)] = organism
+        self.occupancy[y, x] = ORGANISM
+        self.population.set_position(organism, x, y)
+        if self.sparse_stepping:
+            self.unfreeze_neighbours(x, y)
 
         if organism.local_world_state is not None:
             old_x = organism.local_world_state.x
             old_y = organism.local_world_state.y
-            self.delete_cell(old_x, old_y)
+            if clear_old_cell:
+                self.delete_cell(old_x, old_y)
 
             organism.local_world_state.x = x
             organism.local_world_state.y = y
@@ -81,12 +299,12 @@ class World:
 
             organism.local_world_state = LocalWorldState(
                 x=x, y=y,
-                local_cells=[None] * n_local_cells,
-                world_metadata=self.config
+                local_cells=[None] * n_local_cells
             )
 
     def add_organism(self, organism: Organism) -> None:
         self.organisms.append(organism)
+        self.population.add(organism)
         x, y = self.find_random_empty_cell()
         self.set_organism_position(organism, x, y)
 
@@ -102,6 +320,14 @@ class World:
     def _add_locals_excluding_diagonals(self, organism: Organism):
         x, y = self.get_organism_position(organism)
         local_cells = organism.local_world_state.local_cells
+        if self.grid is None:
+            get_cell = self.get_cell
+            local_cells[0] = get_cell(x, y - 1) if y > 0 else None
+            local_cells[1] = get_cell(x, y + 1) if y < self.world_height - 1 else None
+            local_cells[2] = get_cell(x - 1, y) if x > 0 else None
+            local_cells[3] = get_cell(x + 1, y) if x < self.world_width - 1 else None
+            return local_cells
+
         local_cells[0] = self.grid[y - 1][x] if y > 0 else None
         local_cells[1] = self.grid[y + 1][x] if y < self.world_height - 1 else None
         local_cells[2] = self.grid[y][x - 1] if x > 0 else None
@@ -117,15 +343,16 @@ class World:
                 if dx == 0 and dy == 0:
                     continue
 
-                i += 1
                 xx = x + dx
                 yy = y + dy
 
-                if xx < 0 or xx >= self.world_width or yy < 0 or yy >= self.world_height:
-                    local_cells[i] = self.grid[yy][xx]
+                if 0 <= xx < self.world_width and 0 <= yy < self.world_height:
+                    local_cells[i] = self.get_cell(xx, yy)
                 else:
                     local_cells[i] = None
 
+                i += 1
+
     def get_new_pos(self, x: int, y: int, dx: int, dy: int):
         new_x = x + dx
         new_y = y + dy
@@ -142,35 +369,253 @@ class World:
 
         return new_x, new_y
 
-    def update_organism(self, organism: Organism) -> None:
-        action = organism.get_action()
-        dx, dy = Action.to_tuple(action)
+    def update_organism(self, organism: Organism, action: Optional[int] = None) -> bool:
+        """
+        Moves the organism according to its brain's action, or `action` if
+        it is given, and returns whether or not it moved.
+        """
+        if action is None:
+            brain_inputs = None
+            if self.sensors is not None:
+                brain_inputs = self.observe(np.array([organism.index]))[0]
+            hidden_state = None
+            if self.recurrent_brains:
+                hidden_state = self.population.hidden[organism.index]
+            action = organism.get_action(brain_inputs, hidden_state)
+
+        if self._random_action_table[action]:
+            dx, dy = random.choice(self._cardinal_moves)
+        else:
+            dx, dy = self._action_table[action]
+
         curr_x, curr_y = self.get_organism_position(organism)
         new_x, new_y = self.get_new_pos(curr_x, curr_y, dx, dy)
         if self.is_cell_occupied(new_x, new_y):
-            return
+            if self.sparse_stepping and not self._random_action_table[action]:
+                # its brain would pick the same blocked move next time
+                self.population.frozen[organism.index] = 1
+            return False
         self.set_organism_position(organism, new_x, new_y)
+        return True
 
-    def reset(self) -> None:
-        self.occupied_cells.clear()
-        for y in range(self.world_height):
-            for x in range(self.world_width):
-                self.grid[y][x] = None
+    def neighbour_mask(self, x: int, y: int) -> int:
+        """
+        Returns the occupied cells around (x, y) as the bits of an integer,
+        in the same order as the cells of an organism's local world state.
+        """
+        mask = 0
+        for i, (dx, dy) in enumerate(self._neighbour_offsets):
+            xx = x + dx
+            yy = y + dy
+            if 0 <= xx < self.world_width and 0 <= yy < self.world_height:
+                cell = self.grid[yy][xx] if self.grid is not None else self.get_cell(xx, yy)
+                if cell is not None:
+                    mask |= 1 << i
+        return mask
+
+    def policy_action(self, organism: Organism) -> int:
+        """
+        Returns the organism's action from its policy table. With the
+        default sensors, a feedforward brain's action only depends on the
+        organism's position and which of its neighbouring cells are
+        occupied, so the brain is only run the first time a genome is in
+        each of these states and the action is stored in an int8 table
+        shared by the organisms with that genome.
+        """
+        x, y = self.get_organism_position(organism)
+        mask = self.neighbour_mask(x, y)
+        if organism.policy_table is None:
+            key = genome_key(organism.genome.genes)
+            organism.policy_table = self._policy_tables_by_genome.get(key)
+            if organism.policy_table is None:
+                organism.policy_table = np.full(self.policy_table_shape, -1, dtype=np.int8)
+                self._policy_tables_by_genome[key] = organism.policy_table
+
+        action = organism.policy_table[y, x, mask]
+        if action < 0:
+            self.update_local_world_state(organism)
+            action = organism.get_action()
+            organism.policy_table[y, x, mask] = action
+        return int(action)
+
+    def _choose_policy_mode(self) -> None:
+        """ Times the last generation in 'auto' mode, and picks a mode after three. """
+        if self._n_updates == 0:
+            return
+
+        self._policy_mode_step_times.append(self._update_time / self._n_updates)
+        self._update_time = 0.
+        self._n_updates = 0
+        if len(self._policy_mode_step_times) < 3:
+            self.use_policy_tables = True
+            return
+
+        brain_time, _, table_time = self._policy_mode_step_times
+        self.use_policy_tables = table_time < brain_time
+        self.policy_tables = self.use_policy_tables
+        print(f'Steps took {1000 * brain_time:.2f} ms with brains and {1000 * table_time:.2f} ms '
+              f'with policy tables, {"using" if self.use_policy_tables else "disabling"} policy tables')
+        if not self.use_policy_tables:
+            for organism in self.organisms:
+                organism.policy_table = None
+
+    def cached(self, key: str, compute, per_step: bool = True):
+        """
+        Returns `compute(self)`, computed at most once per step, or once
+        per generation if `per_step` is False.
+        """
+        cache = self._step_cache if per_step else self._generation_cache
+        if key not in cache:
+            cache[key] = compute(self)
+        return cache[key]
+
+    def observe(self, indices: np.ndarray) -> np.ndarray:
+        """
+        Returns the (len(indices), n_observations) brain inputs computed
+        by the sensors for the organisms at the given population indices.
+        """
+        xs = self.population.positions[indices, 0]
+        ys = self.population.positions[indices, 1]
+        return np.concatenate([sensor.compute(self, xs, ys) for sensor in self.sensors], axis=1)
 
+    def clear_cells(self) -> None:
+        self._step_cache.clear()
+        self._generation_cache.clear()
+        self.occupied_cells.clear()
+        self.occupancy.fill(EMPTY)
+        if self.grid is not None:
+            empty_row = [None] * self.world_width
+            for row in self.grid:
+                row[:] = empty_row
+
+    def reset(self, generation: Optional[int] = None) -> None:
+        # the generation about to run, which world generators may use
+        self.generation = generation
+        if self.policy_tables == 'auto':
+            self._choose_policy_mode()
+
+        self.clear_cells()
         self.world_generator.generate(self)
 
+        self.population.frozen.fill(0)
+        # organisms start every generation without memories
+        self.population.hidden.fill(0.)
+
         random.shuffle(self.organisms)
         for organism in self.organisms:
             x, y = self.find_random_empty_cell()
-            self.set_organism_position(organism, x, y)
+            # the grid has been cleared, so the organism's old cell may
+            # already belong to an organism placed before it
+            self.set_organism_position(organism, x, y, clear_old_cell=False)
 
     def update(self) -> None:
+        if self.step_backend == 'numba':
+            self._update_numba()
+            return
+
+        start = time.perf_counter()
         random.shuffle(self.organisms)
+        self.n_moved = 0
+        self._step_cache.clear()
+        frozen = self.population.frozen
         for organism in self.organisms:
-            self.update_local_world_state(organism)
-            self.update_organism(organism)
+            if self.sparse_stepping and frozen[organism.index]:
+                continue
+
+            if self.use_policy_tables:
+                self.n_moved += self.update_organism(organism, self.policy_action(organism))
+                continue
+
+            if self.sensors is None:
+                self.update_local_world_state(organism)
+            self.n_moved += self.update_organism(organism)
+
+        if self.policy_tables == 'auto':
+            self._update_time += time.perf_counter() - start
+            self._n_updates += 1
+
+    def skip_updates(self, n_steps: int) -> None:
+        """
+        Skips `n_steps` updates of a world in which no organism can move.
+        The organisms are still shuffled for every skipped step, so that
+        the random number stream, and therefore the rest of the run, is
+        the same as if the steps had been simulated.
+        """
+        for _ in range(n_steps):
+            random.shuffle(self.organisms)
+        self.n_moved = 0
+
+    def _update_numba(self) -> None:
+        """
+        Same as the python update, but with the per-organism loop run by
+        a compiled kernel over the population arrays, or by several worker
+        processes with `step_workers` above 1. The moves made by the kernel
+        are then replayed on the grid and organism objects.
+        """
+        from evo.kernels.numba_step import step_kernel
+
+        random.shuffle(self.organisms)
+        self.n_moved = 0
+        if not self.organisms:
+            return
+
+        order = np.array([organism.index for organism in self.organisms], dtype=np.int64)
+        # a recurrent brain's first layer inputs are the observations and then the hidden state
+        layer_dims = np.array(
+            [inp_dim - 1 for inp_dim, _ in Genome.layer_shapes(self.config)]
+            + [Action.num_actions(self.config)],
+            dtype=np.int64
+        )
+        # the kernel divides by the same scales as `Organism.get_brain_inputs`
+        kernel_args = (layer_dims, self.action_deltas, float(self.world_width),
+                       float(self.world_height), bool(self.include_diagonal_cells_in_local_state))
+
+        if self.strip_stepper is not None:
+            moved_indices = self.strip_stepper.step({
+                'occupancy': self.occupancy,
+                'positions': self.population.positions,
+                'genomes': self.population.genomes,
+                'hidden': self.population.hidden,
+            }, order, kernel_args)
+        else:
+            moved_indices = np.empty(len(order), dtype=np.int64)
+            n_moves = step_kernel(self.occupancy, self.population.positions,
+                                  self.population.genomes, order, *kernel_args,
+                                  self.sparse_stepping, self.population.frozen,
+                                  self.population.hidden, moved_indices)
+            moved_indices = moved_indices[:n_moves]
+        self.n_moved = len(moved_indices)
+
+        # the kernel has already updated the occupancy, positions and
+        # frozen flags, so only the grid and organisms are left
+        positions = self.population.positions
+        for index in moved_indices.tolist():
+            organism = self.population.organisms[index]
+            old_x, old_y = self.get_organism_position(organism)
+            new_x, new_y = int(positions[index, 0]), int(positions[index, 1])
+            self.grid[new_y][new_x] = organism
+            self.occupied_cells[(new_x, new_y)] = organism
+            self.grid[old_y][old_x] = None
+            self.occupied_cells.pop((old_x, old_y), None)
+            organism.local_world_state.x = new_x
+            organism.local_world_state.y = new_y
+
+    def kill_organisms(self, organisms: List[Organism]) -> None:
+        """
+        Kills many organisms at once, rebuilding the list of organisms
+        once rather than removing each organism from it in turn.
+        """
+        to_kill = set(organisms)
+        self.organisms = [organism for organism in self.organisms if organism not in to_kill]
+        for organism in organisms:
+            self.population.remove(organism)
+            organism.policy_table = None
+            x, y = self.get_organism_position(organism)
+            self.delete_cell(x, y)
 
     def kill_organism(self, organism: Organism) -> None:
         self.organisms.remove(organism)
+        self.population.remove(organism)
+        organism.policy_table = None
         x, y = self.get_organism_position(organism)
         self.delete_cell(x, y)
@@ -1,9 +1,12 @@
 import random as rn
+import zlib
 
 from evo.world import World
 from evo.world_gen.world_generator import WorldGenerator
 from evo.util.registry import register_world_gen
 
+import numpy as np
+
 
 RockArray = list[list[bool]]
 
@@ -44,10 +47,11 @@ def count_neighbours(array: RockArray, distance: float, x: int, y: int) -> int:
     )
 
 
-def generate_caves(dimensions: int, fillprob: float = .4, r1_cutoff=5, r2_cutoff=2, include_wall=True) -> RockArray:
+def generate_caves(dimensions: int, fillprob: float = .4, r1_cutoff=5, r2_cutoff=2, include_wall=True,
+                   rng=rn) -> RockArray:
 
     rock_map: RockArray = [
-        [rn.random() < fillprob for _ in range(dimensions)]
+        [rng.random() < fillprob for _ in range(dimensions)]
         for _ in range(dimensions)
     ]
 
@@ -74,15 +78,18 @@ def generate_caves(dimensions: int, fillprob: float = .4, r1_cutoff=5, r2_cutoff
     return rock_map
 
 
-class Barrier:
-    pass
-
-
 @register_world_gen('forgiven_caves')
 class ForgivenCavesWorldGen(WorldGenerator):
     """
     Generates a world with procedurally generated "cave"-like barriers.
     Cave generation code written by the user Forgiven on discord.
+
+    The caves returned by `terrain`, which the scale simulation places and
+    `prefetch: True` generates on a worker process during the previous
+    generation, are drawn from their own random number generator, seeded
+    by `seed` and the generation. Without
+    a `seed`, it is derived from the run's experiment directory, so that
+    the runs of a sweep get different caves and resumed runs the same ones.
     """
 
     def __init__(self, global_config: dict, generator_name: str) -> None:
@@ -93,14 +100,33 @@ class ForgivenCavesWorldGen(WorldGenerator):
         self.r1_cutoff = self.config.get('r1_cutoff', 5)
         self.r2_cutoff = self.config.get('r2_cutoff', 2)
         self.include_wall = self.config.get('include_wall', True)
+        self.seed = self.config.get('seed')
+        if self.seed is None:
+            experiment_dir = self.global_config.get('experiment_dir')
+            if experiment_dir is not None:
+                self.seed = zlib.crc32(experiment_dir.encode())
+            else:
+                self.seed = rn.getrandbits(32)
+
+    def terrain(self, generation: int) -> np.ndarray:
+        rng = rn.Random(f'{self.seed}-{generation}')
+        return np.array(generate_caves(self.world_width,
+                                       self.fillprob,
+                                       self.r1_cutoff,
+                                       self.r2_cutoff,
+                                       self.include_wall,
+                                       rng), dtype=bool)
 
     def generate(self, world: World):
+        if self.prefetcher is not None:
+            # the world is generated once before the first generation starts
+            generation = world.generation if world.generation is not None else 0
+            world.add_barriers(self.prefetcher.get(generation))
+            return
+
         rock_map = generate_caves(self.world_width,
                                   self.fillprob,
                                   self.r1_cutoff,
                                   self.r2_cutoff,
                                   self.include_wall)
-        for x in range(self.world_width):
-            for y in range(self.world_height):
-                if rock_map[y][x]:
-                    world.set_cell(x, y, Barrier())
+        world.add_barriers(np.array(rock_map, dtype=bool))
@@ -2,9 +2,16 @@ from evo.world import World
 from evo.world_gen.world_generator import WorldGenerator
 from evo.util.registry import register_world_gen
 
+import numpy as np
+
 
 @register_world_gen('no_gen')
 class NoWorldGen(WorldGenerator):
 
+    static_terrain = True
+
     def generate(self, world: World):
         pass
+
+    def terrain(self, generation: int) -> np.ndarray:
+        return np.zeros((self.global_config['world_height'], self.global_config['world_width']), dtype=bool)
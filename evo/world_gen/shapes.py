@@ -0,0 +1,185 @@
+"""
+Rasterisation of barrier shapes into (height, width) boolean masks.
+
+Shapes are given in proportions of the world's size, like the rectangles
+of `simple_barriers`: x and widths are multiplied by the world's width,
+and y and heights by its height, so that the same config can be used for
+worlds of any size. Each shape only computes the cells inside its bounding
+box, so large worlds cost no more than the shapes drawn in them.
+"""
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+ShapeFunction = Callable[[np.ndarray, dict], None]
+SHAPES: Dict[str, ShapeFunction] = dict()
+
+
+def register_shape(name: str):
+    def decorator(shape_fn: ShapeFunction) -> ShapeFunction:
+        SHAPES[name] = shape_fn
+        return shape_fn
+    return decorator
+
+
+def draw_shapes(mask: np.ndarray, shapes: List[dict]) -> np.ndarray:
+    """
+    Draws each shape into the mask, where a shape is a dictionary with
+    the name of the shape under 'type' and its parameters.
+    """
+    for shape in shapes:
+        assert shape.get('type') in SHAPES, \
+            f'Unknown shape {shape.get("type")}, must be one of {list(SHAPES)}'
+        SHAPES[shape['type']](mask, shape)
+    return mask
+
+
+def _to_cells(mask: np.ndarray, x: float, y: float) -> Tuple[float, float]:
+    height, width = mask.shape
+    return x * width, y * height
+
+
+def _cell_centres(mask: np.ndarray, x0: float, y0: float, x1: float, y1: float):
+    """
+    Returns the slices of the mask covering the box from (x0, y0) to
+    (x1, y1) in cells, and the coordinates of the centres of its cells.
+    """
+    height, width = mask.shape
+    cx0, cy0 = max(int(np.floor(x0)), 0), max(int(np.floor(y0)), 0)
+    cx1, cy1 = min(int(np.ceil(x1)) + 1, width), min(int(np.ceil(y1)) + 1, height)
+    ys, xs = np.mgrid[cy0:max(cy1, cy0), cx0:max(cx1, cx0)]
+    return (slice(cy0, max(cy1, cy0)), slice(cx0, max(cx1, cx0))), xs + 0.5, ys + 0.5
+
+
+@register_shape('rectangle')
+def draw_rectangle(mask: np.ndarray, shape: dict) -> None:
+    """ `x`, `y`, `width` and `height`, at least one cell wide and high. """
+    height, width = mask.shape
+    x, y = int(shape['x'] * width), int(shape['y'] * height)
+    w = max(1, int(shape['width'] * width))
+    h = max(1, int(shape['height'] * height))
+    mask[max(y, 0):y + h, max(x, 0):x + w] = True
+
+
+@register_shape('line')
+def draw_line(mask: np.ndarray, shape: dict) -> None:
+    """ From `start` to `end`, `thickness` cells thick (default 1). """
+    (x0, y0), (x1, y1) = _to_cells(mask, *shape['start']), _to_cells(mask, *shape['end'])
+    radius = shape.get('thickness', 1) / 2
+    box, xs, ys = _cell_centres(mask, min(x0, x1) - radius, min(y0, y1) - radius,
+                                max(x0, x1) + radius, max(y0, y1) + radius)
+    # distance from each cell centre to the closest point of the segment
+    dx, dy = x1 - x0, y1 - y0
+    length_sq = dx * dx + dy * dy
+    t = np.clip(((xs - x0) * dx + (ys - y0) * dy) / length_sq, 0, 1) if length_sq > 0 else 0.
+    distance_sq = (xs - x0 - t * dx) ** 2 + (ys - y0 - t * dy) ** 2
+    # a thin line always covers the cells it passes through
+    mask[box] |= distance_sq <= max(radius, 0.5) ** 2
+
+
+@register_shape('circle')
+def draw_circle(mask: np.ndarray, shape: dict) -> None:
+    """
+    Around `centre` with a `radius` in proportion of the world's width.
+    Filled by default, or only a ring `thickness` cells thick with
+    `filled: False`.
+    """
+    x, y = _to_cells(mask, *shape['centre'])
+    radius = shape['radius'] * mask.shape[1]
+    box, xs, ys = _cell_centres(mask, x - radius, y - radius, x + radius, y + radius)
+    distance = np.hypot(xs - x, ys - y)
+    if shape.get('filled', True):
+        mask[box] |= distance <= radius
+    else:
+        mask[box] |= np.abs(distance - radius) <= max(shape.get('thickness', 1) / 2, 0.5)
+
+
+@register_shape('polygon')
+def draw_polygon(mask: np.ndarray, shape: dict) -> None:
+    """ The inside of the polygon with corners `points`, by the even-odd rule. """
+    points = np.array([_to_cells(mask, x, y) for x, y in shape['points']])
+    box, xs, ys = _cell_centres(mask, *points.min(axis=0), *points.max(axis=0))
+    inside = np.zeros(xs.shape, dtype=bool)
+    for (xa, ya), (xb, yb) in zip(points, np.roll(points, -1, axis=0)):
+        if ya == yb:
+            continue
+        # cells whose row crosses the edge, left of the crossing
+        crosses = (ya > ys) != (yb > ys)
+        crossing_x = xa + (ys - ya) * (xb - xa) / (yb - ya)
+        inside ^= crosses & (xs < crossing_x)
+    mask[box] |= inside
+
+
+@register_shape('maze')
+def draw_maze(mask: np.ndarray, shape: dict) -> None:
+    """
+    A perfect maze, with a single path between any two of its corridors,
+    filling the rectangle `x`, `y`, `width`, `height` (by default the whole
+    world) with walls and corridors `corridor_width` cells wide (default 1).
+    The maze is drawn by a random depth-first search seeded by `seed`.
+    """
+    height, width = mask.shape
+    x, y = int(shape.get('x', 0) * width), int(shape.get('y', 0) * height)
+    w, h = int(shape.get('width', 1) * width), int(shape.get('height', 1) * height)
+    size = max(1, int(shape.get('corridor_width', 1)))
+    # the maze is a grid of blocks, with corridors in the blocks at odd
+    # coordinates and walls or passages in the blocks between them
+    rows, cols = h // size, w // size
+    rows, cols = rows - (rows % 2 == 0), cols - (cols % 2 == 0)
+    if rows < 3 or cols < 3:
+        return
+
+    rng = np.random.default_rng(shape.get('seed', 0))
+    walls = np.ones((rows, cols), dtype=bool)
+    n_rows, n_cols = rows // 2, cols // 2
+    visited = np.zeros((n_rows, n_cols), dtype=bool)
+    start = (int(rng.integers(n_rows)), int(rng.integers(n_cols)))
+    visited[start] = True
+    walls[2 * start[0] + 1, 2 * start[1] + 1] = False
+    stack = [start]
+    while stack:
+        r, c = stack[-1]
+        neighbours = [(r + dr, c + dc) for dr, dc in [(-1, 0), (1, 0), (0, -1), (0, 1)]
+                      if 0 <= r + dr < n_rows and 0 <= c + dc < n_cols and not visited[r + dr, c + dc]]
+        if not neighbours:
+            stack.pop()
+            continue
+        nr, nc = neighbours[rng.integers(len(neighbours))]
+        visited[nr, nc] = True
+        # open the next corridor and the wall between the two
+        walls[2 * nr + 1, 2 * nc + 1] = False
+        walls[r + nr + 1, c + nc + 1] = False
+        stack.append((nr, nc))
+
+    blocks = np.repeat(np.repeat(walls, size, axis=0), size, axis=1)
+    region = mask[y:y + blocks.shape[0], x:x + blocks.shape[1]]
+    region |= blocks[:region.shape[0], :region.shape[1]]
+
+
+@register_shape('image')
+def draw_image(mask: np.ndarray, shape: dict) -> None:
+    """
+    Barriers where the image at `path` (such as a PNG) is darker than
+    `threshold` (default 128 out of 255), or lighter with `invert: True`.
+    The image is stretched over the whole world.
+    """
+    import imageio.v2 as imageio
+
+    image = np.asarray(imageio.imread(shape['path']), dtype=np.float64)
+    if image.ndim == 3:
+        # brightness of the colour channels, ignoring any alpha channel
+        image = image[..., :3].mean(axis=-1)
+    if image.max() <= 1:
+        image = image * 255
+    height, width = mask.shape
+    rows = np.arange(height) * image.shape[0] // height
+    cols = np.arange(width) * image.shape[1] // width
+    dark = image[rows[:, None], cols[None, :]] < shape.get('threshold', 128)
+    mask |= ~dark if shape.get('invert', False) else dark
+
+
+def rectangles_to_shapes(rectangles: Sequence[Sequence[float]]) -> List[dict]:
+    """ Converts `simple_barriers` rectangles (x, y, width, height) to shapes. """
+    return [{'type': 'rectangle', 'x': x, 'y': y, 'width': w, 'height': h}
+            for x, y, w, h in rectangles]
@@ -1,10 +1,9 @@
 from evo.world import World
+from evo.world_gen.shapes import SHAPES, draw_shapes, rectangles_to_shapes
 from evo.world_gen.world_generator import WorldGenerator
 from evo.util.registry import register_world_gen
 
-
-class Barrier:
-    pass
+import numpy as np
 
 
 @register_world_gen('simple_barriers')
@@ -17,20 +16,35 @@ class SimpleBarriersWorldGen(WorldGenerator):
     the world size, so for example a barrier at (0.5, 0.5, 0.1, 0.1) would be
     a square in the middle of the world (assuming the world is a square).
 
+    Other shapes are given in the `shapes` list, as dictionaries with the
+    name of the shape under `type` and its parameters, see `evo.world_gen.shapes`:
+    lines, circles, polygons, mazes and images. Everything is drawn once
+    into a mask of barriers, which is placed in the world every generation.
     """
 
+    static_terrain = True
+
     def __init__(self, global_config: dict, generator_name: str) -> None:
         super().__init__(global_config, generator_name)
         self.world_width = self.global_config.get('world_width')
         self.world_height = self.global_config.get('world_height')
-        self.barriers = [
-            (int(x * self.world_width), int(y * self.world_height),
-             max(1, int(w * self.world_width)), max(1, int(h * self.world_height)))
-            for x, y, w, h in self.config.get('barriers')
-        ]
+        self.shapes = rectangles_to_shapes(self.config.get('barriers', [])) \
+            + list(self.config.get('shapes', []))
+        for shape in self.shapes:
+            assert shape.get('type') in SHAPES, \
+                f'Unknown shape {shape.get("type")}, must be one of {list(SHAPES)}'
+        self._mask = None
+
+    @property
+    def mask(self) -> np.ndarray:
+        if self._mask is None:
+            mask = np.zeros((self.world_height, self.world_width), dtype=bool)
+            self._mask = draw_shapes(mask, self.shapes)
+            self._mask.setflags(write=False)
+        return self._mask
+
+    def terrain(self, generation: int) -> np.ndarray:
+        return self.mask
 
     def generate(self, world: World):
-        for x, y, w, h in self.barriers:
-            for i in range(x, x + w):
-                for j in range(y, y + h):
-                    world.set_cell(i, j, Barrier())
+        world.add_barriers(self.mask)
@@ -1,15 +1,104 @@
+from evo.config import ConfigError
 from evo.world import World
 
 from abc import ABC, abstractmethod
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, Optional
+import signal
+
+import numpy as np
 
 
 class WorldGenerator(ABC):
 
+    # generators that place the same terrain every generation have nothing to prefetch
+    static_terrain = False
+
     def __init__(self, global_config: dict, generator_name: str) -> None:
         self.global_config = global_config
         self.config = global_config.get('world_gen', dict())
         self.generator_name = generator_name
 
+        # terrain generated ahead of time on a worker process, see `TerrainPrefetcher`
+        self.prefetcher: Optional[TerrainPrefetcher] = None
+        if self.config.get('prefetch', False):
+            if not self.implements_terrain():
+                raise ConfigError(f'world_gen.prefetch needs a world generator that implements terrain, '
+                                  f'which {generator_name} does not')
+            if self.static_terrain:
+                print(f'The {generator_name} world generator places the same terrain every generation, '
+                      f'ignoring world_gen.prefetch')
+            else:
+                self.prefetcher = TerrainPrefetcher(self)
+
+    @classmethod
+    def implements_terrain(cls) -> bool:
+        return cls.terrain is not WorldGenerator.terrain
+
     @abstractmethod
     def generate(self, world: World):
         pass
+
+    def terrain(self, generation: int) -> np.ndarray:
+        """
+        Returns the (height, width) mask of the barriers of a generation.
+        Generators that can draw their terrain without looking at the world
+        or the simulation's random number generators implement this, so
+        that the terrain can be prefetched with `world_gen.prefetch`.
+        """
+        raise NotImplementedError(f'{type(self).__name__} does not support prefetching terrain')
+
+    def __getstate__(self) -> dict:
+        # the worker that prefetches terrain gets a copy of the generator
+        state = self.__dict__.copy()
+        state['prefetcher'] = None
+        return state
+
+
+_PREFETCH_GENERATOR: Optional[WorldGenerator] = None
+
+
+def _start_prefetch_worker(generator: WorldGenerator) -> None:
+    global _PREFETCH_GENERATOR
+    # forked workers inherit pygame's SIGTERM handler, which would stop
+    # them from being terminated when the main process exits
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    _PREFETCH_GENERATOR = generator
+
+
+def _prefetch_terrain(generation: int) -> np.ndarray:
+    return _PREFETCH_GENERATOR.terrain(generation)
+
+
+class TerrainPrefetcher:
+    """
+    Generates the terrain of the next generation on a worker process
+    while the current generation is simulated. This only works for
+    generators whose terrain does not depend on the state of the world,
+    which draw it with `WorldGenerator.terrain` from a random number
+    generator seeded by the generation.
+    """
+
+    def __init__(self, generator: WorldGenerator) -> None:
+        self.executor = ProcessPoolExecutor(1, mp_context=get_context(),
+                                            initializer=_start_prefetch_worker,
+                                            initargs=(generator,))
+        self.pending: Dict[int, Future] = dict()
+        self.last_generation: Optional[int] = None
+        self.last_terrain: Optional[np.ndarray] = None
+
+    def get(self, generation: int) -> np.ndarray:
+        """ Returns the terrain of a generation, and starts generating the next. """
+        if generation == self.last_generation:
+            return self.last_terrain
+
+        future = self.pending.pop(generation, None)
+        if future is None:
+            future = self.executor.submit(_prefetch_terrain, generation)
+        # terrain that was prefetched for generations that were skipped
+        self.pending.clear()
+        self.pending[generation + 1] = self.executor.submit(_prefetch_terrain, generation + 1)
+        self.last_generation = generation
+        self.last_terrain = future.result()
+        return self.last_terrain
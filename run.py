@@ -1,20 +1,27 @@
-from evo.runner import ExperimentRunner, load_config
+from evo.runner import ExperimentRunner, load_config, load_run_config
 
 import argparse
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('experiment', type=str, default='default_config',
+    parser.add_argument('experiment', type=str, nargs='?', default='default_config',
                         help='Name of the experiment YAML in the experiments/configs directory')
     parser.add_argument('--test', action='store_true', default=False,
                         help='Run the experiment in test mode')
+    parser.add_argument('--resume', type=str, default=None,
+                        help='Directory of a previous run to resume from its latest checkpoint')
     args = parser.parse_args()
 
-    config = load_config(args.experiment, test=args.test)
-    config['experiment_name'] = args.experiment
+    if args.resume is not None:
+        config = load_run_config(args.resume)
+        config = config.replace(experiment_dir=args.resume.rstrip('/'))
+        runner = ExperimentRunner(config, resume=True)
+    else:
+        config = load_config(args.experiment, test=args.test)
+        config = config.replace(experiment_name=args.experiment)
+        runner = ExperimentRunner(config, test=args.test)
 
-    runner = ExperimentRunner(config, test=args.test)
     runner.run()
 
 
@@ -0,0 +1,332 @@
+"""
+Benchmarks for the simulation.
+
+Usage:
+    PYTHONPATH=. python scripts/benchmark.py batched rs_v1_small_world --n-worlds 32
+    PYTHONPATH=. python scripts/benchmark.py batched rs_v1_small_world --sensors position neighbour_types density
+    PYTHONPATH=. python scripts/benchmark.py strips --size 2000 --n-organisms 400000 --workers 1 2 4 8
+    PYTHONPATH=. python scripts/benchmark.py policy rs_v1_one_barrier --generations 10
+    PYTHONPATH=. python scripts/benchmark.py memory rs_v1_one_barrier --n-organisms 100000
+    PYTHONPATH=. python scripts/benchmark.py transport rs_v1_one_barrier --n-organisms 100000 --workers 4
+    PYTHONPATH=. python scripts/benchmark.py prefetch random_caves --generations 10
+    PYTHONPATH=. python scripts/benchmark.py scale rs_v1_scale --n-organisms 10000 100000 1000000
+"""
+from evo.batched_simulation import BatchedEvolutionSimulation
+from evo.organism import Organism
+from evo.simulation import EvolutionSimulation
+from evo.runner import load_config
+from evo.scale_simulation import ScaleEvolutionSimulation
+from evo.util.registry import get_world_generator
+from evo.util.shared_arrays import attach_arrays, share_world
+from evo.world import World
+
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import gc
+import multiprocessing
+import pickle
+import random
+import resource
+import time
+import tracemalloc
+
+import numpy as np
+
+
+def benchmark_batched(args):
+    """
+    Compares running `n_worlds` copies of an experiment one after the
+    other with `EvolutionSimulation` against running them in lockstep
+    with `BatchedEvolutionSimulation`, optionally with other sensors.
+    """
+    config = load_config(args.experiment).replace(brain_cache=args.brain_cache)
+    if args.sensors is not None:
+        config = config.replace(sensors=args.sensors)
+    organism_steps = args.n_worlds * args.generations * \
+        config['world_steps_per_generation'] * config['pop_size']
+
+    simulations = [EvolutionSimulation(config) for _ in range(args.n_worlds)]
+    start = time.perf_counter()
+    for generation in range(args.generations):
+        for simulation in simulations:
+            simulation.run_generation(generation)
+    serial_rate = organism_steps / (time.perf_counter() - start)
+
+    batched = BatchedEvolutionSimulation(config, args.n_worlds, seed=args.seed)
+    start = time.perf_counter()
+    for generation in range(args.generations):
+        batched.run_generation(generation)
+    batched_rate = organism_steps / (time.perf_counter() - start)
+
+    print(f'serial:  {serial_rate:,.0f} organism-steps/sec ({1e6 / serial_rate:.1f} us per organism-step)')
+    print(f'batched: {batched_rate:,.0f} organism-steps/sec ({1e6 / batched_rate:.1f} us per organism-step)')
+    print(f'speed-up: {batched_rate / serial_rate:.1f}x')
+
+
+def scatter_organisms(world: World, n_organisms: int) -> None:
+    """
+    Places random organisms in random empty cells, without the scan over
+    every cell done by `World.find_random_empty_cell`.
+    """
+    for _ in range(n_organisms):
+        organism = Organism.random_organism(world.config)
+        world.organisms.append(organism)
+        world.population.add(organism)
+        x, y = random.randrange(world.world_width), random.randrange(world.world_height)
+        while world.is_cell_occupied(x, y):
+            x, y = random.randrange(world.world_width), random.randrange(world.world_height)
+        world.set_organism_position(organism, x, y)
+
+
+def benchmark_strips(args):
+    """
+    Measures the step throughput of one large world with the numba
+    backend split over different numbers of worker processes.
+    """
+    config = load_config(args.experiment).replace(
+        world_width=args.size, world_height=args.size, step_backend='numba', sparse_stepping=False)
+
+    rates = dict()
+    for n_workers in args.workers:
+        random.seed(args.seed)
+        np.random.seed(args.seed)
+        world = World(config.replace(step_workers=n_workers), get_world_generator(config))
+        assert world.step_backend == 'numba', 'The strips benchmark needs numba'
+        scatter_organisms(world, args.n_organisms)
+
+        world.update()  # compile the kernel
+        start = time.perf_counter()
+        for _ in range(args.steps):
+            world.update()
+        rates[n_workers] = args.n_organisms * args.steps / (time.perf_counter() - start)
+        if world.strip_stepper is not None:
+            world.strip_stepper.close()
+
+        print(f'{n_workers} workers: {rates[n_workers]:,.0f} organism-steps/sec '
+              f'({rates[n_workers] / rates[args.workers[0]]:.2f}x)')
+
+
+def benchmark_policy_tables(args):
+    """
+    Compares the step time of the python backend with and without
+    policy tables over the same seeded generations.
+    """
+    config = load_config(args.experiment)
+    step_times = dict()
+    for policy_tables in [False, True]:
+        random.seed(args.seed)
+        np.random.seed(args.seed)
+        simulation = EvolutionSimulation(config.replace(step_backend='python', policy_tables=policy_tables))
+        step_time = 0.
+        for generation in range(args.generations):
+            simulation.world.reset()
+            start = time.perf_counter()
+            for _ in range(simulation.steps_per_generation):
+                simulation.world.update()
+            step_time += time.perf_counter() - start
+            simulation.selection(simulation.world)
+            simulation.repopulate(simulation.world)
+        step_times[policy_tables] = step_time / (args.generations * simulation.steps_per_generation)
+
+    print(f'brains:         {1000 * step_times[False]:.2f} ms/step')
+    print(f'policy tables:  {1000 * step_times[True]:.2f} ms/step')
+    print(f'speed-up: {step_times[False] / step_times[True]:.2f}x')
+
+
+def benchmark_memory(args):
+    """
+    Measures the memory used by each organism in a world, and the time
+    and objects allocated to breed a population of the same size.
+    """
+    config = load_config(args.experiment).replace(
+        world_width=args.size, world_height=args.size, step_backend='python')
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+
+    gc.collect()
+    n_objects = len(gc.get_objects())
+    tracemalloc.start()
+    world = World(config, get_world_generator(config))
+    world_nbytes = tracemalloc.get_traced_memory()[0]
+    scatter_organisms(world, args.n_organisms)
+    organisms_nbytes = tracemalloc.get_traced_memory()[0] - world_nbytes
+    tracemalloc.stop()
+    n_objects = len(gc.get_objects()) - n_objects
+
+    population = world.population
+    arrays_nbytes = population.positions.nbytes + population.genomes.nbytes \
+        + population.frozen.nbytes + population.hidden.nbytes
+    print(f'{organisms_nbytes / args.n_organisms:,.0f} bytes/organism, '
+          f'of which {arrays_nbytes / args.n_organisms:,.0f} in the population arrays')
+    print(f'{n_objects / args.n_organisms:.1f} objects tracked by the garbage collector per organism')
+
+    parents = world.organisms
+    start = time.perf_counter()
+    children = [random.choice(parents).reproduce(random.choice(parents)) for _ in range(args.n_organisms)]
+    print(f'breeding: {len(children) / (time.perf_counter() - start):,.0f} organisms/sec')
+
+
+def _gene_means_of_genomes(genomes: list) -> np.ndarray:
+    return np.array([genome.genes.mean() for genome in genomes])
+
+
+def _gene_means_of_shared(task: tuple) -> np.ndarray:
+    descriptor, start, stop = task
+    with attach_arrays(descriptor) as arrays:
+        return arrays['genomes'][start:stop].mean(axis=1)
+
+
+def benchmark_transport(args):
+    """
+    Compares sending a population to worker processes by pickling its
+    genomes against sharing the genome matrix through shared memory.
+    """
+    config = load_config(args.experiment).replace(
+        world_width=args.size, world_height=args.size, step_backend='python')
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    world = World(config, get_world_generator(config))
+    scatter_organisms(world, args.n_organisms)
+
+    bounds = np.linspace(0, args.n_organisms, args.workers + 1).astype(int)
+    with multiprocessing.get_context().Pool(args.workers) as pool:
+        genomes = [organism.genome for organism in world.population.organisms]
+        start = time.perf_counter()
+        chunks = [genomes[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+        pickled = np.concatenate(pool.map(_gene_means_of_genomes, chunks))
+        pickle_time = time.perf_counter() - start
+        pickle_nbytes = sum(len(pickle.dumps(chunk)) for chunk in chunks)
+
+        start = time.perf_counter()
+        shared = share_world(world)
+        tasks = [(shared.descriptor, a, b) for a, b in zip(bounds[:-1], bounds[1:])]
+        from_shared = np.concatenate(pool.map(_gene_means_of_shared, tasks))
+        shared_time = time.perf_counter() - start
+        descriptor_nbytes = sum(len(pickle.dumps(task)) for task in tasks)
+        shared_nbytes = shared.nbytes
+        shared.close()
+
+    assert np.allclose(pickled, from_shared)
+    print(f'pickled genomes: {1000 * pickle_time:.1f} ms, {pickle_nbytes / 2 ** 20:.1f} MB sent')
+    print(f'shared memory:   {1000 * shared_time:.1f} ms, {descriptor_nbytes / 2 ** 10:.1f} KB sent, '
+          f'{shared_nbytes / 2 ** 20:.1f} MB shared')
+
+
+def benchmark_prefetch(args):
+    """
+    Compares the time per generation with the terrain generated at the
+    start of each generation against prefetching it on a worker process.
+    """
+    config = load_config(args.experiment)
+    times = dict()
+    for prefetch in [False, True]:
+        random.seed(args.seed)
+        np.random.seed(args.seed)
+        simulation = EvolutionSimulation(config.replace(world_gen=dict(config['world_gen'], prefetch=prefetch)))
+        simulation.run_generation(0)  # start the worker
+        start = time.perf_counter()
+        for generation in range(1, args.generations + 1):
+            simulation.run_generation(generation)
+        times[prefetch] = (time.perf_counter() - start) / args.generations
+
+    print(f'generated: {times[False]:.3f} s/generation')
+    print(f'prefetched: {times[True]:.3f} s/generation')
+    print(f'speed-up: {times[False] / times[True]:.2f}x')
+
+
+def _run_scale(config, generations: int) -> tuple:
+    # peak resident memory in kilobytes, before the simulation is created,
+    # which is at least that of the process it was forked from
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    simulation = ScaleEvolutionSimulation(config)
+    start = time.perf_counter()
+    for generation in range(generations):
+        simulation.run_generation(generation)
+    rate = simulation.organism_steps / (time.perf_counter() - start)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rate, (peak - baseline) * 1024, sum(simulation.memory_estimate.values())
+
+
+def benchmark_scale(args):
+    """
+    Measures the organism-steps per second and the peak memory of the
+    scale simulation for each population size, each in a fresh process.
+    """
+    config = load_config(args.experiment).replace(
+        world_width=args.size, world_height=args.size, world_steps_per_generation=args.steps,
+        callbacks={}, scale=dict(load_config(args.experiment).get('scale', dict()),
+                                 weight_dtype=args.weight_dtype, seed=args.seed))
+    for n_organisms in args.n_organisms:
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context()) as executor:
+            rate, peak, estimate = executor.submit(_run_scale, config.replace(pop_size=n_organisms),
+                                                   args.generations).result()
+        print(f'{n_organisms:>9,} organisms: {rate:,.0f} organism-steps/sec, '
+              f'peak memory {peak / 2 ** 20:,.0f} MB (estimated {estimate / 2 ** 20:,.0f} MB)')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    batched_parser = subparsers.add_parser('batched', help=benchmark_batched.__doc__)
+    batched_parser.add_argument('experiment', type=str, nargs='?', default='rs_v1_small_world')
+    batched_parser.add_argument('--n-worlds', type=int, default=32)
+    batched_parser.add_argument('--generations', type=int, default=2)
+    batched_parser.add_argument('--seed', type=int, default=0)
+    batched_parser.add_argument('--brain-cache', action='store_true',
+                                help='Share brains between organisms with identical genomes')
+    batched_parser.add_argument('--sensors', type=str, nargs='+', default=None)
+    batched_parser.set_defaults(run=benchmark_batched)
+
+    strips_parser = subparsers.add_parser('strips', help=benchmark_strips.__doc__)
+    strips_parser.add_argument('experiment', type=str, nargs='?', default='rs_v1_one_barrier')
+    strips_parser.add_argument('--size', type=int, default=2000)
+    strips_parser.add_argument('--n-organisms', type=int, default=400000)
+    strips_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    strips_parser.add_argument('--steps', type=int, default=10)
+    strips_parser.add_argument('--seed', type=int, default=0)
+    strips_parser.set_defaults(run=benchmark_strips)
+
+    policy_parser = subparsers.add_parser('policy', help=benchmark_policy_tables.__doc__)
+    policy_parser.add_argument('experiment', type=str, nargs='?', default='rs_v1_small_world')
+    policy_parser.add_argument('--generations', type=int, default=10)
+    policy_parser.add_argument('--seed', type=int, default=0)
+    policy_parser.set_defaults(run=benchmark_policy_tables)
+
+    memory_parser = subparsers.add_parser('memory', help=benchmark_memory.__doc__)
+    memory_parser.add_argument('experiment', type=str, nargs='?', default='rs_v1_one_barrier')
+    memory_parser.add_argument('--size', type=int, default=1000)
+    memory_parser.add_argument('--n-organisms', type=int, default=100000)
+    memory_parser.add_argument('--seed', type=int, default=0)
+    memory_parser.set_defaults(run=benchmark_memory)
+
+    transport_parser = subparsers.add_parser('transport', help=benchmark_transport.__doc__)
+    transport_parser.add_argument('experiment', type=str, nargs='?', default='rs_v1_one_barrier')
+    transport_parser.add_argument('--size', type=int, default=1000)
+    transport_parser.add_argument('--n-organisms', type=int, default=100000)
+    transport_parser.add_argument('--workers', type=int, default=4)
+    transport_parser.add_argument('--seed', type=int, default=0)
+    transport_parser.set_defaults(run=benchmark_transport)
+
+    prefetch_parser = subparsers.add_parser('prefetch', help=benchmark_prefetch.__doc__)
+    prefetch_parser.add_argument('experiment', type=str, nargs='?', default='random_caves')
+    prefetch_parser.add_argument('--generations', type=int, default=10)
+    prefetch_parser.add_argument('--seed', type=int, default=0)
+    prefetch_parser.set_defaults(run=benchmark_prefetch)
+
+    scale_parser = subparsers.add_parser('scale', help=benchmark_scale.__doc__)
+    scale_parser.add_argument('experiment', type=str, nargs='?', default='rs_v1_scale')
+    scale_parser.add_argument('--size', type=int, default=2000)
+    scale_parser.add_argument('--n-organisms', type=int, nargs='+', default=[10000, 100000, 1000000])
+    scale_parser.add_argument('--weight-dtype', type=str, default='float16')
+    scale_parser.add_argument('--steps', type=int, default=10)
+    scale_parser.add_argument('--generations', type=int, default=2)
+    scale_parser.add_argument('--seed', type=int, default=0)
+    scale_parser.set_defaults(run=benchmark_scale)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Checks that a step backend reproduces the python step backend exactly:
+both simulations are seeded identically and every organism must be in the
+same cell after every step of every generation.
+
+Usage:
+    PYTHONPATH=. python scripts/check_step_backends.py rs_v1_one_barrier --generations 3
+    PYTHONPATH=. python scripts/check_step_backends.py rs_v1_one_barrier --candidate python --sparse
+    PYTHONPATH=. python scripts/check_step_backends.py rs_v1_one_barrier --brain-type recurrent
+"""
+from evo.simulation import EvolutionSimulation
+from evo.runner import load_config
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+
+def organism_positions(simulation: EvolutionSimulation) -> np.ndarray:
+    return np.array([
+        simulation.world.get_organism_position(organism)
+        for organism in simulation.world.organisms
+    ])
+
+
+def make_simulation(config: dict, seed: int, **overrides) -> EvolutionSimulation:
+    random.seed(seed)
+    np.random.seed(seed)
+    return EvolutionSimulation(config.replace(**overrides))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('experiment', type=str, nargs='?', default='default_config',
+                        help='Name of the experiment YAML in the experiments/configs directory')
+    parser.add_argument('--generations', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--candidate', type=str, default='numba',
+                        help='Step backend to compare against the python backend')
+    parser.add_argument('--sparse', action='store_true', default=False,
+                        help='Use sparse stepping for the candidate')
+    parser.add_argument('--brain-type', type=str, default=None,
+                        help='Override the brain_type of the experiment')
+    args = parser.parse_args()
+
+    config = load_config(args.experiment)
+    if args.brain_type is not None:
+        config = config.replace(brain_type=args.brain_type)
+    simulations = {
+        'reference': make_simulation(config, args.seed, step_backend='python', sparse_stepping=False),
+        'candidate': make_simulation(config, args.seed, step_backend=args.candidate,
+                                     sparse_stepping=args.sparse),
+    }
+    assert simulations['candidate'].world.step_backend == args.candidate, \
+        f'{args.candidate} backend is not available'
+
+    timings = {backend: 0. for backend in simulations}
+    rng_states = {backend: random.getstate() for backend in simulations}
+
+    for generation in range(args.generations):
+        for backend, simulation in simulations.items():
+            random.setstate(rng_states[backend])
+            simulation.world.reset()
+            rng_states[backend] = random.getstate()
+
+        for step in range(simulations['reference'].steps_per_generation):
+            for backend, simulation in simulations.items():
+                random.setstate(rng_states[backend])
+                start = time.perf_counter()
+                simulation.world.update()
+                timings[backend] += time.perf_counter() - start
+                rng_states[backend] = random.getstate()
+
+            assert np.array_equal(organism_positions(simulations['reference']),
+                                  organism_positions(simulations['candidate'])), \
+                f'Backends diverged at generation {generation}, step {step}'
+
+        for backend, simulation in simulations.items():
+            random.setstate(rng_states[backend])
+            simulation.selection(simulation.world)
+            simulation.repopulate(simulation.world)
+            rng_states[backend] = random.getstate()
+
+        print(f'Generation {generation}: simulations match')
+
+    for backend, seconds in timings.items():
+        print(f'{backend}: {seconds:.3f}s stepping')
+
+
+if __name__ == '__main__':
+    main()
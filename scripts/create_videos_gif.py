@@ -1,85 +1,268 @@
-import cv2
-import numpy as np
-import matplotlib.pyplot as plt
+"""
+Composites the videos saved by the `render_video` callback of a run into a
+single GIF (or mp4), tiled side by side and labelled by generation.
+
+Usage:
+    PYTHONPATH=. python scripts/create_videos_gif.py experiments/runs/<experiment>/<run> \
+        --generations 0 20 100 300 580 --output assets/barrier_evolution.gif
+    PYTHONPATH=. python scripts/create_videos_gif.py experiments/runs/<experiment>/<run> \
+        --every 10 --columns 10 --tile-size 128 --output comparison.mp4
+
+The videos are decoded by a pool of workers. ffmpeg scales the frames of
+each video to the size of a tile as it decodes them, and the worker writes
+them, under a label, straight into the composite frames held in shared
+memory. The composite frames are built in windows that fit in
+`--max-memory`, each handed to the encoder one frame at a time before the
+next window is decoded, so runs with hundreds of videos can be composited
+in a grid. GIFs are only written once all their (paletted) frames have
+been encoded, so they must fit in `--max-memory` too.
+"""
+from evo.util.shared_arrays import SharedArrays, SharedArraysDescriptor, attach_arrays
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 from pathlib import Path
+from typing import Dict, List, NamedTuple, Tuple
+import argparse
+import logging
+import math
+import os
 import re
-from typing import List
+import time
+
 import imageio
+import imageio_ffmpeg
+import numpy as np
+from PIL import Image
+
+
+BACKGROUND = 255
+LABEL_COLOUR = (0, 0, 0)
+
+# imageio-ffmpeg warns about every video that ffmpeg scales as it reads it
+logging.getLogger('imageio_ffmpeg').setLevel(logging.ERROR)
+
+
+def get_generation(video: Path) -> int:
+    generation = video.stem.split('_')[1]
+    return int(re.sub(r'\D', '', generation))
+
+
+def find_videos(run_dir: str) -> Dict[int, Path]:
+    videos_dir = Path(run_dir) / 'videos'
+    videos = {get_generation(video): video for video in videos_dir.glob('*.mp4')}
+    assert videos, f'No videos found in {videos_dir}'
+    return dict(sorted(videos.items()))
+
+
+def select_generations(videos: Dict[int, Path], args) -> List[int]:
+    if args.generations is None:
+        return list(videos)[::args.every]
+    missing = [generation for generation in args.generations if generation not in videos]
+    assert not missing, f'No videos for generations {missing}, found {list(videos)}'
+    return args.generations
+
+
+class Tile(NamedTuple):
+    """ Where a video goes in the composite frames, and what it is labelled. """
+    video: str
+    label: str
+    top: int
+    left: int
 
 
-def save_video(frames: List[np.ndarray],
-               file_path: str = 'video',
-               format='mp4',
-               fps: int = 30) -> str:
+class Layout(NamedTuple):
+    tile_width: int
+    tile_height: int
+    label_height: int
+    n_frames: int
+    frame_step: int
+
+
+def render_label(text: str, width: int, height: int) -> np.ndarray:
+    """ Returns a (height, width, 3) strip with the text centred on it. """
+    import pygame
+    pygame.font.init()
+    font = pygame.font.Font(None, max(int(height * 0.9), 8))
+    surface = font.render(text, True, LABEL_COLOUR, (BACKGROUND,) * 3)
+    # surfarray indexes pixels by (x, y)
+    text_pixels = np.swapaxes(pygame.surfarray.array3d(surface), 0, 1)[:height, :width]
+    strip = np.full((height, width, 3), BACKGROUND, dtype=np.uint8)
+    top = (height - text_pixels.shape[0]) // 2
+    left = (width - text_pixels.shape[1]) // 2
+    strip[top:top + text_pixels.shape[0], left:left + text_pixels.shape[1]] = text_pixels
+    return strip
+
+
+def read_frames(video: str, layout: Layout, start: int, count: int):
+    """
+    Yields up to `count` of the frames of a video used in the tiles, from
+    the `start`-th one, scaled to the tile size by ffmpeg.
     """
-    Saves a video of the policy being evaluating in an environment.
+    scale = f'scale={layout.tile_width}:{layout.tile_height}:flags=neighbor'
+    if layout.frame_step > 1 or start > 0:
+        first = start * layout.frame_step
+        scale = f'select=not(mod(n\\,{layout.frame_step}))*gte(n\\,{first}),{scale}'
+    frames = imageio_ffmpeg.read_frames(video, output_params=[
+        '-vf', scale, '-vsync', '0', '-frames:v', str(count)])
+    size = next(frames)['size']
+    assert size == (layout.tile_width, layout.tile_height), f'{video} was read at {size}'
+    for frame in frames:
+        yield np.frombuffer(frame, dtype=np.uint8).reshape(layout.tile_height, layout.tile_width, 3)
 
-    Args:
-        frames (List[np.ndarray]): The frames of the video.
-        file_path (str): The path of the file to save the video to.
-        fps (int): The frames per second of the video.
 
-    Returns:
-        str: The path to the saved video.
+def draw_tile(tile: Tile, layout: Layout, start: int, count: int, descriptor: SharedArraysDescriptor) -> int:
     """
-    if not file_path.endswith(f'.{format}'):
-        file_path = file_path + f'.{format}'
+    Decodes the frames of a video from the `start`-th one into its tile of
+    the first `count` composite frames of a window. Videos shorter than the
+    others hold their last frame. Returns the number of frames read.
+    """
+    with attach_arrays(descriptor) as arrays:
+        frames = arrays['frames']
+        label_bottom = tile.top + layout.label_height
+        right = tile.left + layout.tile_width
+        if start == 0 and layout.label_height > 0:
+            # the labels stay in the frames from one window to the next
+            frames[:, tile.top:label_bottom, tile.left:right] = \
+                render_label(tile.label, layout.tile_width, layout.label_height)
 
-    imageio.mimwrite(file_path, frames, fps=fps)
+        region = frames[:, label_bottom:label_bottom + layout.tile_height, tile.left:right]
+        n_read = 0
+        for frame in read_frames(tile.video, layout, start, count):
+            region[n_read] = frame
+            n_read += 1
+        if 0 < n_read < len(region):
+            region[n_read:] = region[n_read - 1]
+        elif n_read == 0 and start > 0:
+            # the video ended in an earlier window, whose last frame holds its last frame
+            region[:] = region[-1]
+        return n_read
 
-    return file_path
 
+def frame_size(video: Path) -> Tuple[int, int]:
+    frames = imageio_ffmpeg.read_frames(str(video))
+    size = next(frames)['size']
+    frames.close()
+    return size
 
-def read_video_cv2(file, n_frames=1000):
-    cap = cv2.VideoCapture(file)
-    all = []
-    i = 0
-    while cap.isOpened() and i < n_frames:
-        ret, frame = cap.read()
-        arr = np.array(frame)
-        all.append(arr)
-        i += 1
-    return np.array(all)
 
+def composite_frames(tiles: List[Tile], layout: Layout, window: int,
+                     shared: SharedArrays, executor: ProcessPoolExecutor):
+    """
+    Yields the composite frames, decoding `window` frames of every video at
+    a time into the same frames in shared memory. Each frame is only valid
+    until the next one is requested.
+    """
+    frames = shared['frames']
+    for start in range(0, layout.n_frames, window):
+        count = min(window, layout.n_frames - start)
+        n_read = list(executor.map(draw_tile, tiles, [layout] * len(tiles), [start] * len(tiles),
+                                   [count] * len(tiles), [shared.descriptor] * len(tiles)))
+        # the longest video sets the length of the output
+        yield from frames[:max(n_read)]
+        if max(n_read) < count:
+            return
 
-# videos_dir = 'experiments/runs/right_side_survive_v1/run_2023-09-15_19-39-11_8773485453367/videos'
-videos_dir = 'experiments/runs/rs_v1_one_barrier/run_2023-09-16_01-11-35_8770174447698/videos'
-video_files = sorted(Path(videos_dir).glob('*.mp4'))
 
+def write_frames(frames, output: str, fps: int) -> None:
+    """ Encodes the frames one at a time, as a looping GIF or a video. """
+    if output.endswith('.gif'):
+        # the fast octree quantizer takes half the time of imageio's default
+        # for frames of a few colours, and gives smaller files
+        paletted = (Image.fromarray(frame).quantize(256, method=Image.Quantize.FASTOCTREE)
+                    for frame in frames)
+        first = next(paletted, None)
+        assert first is not None, 'The videos have no frames'
+        first.save(output, save_all=True, append_images=paletted,
+                   duration=round(1000 / fps), loop=0)
+        return
 
-def get_generation(video):
-    generation = video.stem.split('_')[1]
-    return int(re.sub(r'\D', '', generation))
+    # frames are padded to even sizes, which is all that libx264 needs
+    n_written = 0
+    with imageio.get_writer(output, fps=fps, macro_block_size=2) as writer:
+        for frame in frames:
+            writer.append_data(frame)
+            n_written += 1
+    assert n_written > 0, 'The videos have no frames'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('run_dir', type=str)
+    parser.add_argument('--generations', type=int, nargs='+', default=None,
+                        help='Generations to composite (default: every generation with a video)')
+    parser.add_argument('--every', type=int, default=1,
+                        help='Without --generations, only use every n-th video')
+    parser.add_argument('--output', type=str, default=None,
+                        help='A .gif or .mp4 file (default: comparison.gif in the run directory)')
+    parser.add_argument('--n-frames', type=int, default=100)
+    parser.add_argument('--frame-step', type=int, default=1,
+                        help='Only use every n-th frame of the videos')
+    parser.add_argument('--fps', type=int, default=10)
+    parser.add_argument('--columns', type=int, default=None,
+                        help='Tiles per row (default: one row of up to 8 tiles, otherwise a square grid)')
+    parser.add_argument('--tile-size', type=int, default=None,
+                        help='Width of each tile in pixels (default: the width of the videos, up to 400)')
+    parser.add_argument('--padding', type=int, default=8)
+    parser.add_argument('--label-height', type=int, default=None,
+                        help='Height of the labels in pixels, 0 for no labels')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--max-memory', type=int, default=1024,
+                        help='Memory for the composite frames in MB, which are built in windows that fit in it')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    videos = find_videos(args.run_dir)
+    generations = select_generations(videos, args)
+    n_tiles = len(generations)
+
+    video_width, video_height = frame_size(videos[generations[0]])
+    tile_width = args.tile_size or min(video_width, 400)
+    tile_height = max(round(video_height * tile_width / video_width), 1)
+    label_height = args.label_height if args.label_height is not None else max(tile_width // 10, 12)
+    layout = Layout(tile_width, tile_height, label_height, args.n_frames, args.frame_step)
+
+    n_columns = args.columns or (n_tiles if n_tiles <= 8 else math.ceil(math.sqrt(n_tiles)))
+    n_rows = math.ceil(n_tiles / n_columns)
+    cell_width = tile_width + args.padding
+    cell_height = label_height + tile_height + args.padding
+    width = n_columns * cell_width + args.padding
+    height = n_rows * cell_height + args.padding
+    width, height = width + width % 2, height + height % 2
+
+    tiles = [
+        Tile(str(videos[generation]), f'Generation {generation}',
+             top=args.padding + (i // n_columns) * cell_height,
+             left=args.padding + (i % n_columns) * cell_width)
+        for i, generation in enumerate(generations)
+    ]
+
+    output = args.output or str(Path(args.run_dir) / 'comparison.gif')
+    frame_bytes = height * width * 3
+    max_memory = args.max_memory * 2 ** 20
+    size = f'{args.n_frames} frames of {width}x{height}'
+    # the GIF encoder keeps every frame, with one byte per pixel
+    if frame_bytes > max_memory or (output.endswith('.gif') and args.n_frames * height * width > max_memory):
+        total = args.n_frames * frame_bytes / (3 if output.endswith('.gif') else 1)
+        raise SystemExit(f'{size} need {total / 2 ** 20:,.1f} MB, more than --max-memory {args.max_memory} MB. '
+                         f'Use a smaller --tile-size, fewer --n-frames or tiles, a larger --frame-step, '
+                         f'an .mp4 output or a larger --max-memory')
+
+    window = min(args.n_frames, max_memory // frame_bytes)
+    shared = SharedArrays()
+    frames = shared.allocate('frames', (window, height, width, 3), np.uint8)
+    frames.fill(BACKGROUND)
+    n_windows = math.ceil(args.n_frames / window)
+    print(f'Compositing {n_tiles} videos into {size}, {window} frames at a time '
+          f'({frames.nbytes / 2 ** 20:,.0f} MB, {n_windows} window{"s" if n_windows > 1 else ""})')
+
+    n_workers = max(min(args.workers, n_tiles), 1)
+    with ProcessPoolExecutor(n_workers, mp_context=get_context()) as executor:
+        write_frames(composite_frames(tiles, layout, window, shared, executor), output, args.fps)
+    del frames
+    shared.close()
+    print(f'Saved {output} in {time.perf_counter() - start:.1f} s')
 
 
-generations = [get_generation(video) for video in video_files]
-render_generations = [0, 20, 100, 300, 580]
-
-assert all(generation in generations for generation in render_generations), \
-    'Not all render generations are in the video files'
-
-video_frames = [
-    read_video_cv2(str(file), n_frames=100)
-    for generation, file in zip(generations, video_files)
-    if generation in render_generations
-]
-generations = [
-    generation
-    for generation in generations
-    if generation in render_generations
-]
-
-plot_frames = []
-for frame_group in zip(*video_frames):
-    fig, axs = plt.subplots(1, len(frame_group), figsize=(5 * len(frame_group), 5))
-    for i, (frame, generation) in enumerate(zip(frame_group, generations)):
-        axs[i].imshow(frame)
-        axs[i].axis('off')
-        axs[i].set_title(f'Generation {generation}')
-    fig.tight_layout(pad=1.5)
-    fig.canvas.draw()
-    plot_frames.append(np.array(fig.canvas.renderer._renderer))
-    fig.clf()
-    plt.close(fig)
-
-save_video(plot_frames, 'assets/barrier_evolution', format='gif', fps=10)
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Queries the lineage recorded by the `lineage` callback of a run.
+
+Usage:
+    PYTHONPATH=. python scripts/query_lineage.py experiments/runs/<experiment>/<run> summary
+    PYTHONPATH=. python scripts/query_lineage.py experiments/runs/<experiment>/<run> ancestry 12345 --max-depth 5
+    PYTHONPATH=. python scripts/query_lineage.py experiments/runs/<experiment>/<run> coalescence --generation 500
+    PYTHONPATH=. python scripts/query_lineage.py experiments/runs/<experiment>/<run> founders --generation 500 --top 10
+"""
+from evo.util.lineage import LineageReader, BIRTH_GENERATION
+
+import argparse
+import time
+
+import numpy as np
+
+
+def last_generation(reader: LineageReader) -> int:
+    return int(reader.chunks[-1][-1, BIRTH_GENERATION])
+
+
+def sample_generation(reader: LineageReader, args) -> np.ndarray:
+    generation = args.generation if args.generation is not None else last_generation(reader)
+    ids = reader.organisms_born_in(generation)
+    if args.sample is not None and len(ids) > args.sample:
+        ids = np.random.default_rng(args.seed).choice(ids, args.sample, replace=False)
+    return generation, ids
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('experiment_dir', type=str)
+    subparsers = parser.add_subparsers(dest='query', required=True)
+
+    subparsers.add_parser('summary')
+
+    ancestry = subparsers.add_parser('ancestry')
+    ancestry.add_argument('organism_id', type=int)
+    ancestry.add_argument('--max-depth', type=int, default=3)
+
+    for name in ['coalescence', 'founders']:
+        subparser = subparsers.add_parser(name)
+        subparser.add_argument('--generation', type=int, default=None,
+                               help='Query the organisms born in this generation (default: the last)')
+        subparser.add_argument('--sample', type=int, default=None,
+                               help='Only query a random sample of this many organisms')
+        subparser.add_argument('--seed', type=int, default=0)
+        if name == 'founders':
+            subparser.add_argument('--top', type=int, default=10)
+
+    args = parser.parse_args()
+    reader = LineageReader(args.experiment_dir)
+
+    start = time.perf_counter()
+    if args.query == 'summary':
+        print(f'{len(reader)} organisms in {len(reader.chunks)} chunks, '
+              f'up to generation {last_generation(reader)}')
+
+    elif args.query == 'ancestry':
+        for organism_id, parents in reader.ancestry_tree(args.organism_id, args.max_depth).items():
+            print(f'{organism_id} (generation {reader.birth_generation(organism_id)}): parents {parents}')
+
+    elif args.query == 'coalescence':
+        generation, ids = sample_generation(reader, args)
+        ancestor = reader.most_recent_common_ancestor(ids)
+        if ancestor is None:
+            print(f'The lineages of the {len(ids)} organisms of generation {generation} never meet')
+        else:
+            print(f'The {len(ids)} organisms of generation {generation} share ancestor {ancestor}, '
+                  f'{generation - reader.birth_generation(ancestor)} generations back')
+
+    elif args.query == 'founders':
+        generation, ids = sample_generation(reader, args)
+        contributions = reader.founder_contributions(ids)
+        print(f'{len(contributions)} founders contribute to the {len(ids)} organisms of generation {generation}')
+        for founder, contribution in sorted(contributions.items(), key=lambda item: -item[1])[:args.top]:
+            print(f'  {founder}: {100 * contribution:.2f}%')
+
+    print(f'Query took {time.perf_counter() - start:.3f}s')
+
+
+if __name__ == '__main__':
+    main()